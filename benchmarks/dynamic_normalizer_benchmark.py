@@ -0,0 +1,78 @@
+"""
+ダイナミック音量均一化のスループット比較
+ffmpeg dynaudnorm と NumPyエンジン（core.dynamic_normalizer）で同じ合成音声を処理し、
+処理時間・実時間比・統合ラウドネスの差を表示する
+
+使い方: python benchmarks/dynamic_normalizer_benchmark.py [--minutes 10] [--input 任意の音声/動画]
+"""
+import argparse
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from core.dynamic_normalizer import DynamicNormalizer
+from core.ebur128 import R128Meter, build_pcm_cmd, iter_pcm_blocks, read_wav_header
+
+DYNAUDNORM = "dynaudnorm=f=250:g=15:p=0.95:m=5:r=0.0:n=1"
+
+def make_talk_like(path: Path, minutes: float) -> None:
+    # 話し声のように音量がゆっくり上下するステレオのピンクノイズ
+    source = (
+        f"anoisesrc=c=pink:a=0.5:d={minutes * 60}:r=48000,"
+        "volume='0.03+0.5*abs(sin(t*0.4))*abs(sin(t*2.7))':eval=frame,pan=stereo|c0=c0|c1=0.7*c0"
+    )
+    subprocess.run(["ffmpeg", "-hide_banner", "-loglevel", "error", "-y", "-f", "lavfi", "-i", source,
+                    "-c:a", "pcm_s16le", str(path)], check=True)
+
+def run_ffmpeg(path: Path):
+    start = time.perf_counter()
+    proc = subprocess.run(["ffmpeg", "-v", "error", "-i", str(path), "-map", "0:a:0", "-af", DYNAUDNORM,
+                           "-f", "f32le", "-"], capture_output=True, check=True)
+    elapsed = time.perf_counter() - start
+    return elapsed, proc.stdout
+
+def run_numpy(path: Path):
+    start = time.perf_counter()
+    proc = subprocess.Popen(build_pcm_cmd(path), stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    channels, sample_rate = read_wav_header(proc.stdout)
+    normalizer = DynamicNormalizer(sample_rate, channels)
+    out = []
+    for block in iter_pcm_blocks(proc, channels, sample_rate):
+        out.append(normalizer.process(block).astype("<f4").tobytes())
+    out.append(normalizer.flush().astype("<f4").tobytes())
+    proc.wait()
+    elapsed = time.perf_counter() - start
+    return elapsed, b"".join(out), sample_rate, channels
+
+def integrated(raw: bytes, sample_rate: int, channels: int) -> float:
+    meter = R128Meter(sample_rate, channels)
+    meter.add_frames(np.frombuffer(raw, dtype="<f4").reshape(-1, channels))
+    return meter.result()["input_i"]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--minutes", type=float, default=10.0, help="合成音声の長さ（分）")
+    parser.add_argument("--input", type=Path, help="合成音声の代わりに使うファイル")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = args.input
+        if path is None:
+            path = Path(tmpdir) / "talk.wav"
+            make_talk_like(path, args.minutes)
+        ff_time, ff_out = run_ffmpeg(path)
+        np_time, np_out, sample_rate, channels = run_numpy(path)
+        duration = len(np_out) / (4 * channels * sample_rate)
+        print(f"入力: {path.name} ({duration:.1f}秒, {sample_rate}Hz, {channels}ch)")
+        print(f"ffmpeg dynaudnorm : {ff_time:7.2f}秒  (実時間の{duration / ff_time:6.1f}倍)")
+        print(f"NumPyエンジン      : {np_time:7.2f}秒  (実時間の{duration / np_time:6.1f}倍)")
+        diff = integrated(np_out, sample_rate, channels) - integrated(ff_out, sample_rate, channels)
+        print(f"統合ラウドネスの差: {diff:+.2f} LU（許容誤差 ±0.1LU）")
+
+if __name__ == "__main__":
+    main()
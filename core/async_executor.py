@@ -0,0 +1,356 @@
+"""
+asyncioによるコマンド実行エンジン（キャンセル・タイムアウト・停止検知・同時実行数の上限）
+- ジョブごとに新しいプロセスグループで起動し、キャンセル・タイムアウト時はグループごと終了させる
+- ffmpegは -progress の出力、それ以外はログ行を「進んでいる」目印にし、stall_timeout秒途切れたら停止とみなす
+- セマフォで同時に動かすプロセス数を制限する（エンコードの並列しすぎを防ぐ）
+- 専用スレッドでイベントループを動かし、submit()で同期コード・Qtのワーカースレッドからも使える
+"""
+import asyncio
+import os
+import signal
+import subprocess
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Sequence
+
+from core.cpu_budget import pin_process
+from core.executor import PROGRESS_INTERVAL, Executor, ProgressEvent, ProgressParser, duration_from_log
+from core.log_capture import LogCapture
+from core.proc_sampler import ProcSampler, ResourceSummary, record_command, wait_exited
+
+# 同時に実行するプロセス数の既定値（ffmpegは内部でもスレッドを使うためコア数の半分）
+DEFAULT_MAX_CONCURRENT = max(1, (os.cpu_count() or 2) // 2)
+# 進捗・ログが途切れてから停止とみなすまでの秒数の既定値
+DEFAULT_STALL_TIMEOUT = 120.0
+# SIGTERMからSIGKILLまでの猶予（秒）
+KILL_GRACE = 3.0
+# ログ1行の上限（loudnormのJSON等が入る）
+_LINE_LIMIT = 1 << 20
+
+@dataclass
+class JobResult:
+    """
+    AsyncExecutor.runの結果
+    - returncode: 終了コード（起動前にキャンセルされた場合はNone）
+    - cancelled / timed_out / stalled: どの理由で終了させたか
+    - log: LogCaptureに残った行（末尾と重要行のみ）
+    - resources: 子プロセスのリソース使用量（/procから一定間隔で記録。起動前にキャンセルされた場合はNone）
+    """
+    returncode: Optional[int] = None
+    cancelled: bool = False
+    timed_out: bool = False
+    stalled: bool = False
+    started_at: Optional[float] = None
+    ended_at: Optional[float] = None
+    log: List[str] = field(default_factory=list, repr=False)
+    resources: Optional[ResourceSummary] = field(default=None, repr=False)
+
+    @property
+    def ok(self) -> bool:
+        return self.returncode == 0 and not (self.cancelled or self.timed_out or self.stalled)
+
+    @property
+    def elapsed(self) -> Optional[float]:
+        if self.started_at is None or self.ended_at is None:
+            return None
+        return self.ended_at - self.started_at
+
+class JobHandle:
+    """
+    submit()が返すジョブの操作用ハンドル（別スレッドから待機・キャンセルする）
+    """
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+        self._task: Optional[asyncio.Task] = None
+        self._cancel_requested = False
+        self.future: Future = Future()
+
+    def cancel(self) -> None:
+        """
+        ジョブをキャンセルする（実行中ならプロセスグループごと終了させる）
+        """
+        self._cancel_requested = True
+        if self._task is not None:
+            self._loop.call_soon_threadsafe(self._task.cancel)
+
+    def result(self, timeout: Optional[float] = None) -> JobResult:
+        """
+        ジョブの終了を待ってJobResultを返す
+        """
+        return self.future.result(timeout)
+
+    def done(self) -> bool:
+        return self.future.done()
+
+class AsyncExecutor:
+    """
+    asyncioのサブプロセス実行エンジン
+    """
+    _default = None
+    _default_lock = threading.Lock()
+
+    def __init__(self, max_concurrent: int = DEFAULT_MAX_CONCURRENT, stall_timeout: Optional[float] = DEFAULT_STALL_TIMEOUT):
+        self.max_concurrent = max(1, max_concurrent)
+        self.stall_timeout = stall_timeout
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def default(cls) -> "AsyncExecutor":
+        """
+        アプリ全体で共有するインスタンスを返す（全ページの同時実行数をまとめて制限する）
+        """
+        with cls._default_lock:
+            if cls._default is None:
+                cls._default = cls()
+            return cls._default
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        # submit用のイベントループを専用スレッドで起動
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=loop.run_forever, name="AsyncExecutor", daemon=True)
+                self._thread.start()
+                self._loop = loop
+            return self._loop
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # セマフォは実行中のループで作る（run()を直接awaitする場合も同じ上限を使う）
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        return self._semaphore
+
+    def submit(self, cmd: List[str], log_callback: Callable[[str], None] = None,
+               progress_callback: Callable[[ProgressEvent], None] = None, duration: Optional[float] = None,
+               timeout: Optional[float] = None, stall_timeout: Optional[float] = None,
+               affinity: Optional[Sequence[int]] = None) -> JobHandle:
+        """
+        同期コードからジョブを投入する（コールバックはイベントループのスレッドから呼ばれる）
+        キャンセルされた場合もJobResult(cancelled=True)で完了する
+        """
+        loop = self._ensure_loop()
+        handle = JobHandle(loop)
+
+        async def job():
+            handle._task = asyncio.current_task()
+            if handle._cancel_requested:
+                return JobResult(cancelled=True)
+            try:
+                return await self.run(cmd, log_callback, progress_callback, duration, timeout, stall_timeout, affinity)
+            except asyncio.CancelledError:
+                return JobResult(cancelled=True)
+
+        def finish(inner):
+            if inner.cancelled():
+                handle.future.set_result(JobResult(cancelled=True))
+            elif inner.exception() is not None:
+                handle.future.set_exception(inner.exception())
+            else:
+                handle.future.set_result(inner.result())
+
+        asyncio.run_coroutine_threadsafe(job(), loop).add_done_callback(finish)
+        return handle
+
+    def run_sync(self, cmd: List[str], **kwargs) -> JobResult:
+        """
+        submitして終了まで待つ（Executor.run_commandの置き換え用）
+        """
+        return self.submit(cmd, **kwargs).result()
+
+    async def run(self, cmd: List[str], log_callback: Callable[[str], None] = None,
+                  progress_callback: Callable[[ProgressEvent], None] = None, duration: Optional[float] = None,
+                  timeout: Optional[float] = None, stall_timeout: Optional[float] = None,
+                  affinity: Optional[Sequence[int]] = None) -> JobResult:
+        """
+        コマンドを実行してJobResultを返す
+        - timeout: 実行時間の上限（秒、セマフォ待ちは含まない）
+        - stall_timeout: 進捗・ログが途切れてから停止とみなす秒数（省略時はインスタンスの既定値）
+        - affinity: 子プロセスを固定するCPUコア（CpuAllocation.cores。Linuxのみ）
+        - タスクがキャンセルされた場合はプロセスグループを終了させてからCancelledErrorを送出する
+        """
+        stall_timeout = self.stall_timeout if stall_timeout is None else stall_timeout
+        async with self._get_semaphore():
+            return await self._run(cmd, log_callback, progress_callback, duration, timeout, stall_timeout, affinity)
+
+    async def _run(self, cmd, log_callback, progress_callback, duration, timeout, stall_timeout, affinity=None) -> JobResult:
+        result = JobResult(started_at=time.monotonic())
+        use_progress = os.name != "nt" and Executor._is_ffmpeg(cmd)
+        read_fd = write_fd = None
+        kwargs = {}
+        if use_progress:
+            read_fd, write_fd = os.pipe()
+            cmd = Executor.with_progress(cmd, write_fd)
+            kwargs["pass_fds"] = (write_fd,)
+        if os.name == "nt":
+            kwargs["creationflags"] = subprocess.CREATE_NEW_PROCESS_GROUP
+        else:
+            kwargs["start_new_session"] = True
+        stdout_transport = None
+        try:
+            if os.name == "nt":
+                process = await asyncio.create_subprocess_exec(
+                    *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT, limit=_LINE_LIMIT, **kwargs
+                )
+                stdout = process.stdout
+            else:
+                # asyncioのサブプロセスは終了と同時に回収され/procの最終値が読めないため、Popenで起動して
+                # 回収は_reap_in_threadで行う
+                process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, bufsize=0, **kwargs)
+                pin_process(process.pid, affinity)
+                stdout = asyncio.StreamReader(limit=_LINE_LIMIT)
+                stdout_transport, _ = await asyncio.get_running_loop().connect_read_pipe(
+                    lambda: asyncio.StreamReaderProtocol(stdout), process.stdout
+                )
+        except BaseException:
+            if read_fd is not None:
+                os.close(read_fd)
+            raise
+        finally:
+            if write_fd is not None:
+                os.close(write_fd)
+
+        sampler = ProcSampler(process.pid).start()
+        if os.name == "nt":
+            reaped = asyncio.ensure_future(_wait_process(process, sampler))
+        else:
+            reaped = _reap_in_thread(process, sampler)
+        last_activity = time.monotonic()
+        parser = ProgressParser(duration)
+        capture = LogCapture()
+
+        async def read_log():
+            nonlocal last_activity
+            while True:
+                line = await stdout.readline()
+                if not line:
+                    break
+                last_activity = time.monotonic()
+                text = line.decode("utf-8", errors="ignore").rstrip()
+                capture.append(text)
+                if parser.duration is None and use_progress:
+                    parser.duration = duration_from_log(text)
+                if log_callback:
+                    log_callback(text)
+
+        async def read_progress():
+            nonlocal last_activity
+            reader = asyncio.StreamReader()
+            transport, _ = await asyncio.get_running_loop().connect_read_pipe(
+                lambda: asyncio.StreamReaderProtocol(reader), os.fdopen(read_fd, "rb", 0)
+            )
+            last_report = 0.0
+            try:
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    last_activity = time.monotonic()
+                    event = parser.feed(line.decode("utf-8", errors="ignore"))
+                    if event is None or progress_callback is None:
+                        continue
+                    if event.done or last_activity - last_report >= PROGRESS_INTERVAL:
+                        last_report = last_activity
+                        progress_callback(event)
+            finally:
+                transport.close()
+
+        async def watchdog():
+            # stall_timeout秒以上なにも出力がなければ停止とみなす
+            while True:
+                await asyncio.sleep(min(1.0, stall_timeout / 4))
+                if time.monotonic() - last_activity > stall_timeout:
+                    result.stalled = True
+                    return
+
+        readers = [asyncio.ensure_future(read_log())]
+        if use_progress:
+            readers.append(asyncio.ensure_future(read_progress()))
+        finished = asyncio.ensure_future(asyncio.gather(*readers, asyncio.shield(reaped)))
+        waiters = {finished}
+        guard = None
+        if stall_timeout:
+            guard = asyncio.ensure_future(watchdog())
+            waiters.add(guard)
+        try:
+            done, _ = await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if finished not in done:
+                if guard is None or guard not in done:
+                    result.timed_out = True
+                await _terminate(process, reaped)
+            await finished
+        except asyncio.CancelledError:
+            result.cancelled = True
+            await asyncio.shield(_terminate(process, reaped))
+            raise
+        finally:
+            if guard is not None:
+                guard.cancel()
+            if not finished.done():
+                finished.cancel()
+            if stdout_transport is not None:
+                stdout_transport.close()
+            if reaped.done() and not reaped.cancelled() and reaped.exception() is None:
+                result.returncode, result.resources = reaped.result()
+            else:
+                result.returncode, result.resources = process.returncode, sampler.stop()
+            result.ended_at = time.monotonic()
+            result.log = capture.lines()
+            record_command(cmd, result.resources, result.returncode)
+        return result
+
+def _reap_in_thread(process: subprocess.Popen, sampler: ProcSampler) -> asyncio.Future:
+    """
+    終了を別スレッドで待ち、ゾンビのうちに最後の値を読んでから回収する（Executor._finishと同じ順序）
+    (終了コード, ResourceSummary) で完了するFutureを返す
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def set_result(value):
+        if not future.done():
+            future.set_result(value)
+
+    def reap():
+        wait_exited(process.pid)
+        summary = sampler.stop()
+        returncode = process.wait()
+        loop.call_soon_threadsafe(set_result, (returncode, summary))
+
+    threading.Thread(target=reap, name=f"reap-{process.pid}", daemon=True).start()
+    return future
+
+async def _wait_process(process: asyncio.subprocess.Process, sampler: ProcSampler):
+    # Windows（/procがない）は実時間のみのため、回収後にまとめればよい
+    returncode = await process.wait()
+    return returncode, sampler.stop()
+
+async def _terminate(process, reaped: asyncio.Future) -> None:
+    """
+    プロセスグループにSIGTERMを送り、KILL_GRACE秒で終わらなければSIGKILLする
+    """
+    if reaped.done():
+        return
+    if os.name == "nt":
+        process.kill()
+        await asyncio.shield(reaped)
+        return
+    for sig in (signal.SIGTERM, signal.SIGKILL):
+        try:
+            os.killpg(process.pid, sig)
+        except ProcessLookupError:
+            pass
+        try:
+            await asyncio.wait_for(asyncio.shield(reaped), KILL_GRACE)
+            break
+        except asyncio.TimeoutError:
+            continue
+    # リーダーの終了後も残っている子孫プロセスを片付ける
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
@@ -2,14 +2,202 @@
 ffmpegコマンド生成モジュール（ラウドネス補正用）
 """
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Tuple
+import math
 import subprocess
 import json
+from core.file_scanner import is_audio_file
+from core.cpu_budget import apply_threads
+
+# 書き出し時のebur128分岐で測定した出力ラウドネスのキャッシュ識別子
+OUTPUT_METER_PARAMS = "ebur128;render-tap"
+# 測定用分岐[mout]を捨てるためのnull出力（書き出し先の後ろに付ける）
+OUTPUT_METER_ARGS = ['-map', '[mout]', '-f', 'null', '-']
+# 音声のみのファイルで元のコーデックを保てる場合のPCM形式（それ以外のwavはpcm_s16leで書き出す）
+KEEP_PCM_CODECS = {'pcm_s16le', 'pcm_s24le', 'pcm_s32le', 'pcm_f32le'}
+# 結合時にそろっている必要がある映像プロパティ
+VIDEO_FORMAT_KEYS = ('codec_name', 'width', 'height', 'r_frame_rate', 'pix_fmt')
+# 結合前の映像プロパティ取得の同時実行数（ffprobeの起動と読み込み待ちが主なのでCPUコア数によらない）
+PROBE_WORKERS = 8
 
 class CommandBuilder:
     """
     ffmpegコマンド生成クラス
     """
+    @staticmethod
+    def analyze_loudness(input_path: Path, true_peak_limit: float = -1.5, use_cache: bool = True) -> dict:
+        """
+        loudnormの1パス目（解析のみ）を実行し、測定値dictを返す
+        - 同じloudnormパラメータでの全区間の測定結果がキャッシュにあれば再デコードしない
+        戻り値: input_i / input_tp / input_lra / input_thresh などを含むdict
+        """
+        import os
+        import re
+        from core.loudness_cache import LoudnessCache
+        params = f'loudnorm=I=-18:TP={true_peak_limit}:LRA=11'
+        if use_cache:
+            cached = LoudnessCache.default().get_full(input_path, params)
+            if cached:
+                return cached
+        analyze_cmd = [
+            'ffmpeg',
+            '-y',
+            '-i', str(input_path),
+            '-vn',  # 映像を無効化
+            '-af', f'{params}:print_format=json',
+            '-f', 'null',
+            'NUL' if os.name == 'nt' else '/dev/null'  # 出力先（OS依存）
+        ]
+        result = subprocess.run(analyze_cmd, capture_output=True, text=True, check=True)
+        # 標準エラーからJSONを抽出
+        json_match = re.search(r'({.*})', result.stderr, re.DOTALL)
+        if not json_match:
+            raise ValueError("loudnormの解析結果を取得できませんでした")
+        analysis = json.loads(json_match.group(1))
+        if use_cache:
+            LoudnessCache.default().put(input_path, 'full', params, analysis)
+        return analysis
+
+    @staticmethod
+    def build_loudness_filter(
+        measured_params: Optional[dict],
+        use_dynaudnorm: bool = True,
+        material_mode: bool = False,
+        true_peak_limit: float = -1.5,
+        add_limiter: bool = True
+    ) -> str:
+        """
+        ラウドネス補正用の音声フィルタ文字列(-af)を生成
+        measured_paramsがNoneの場合は測定値なし（1パス動作）のloudnormになる
+        """
+        measured = ""
+        if measured_params:
+            input_i = measured_params.get('input_i', 0)
+            input_tp = measured_params.get('input_tp', 0)
+            input_lra = measured_params.get('input_lra', 0)
+            input_thresh = measured_params.get('input_thresh', 0)
+            measured = f":measured_I={input_i}:measured_TP={input_tp}:measured_LRA={input_lra}:measured_thresh={input_thresh}"
+        if material_mode:
+            af = f"loudnorm=I=-18:LRA=11:TP={true_peak_limit}:linear=true{measured}:print_format=summary"
+        elif use_dynaudnorm:
+            af = (
+                f"dynaudnorm=f=250:g=15:p=0.95:m=5:r=0.0:n=1," +
+                f"loudnorm=I=-14:LRA=7:TP={true_peak_limit}{measured}:print_format=summary"
+            )
+        else:
+            af = f"loudnorm=I=-14:LRA=7:TP={true_peak_limit}{measured}:print_format=summary"
+        if add_limiter:
+            af += f",alimiter=limit={true_peak_limit}dB"
+        return af
+
+    @staticmethod
+    def plan_loudness_filter(
+        measured_params: Optional[dict],
+        use_dynaudnorm: bool = True,
+        material_mode: bool = False,
+        true_peak_limit: float = -1.5,
+        add_limiter: bool = True
+    ) -> Tuple[str, str]:
+        """
+        測定値から補正方法を選び、(音声フィルタ文字列, 方式) を返す
+        - 方式 'linear': 一定ゲイン(volume)だけで目標ラウドネスに届き、
+          トゥルーピークが上限以下・LRAが目標以下に収まる場合（loudnormの192kHz処理・リミッタを省略）
+        - 方式 'loudnorm': それ以外（build_loudness_filterと同じフィルタ）
+        dynaudnormを使う場合はダイナミクスが変わるため常に'loudnorm'
+        """
+        af = CommandBuilder.build_loudness_filter(
+            measured_params,
+            use_dynaudnorm=use_dynaudnorm,
+            material_mode=material_mode,
+            true_peak_limit=true_peak_limit,
+            add_limiter=add_limiter
+        )
+        if (use_dynaudnorm and not material_mode) or not measured_params:
+            return af, 'loudnorm'
+        target_i, target_lra = (-18.0, 11.0) if material_mode else (-14.0, 7.0)
+        try:
+            input_i = float(measured_params['input_i'])
+            input_tp = float(measured_params['input_tp'])
+            input_lra = float(measured_params['input_lra'])
+        except (KeyError, TypeError, ValueError):
+            return af, 'loudnorm'
+        if not math.isfinite(input_i) or input_i <= -70.0:
+            return af, 'loudnorm'
+        gain = target_i - input_i
+        if input_tp + gain <= true_peak_limit and input_lra <= target_lra:
+            return f"volume={gain:.2f}dB", 'linear'
+        return af, 'loudnorm'
+
+    @staticmethod
+    def build_output_meter_graph(audio_input: str, af: str, sample_rate: int = 48000) -> str:
+        """
+        補正フィルタの出力を書き出し用[aout]とebur128測定用[mout]に分岐するfilter_complexを生成
+        loudnormは内部で192kHzになるため、測定も書き出しと同じサンプルレートにそろえてから分岐する
+        [mout]はOUTPUT_METER_ARGS（null出力）でコマンド末尾にマッピングする
+        （anullsinkで終端すると、ffmpeg 7.0では音声のみの入力でloudnormと組み合わせた際に異常終了するため）
+        """
+        return (
+            f"[{audio_input}]{af},aresample={sample_rate},asplit=2[aout][meter];"
+            "[meter]ebur128=peak=true:framelog=quiet[mout]"
+        )
+
+    @staticmethod
+    def audio_output_args(output_path: Path, audio_codec: Optional[str] = None, sample_rate: Optional[int] = None) -> list:
+        """
+        音声のみのファイルを書き出すときのエンコード引数（出力の拡張子に合わせたコーデック）
+        - wav: 元がPCMならその形式を保つ / mp3: libmp3lame / flac: flac / aac・m4a: aac
+        - サンプルレートは元のレートを保つ（loudnormは内部で192kHzになるため明示する）。
+          圧縮形式で48kHzを超える場合は同系列（44.1kHz系/48kHz系）の上限に下げる。不明なら48kHz
+        """
+        ext = Path(output_path).suffix.lower()
+        if ext == '.wav':
+            args = ['-c:a', audio_codec if audio_codec in KEEP_PCM_CODECS else 'pcm_s16le']
+        elif ext == '.flac':
+            args = ['-c:a', 'flac']
+        elif ext == '.mp3':
+            args = ['-c:a', 'libmp3lame', '-b:a', '192k']
+        else:
+            args = ['-c:a', 'aac', '-b:a', '192k']
+        rate = sample_rate or 48000
+        if ext not in ('.wav', '.flac') and rate > 48000:
+            rate = 44100 if rate % 11025 == 0 else 48000
+        args += ['-ar', str(rate)]
+        if ext == '.m4a':
+            args += ['-movflags', '+faststart']
+        return args
+
+    @staticmethod
+    def build_audio_normalization_cmd(
+        input_path: Path,
+        output_path: Path,
+        af: str,
+        audio_codec: Optional[str] = None,
+        sample_rate: Optional[int] = None,
+        measure_output: bool = False,
+        threads: Optional[int] = None
+    ) -> list:
+        """
+        音声のみのファイル（wav/mp3/aac等）を1プロセスで補正して書き出すコマンドを生成
+        映像の抽出・マージを行わず、最初の音声ストリームだけをデコード→補正→エンコードする
+        threads: ffmpegのスレッド数（CpuBudgetの割り当て。省略時はffmpegの既定）
+        """
+        if measure_output:
+            audio_filter = ['-filter_complex', CommandBuilder.build_output_meter_graph('0:a:0', af, sample_rate or 48000),
+                            '-map', '[aout]']
+        else:
+            audio_filter = ['-map', '0:a:0', '-af', af]
+        cmd = [
+            'ffmpeg',
+            '-y',
+            '-i', str(input_path),
+            *audio_filter,
+            *CommandBuilder.audio_output_args(output_path, audio_codec, sample_rate),
+            str(output_path)
+        ]
+        if measure_output:
+            cmd += OUTPUT_METER_ARGS
+        return apply_threads(cmd, threads)
+
     @staticmethod
     def build_loudness_normalization_cmd(
         input_path: Path,
@@ -18,22 +206,83 @@ class CommandBuilder:
         material_mode: bool = False,
         measured_params: dict = None,
         true_peak_limit: float = -1.5,
-        add_limiter: bool = True
+        add_limiter: bool = True,
+        single_pass: bool = False,
+        measure_output: bool = False,
+        audio_codec: Optional[str] = None,
+        sample_rate: Optional[int] = None,
+        threads: Optional[int] = None
     ) -> list:
         """
         映像を再エンコードせず、音声のみをloudnormで補正するコマンドを生成
         - 映像はそのままコピー
-        - 音声は一時ファイルに抽出して補正後、映像とマージ
+        - 音声のみのファイル（AUDIO_EXTENSIONS）はsingle_passによらずbuild_audio_normalization_cmdの1コマンド
+          （audio_codec / sample_rateには元ファイルの値を渡すと、可能な限り同じ形式で書き出す）
+        - single_pass=False: 音声を一時ファイルに抽出して補正後、映像とマージ（4コマンド）
+        - single_pass=True: 解析後、映像コピー＋補正音声を1プロセスで最終コンテナへ直接書き出す（1コマンド）
+        - measured_paramsを渡した場合は解析パスを省略する（MediaAnalysisの測定値など）
+        - measure_output=True: 補正後の音声をasplitでebur128に分岐し、書き出しと同時に出力のラウドネスを測定する
+          （ログ末尾のSummaryをMediaAnalysis.parse_ebur128_summaryで読む。補正コマンドのstderrに出力される）
+        - threads: 各コマンドのffmpegスレッド数（CpuBudgetの割り当て。省略時はffmpegの既定）
         """
         import tempfile
         import os
         import shutil
-        from pathlib import Path
+
+        # 測定値が渡されていなければ1回目のパスで解析のみ行い、loudnormのパラメータを取得
+        analysis = measured_params
+        if analysis is None:
+            try:
+                analysis = CommandBuilder.analyze_loudness(input_path, true_peak_limit)
+            except Exception as e:
+                # 解析に失敗した場合は測定値なしのloudnormにフォールバック
+                print(f"Warning: loudnorm analysis failed, falling back to default: {str(e)}")
+                analysis = None
+        # 2回目のパスで使用するフィルタを構築（一定ゲインで足りる場合はvolumeのみ）
+        af, _ = CommandBuilder.plan_loudness_filter(
+            analysis,
+            use_dynaudnorm=use_dynaudnorm,
+            material_mode=material_mode,
+            true_peak_limit=true_peak_limit,
+            add_limiter=add_limiter
+        )
+
+        if is_audio_file(input_path):
+            return [CommandBuilder.build_audio_normalization_cmd(
+                input_path, output_path, af,
+                audio_codec=audio_codec, sample_rate=sample_rate, measure_output=measure_output,
+                threads=threads
+            )]
+
+        if single_pass:
+            # 映像はストリームコピー、補正後の音声を直接マッピングして1回で書き出す
+            if measure_output:
+                audio_map = '[aout]'
+                audio_filter = ['-filter_complex', CommandBuilder.build_output_meter_graph('0:a:0', af)]
+            else:
+                audio_map = '0:a:0'
+                audio_filter = ['-af', af]
+            render_cmd = [
+                'ffmpeg',
+                '-y',
+                '-i', str(input_path),
+                '-map', '0:v?',
+                '-map', audio_map,
+                '-c:v', 'copy',
+                *audio_filter,
+                '-c:a', 'aac',
+                '-b:a', '192k',
+                '-ar', '48000',  # loudnormは内部で192kHzになるため出力レートを明示
+                '-movflags', '+faststart',
+                str(output_path)
+            ]
+            if measure_output:
+                render_cmd += OUTPUT_METER_ARGS
+            return [apply_threads(render_cmd, threads)]
 
         # 一時ディレクトリを作成
         temp_dir = tempfile.mkdtemp(prefix='ffmpeg_gui_')
         temp_video = os.path.join(temp_dir, 'video.mp4')
-        temp_audio = os.path.join(temp_dir, 'audio.aac')
         temp_audio_norm = os.path.join(temp_dir, 'audio_norm.aac')
 
         try:
@@ -48,65 +297,6 @@ class CommandBuilder:
             ]
 
             # 2. 音声を抽出して補正
-            # 1回目のパスで解析のみ行い、loudnormのパラメータを取得
-            analyze_cmd = [
-                'ffmpeg',
-                '-y',
-                '-i', str(input_path),
-                '-vn',  # 映像を無効化
-                '-af', f'loudnorm=I=-18:TP={true_peak_limit}:LRA=11:print_format=json',
-                '-f', 'null',
-                'NUL' if os.name == 'nt' else '/dev/null'  # 出力先（OS依存）
-            ]
-            
-            try:
-                # 1回目のパスを実行して解析結果を取得
-                result = subprocess.run(analyze_cmd, capture_output=True, text=True, check=True)
-                
-                # 標準エラーからJSONを抽出
-                import re
-                import json
-                json_match = re.search(r'({.*})', result.stderr, re.DOTALL)
-                if not json_match:
-                    raise ValueError("loudnormの解析結果を取得できませんでした")
-                
-                # JSONをパースして必要なパラメータを取得
-                analysis = json.loads(json_match.group(1))
-                input_i = analysis.get('input_i', 0)
-                input_tp = analysis.get('input_tp', 0)
-                input_lra = analysis.get('input_lra', 0)
-                input_thresh = analysis.get('input_thresh', 0)
-                
-                # 2回目のパスで使用するフィルタを構築
-                if material_mode:
-                    af = f"loudnorm=I=-18:LRA=11:TP={true_peak_limit}:linear=true:measured_I={input_i}:measured_TP={input_tp}:measured_LRA={input_lra}:measured_thresh={input_thresh}:print_format=summary"
-                elif use_dynaudnorm:
-                    af = (
-                        f"dynaudnorm=f=250:g=15:p=0.95:m=5:r=0.0:n=1," +
-                        f"loudnorm=I=-14:LRA=7:TP={true_peak_limit}:measured_I={input_i}:measured_TP={input_tp}:measured_LRA={input_lra}:measured_thresh={input_thresh}:print_format=summary"
-                    )
-                else:
-                    af = f"loudnorm=I=-14:LRA=7:TP={true_peak_limit}:measured_I={input_i}:measured_TP={input_tp}:measured_LRA={input_lra}:measured_thresh={input_thresh}:print_format=summary"
-                
-                if add_limiter:
-                    af += f",alimiter=limit={true_peak_limit}dB"
-                    
-            except Exception as e:
-                # 解析に失敗した場合は従来の方法にフォールバック
-                print(f"Warning: loudnorm analysis failed, falling back to default: {str(e)}")
-                if material_mode:
-                    af = f"loudnorm=I=-18:LRA=11:TP={true_peak_limit}:linear=true:print_format=summary"
-                elif use_dynaudnorm:
-                    af = (
-                        f"dynaudnorm=f=250:g=15:p=0.95:m=5:r=0.0:n=1," +
-                        f"loudnorm=I=-14:LRA=7:TP={true_peak_limit}:print_format=summary"
-                    )
-                else:
-                    af = f"loudnorm=I=-14:LRA=7:TP={true_peak_limit}:print_format=summary"
-                
-                if add_limiter:
-                    af += f",alimiter=limit={true_peak_limit}dB"
-
             audio_cmd = [
                 'ffmpeg',
                 '-y',
@@ -117,16 +307,22 @@ class CommandBuilder:
                 'pipe:1'
             ]
 
+            if measure_output:
+                audio_filter = ['-filter_complex', CommandBuilder.build_output_meter_graph('0:a', af), '-map', '[aout]']
+            else:
+                audio_filter = ['-af', af]
             audio_filter_cmd = [
                 'ffmpeg',
                 '-y',
                 '-f', 'wav',
                 '-i', 'pipe:0',
-                '-af', af,
+                *audio_filter,
                 '-c:a', 'aac',
                 '-b:a', '192k',
                 temp_audio_norm
             ]
+            if measure_output:
+                audio_filter_cmd += OUTPUT_METER_ARGS
 
             # 3. 映像と補正済み音声をマージ
             merge_cmd = [
@@ -143,7 +339,7 @@ class CommandBuilder:
             ]
 
             # コマンドのリストを返す（実行は呼び出し元で行う）
-            return [video_cmd, audio_cmd, audio_filter_cmd, merge_cmd]
+            return [apply_threads(c, threads) for c in (video_cmd, audio_cmd, audio_filter_cmd, merge_cmd)]
 
         except Exception as e:
             # エラーが発生したら一時ファイルを削除
@@ -155,46 +351,85 @@ class CommandBuilder:
     @staticmethod
     def get_video_format_info(file_path: str) -> dict:
         """
-        ffprobeで主要な動画プロパティ（コーデック・解像度・フレームレート等）を取得
+        主要な動画プロパティ（コーデック・解像度・フレームレート等）を取得（media_probeのキャッシュを使う）
         """
-        cmd = [
-            "ffprobe", "-v", "error", "-select_streams", "v:0", "-show_entries",
-            "stream=codec_name,width,height,r_frame_rate,pix_fmt", "-of", "json", file_path
-        ]
-        try:
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-            info = json.loads(result.stdout)
-            stream = info['streams'][0] if 'streams' in info and info['streams'] else {}
-            return {
-                'codec_name': stream.get('codec_name'),
-                'width': stream.get('width'),
-                'height': stream.get('height'),
-                'r_frame_rate': stream.get('r_frame_rate'),
-                'pix_fmt': stream.get('pix_fmt'),
-            }
-        except Exception as e:
-            return {'error': str(e)}
+        from core.media_probe import probe
+        info = probe(file_path)
+        if info.error:
+            return {'error': info.error}
+        return info.video_format()
 
     @staticmethod
-    def build_video_concat_cmd(input_files: list, output_path: Path) -> tuple:
+    def probe_video_formats(input_files: list, max_workers: int = PROBE_WORKERS, stop_on_mismatch: bool = True,
+                            log_func=None) -> list:
         """
-        ffmpeg concat demuxer用のコマンド生成
-        - input_files: 結合対象ファイルのパスリスト
-        - output_path: 出力ファイルパス
-        戻り値: (コマンドリスト, 一時リストファイルパス, 再エンコード有無[bool], フォーマット判定情報, 強制再エンコード理由)
+        各ファイルの映像プロパティ（get_video_format_info）をスレッドプールで並列に取得する
+        - 結果は入力順。各要素に取得にかかった秒数 probe_sec を追加する
+        - stop_on_mismatch: 先頭ファイルと異なるファイルが見つかった時点（再エンコードが確定した時点）で
+          未着手の取得を取りやめる。取りやめた要素は {'skipped': True}
+        - log_func: 取得方法と所要時間の通知先
+        """
+        import time
+        from concurrent.futures import ThreadPoolExecutor, as_completed
+        def probe_one(path):
+            start = time.monotonic()
+            fmt = dict(CommandBuilder.get_video_format_info(path))
+            fmt['probe_sec'] = time.monotonic() - start
+            return fmt
+        started = time.monotonic()
+        workers = max(1, min(max_workers, len(input_files)))
+        format_list = [None] * len(input_files)
+        stopped_at = None
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(probe_one, f): i for i, f in enumerate(input_files)}
+            for future in as_completed(futures):
+                format_list[futures[future]] = future.result()
+                ref = format_list[0]
+                if not stop_on_mismatch or ref is None:
+                    continue
+                stopped_at = next((i for i, fmt in enumerate(format_list[1:], 1)
+                                   if fmt is not None and CommandBuilder._format_mismatch(ref, fmt)), None)
+                if stopped_at is not None:
+                    for pending in futures:
+                        pending.cancel()
+                    break
+        # 打ち切り時点で実行中だった取得の結果も使う
+        for future, i in futures.items():
+            if format_list[i] is None and future.done() and not future.cancelled():
+                format_list[i] = future.result()
+        skipped = sum(1 for fmt in format_list if fmt is None)
+        format_list = [fmt if fmt is not None else {'skipped': True} for fmt in format_list]
+        if log_func:
+            message = f"[プローブ] {len(input_files)}件の映像情報を{workers}並列で取得（{time.monotonic() - started:.2f}秒）"
+            if skipped:
+                message += f"：{stopped_at + 1}件目が先頭と異なり再エンコードが確定したため、残り{skipped}件の取得を省略"
+            log_func(message)
+        return format_list
+
+    @staticmethod
+    def _format_mismatch(ref: dict, fmt: dict) -> list:
+        """
+        先頭ファイルと異なる映像プロパティ名のリスト（取得を省略したファイルは比較しない）
+        """
+        if fmt.get('skipped'):
+            return []
+        return [k for k in VIDEO_FORMAT_KEYS if fmt.get(k) != ref.get(k)]
+
+    @staticmethod
+    def _copy_concat_check(input_files: list, output_path: Path, format_list: list) -> tuple:
+        """
+        concat demuxerでストリームコピーできるか判定する
+        戻り値: (再エンコード有無[bool], 強制再エンコード理由)
         """
-        # 各ファイルのフォーマット取得
-        format_list = [CommandBuilder.get_video_format_info(f) for f in input_files]
         ref = format_list[0]
         need_reencode = False
         force_reason = None
         reencode_reasons = []
         for idx, fmt in enumerate(format_list[1:], 1):
             # 主要プロパティが全て一致しているか
-            for k in ['codec_name', 'width', 'height', 'r_frame_rate', 'pix_fmt']:
-                if fmt.get(k) != ref.get(k):
-                    need_reencode = True
-                    reencode_reasons.append(f"{k}不一致: {input_files[0]}={ref.get(k)}, {input_files[idx]}={fmt.get(k)}")
+            for k in CommandBuilder._format_mismatch(ref, fmt):
+                need_reencode = True
+                reencode_reasons.append(f"{k}不一致: {input_files[0]}={ref.get(k)}, {input_files[idx]}={fmt.get(k)}")
             if need_reencode:
                 break
         # 出力ファイル拡張子によるmux可否チェック
@@ -205,12 +440,39 @@ class CommandBuilder:
             force_reason = 'proresコーデックはmp4コンテナにコピー不可のため再エンコードを強制します'
         elif need_reencode and not force_reason:
             force_reason = ' / '.join(reencode_reasons) if reencode_reasons else '動画プロパティ不一致のため再エンコードを強制します'
+        return need_reencode, force_reason
 
+    @staticmethod
+    def _write_concat_list(input_files: list) -> str:
+        """
+        concat demuxer用のリストファイルを一時ファイルに書き出し、そのパスを返す
+        """
         import tempfile
         concat_list = tempfile.NamedTemporaryFile(delete=False, mode='w', encoding='utf-8', suffix='.txt')
         for f in input_files:
             concat_list.write(f"file '{str(Path(f).absolute())}'\n")
         concat_list.close()
+        return concat_list.name
+
+    @staticmethod
+    def build_video_concat_cmd(input_files: list, output_path: Path, threads: Optional[int] = None,
+                               probe_workers: int = PROBE_WORKERS, stop_on_mismatch: bool = True,
+                               log_func=None) -> tuple:
+        """
+        ffmpeg concat demuxer用のコマンド生成
+        - input_files: 結合対象ファイルのパスリスト
+        - output_path: 出力ファイルパス
+        - threads: ffmpegのスレッド数（CpuBudgetの割り当て。省略時はffmpegの既定）
+        - probe_workers / stop_on_mismatch / log_func: 映像プロパティの取得方法（probe_video_formatsを参照）
+        戻り値: (コマンドリスト, 一時リストファイルパス, 再エンコード有無[bool], フォーマット判定情報, 強制再エンコード理由)
+        """
+        # 各ファイルのフォーマット取得（並列。再エンコードが確定したら残りは取得しない）
+        format_list = CommandBuilder.probe_video_formats(
+            input_files, max_workers=probe_workers, stop_on_mismatch=stop_on_mismatch, log_func=log_func
+        )
+        ref = format_list[0]
+        need_reencode, force_reason = CommandBuilder._copy_concat_check(input_files, output_path, format_list)
+        concat_list = CommandBuilder._write_concat_list(input_files)
 
         if not need_reencode:
             cmd = [
@@ -218,7 +480,7 @@ class CommandBuilder:
                 "-fflags", "+genpts",  # タイムスタンプを再生成
                 "-f", "concat",
                 "-safe", "0",
-                "-i", concat_list.name,
+                "-i", concat_list,
                 "-c:v", "copy",  # ビデオコーデックをコピー
                 "-c:a", "copy",  # オーディオコーデックをコピー
                 "-map", "0:v:0", # 最初のビデオストリームをマッピング
@@ -233,6 +495,14 @@ class CommandBuilder:
             ]
         else:
             # filter_complex方式でコマンド生成
+            # エンコーダは対応状況を確認済みのもの（HW優先、なければlibx264）を使う
+            # プリセットは目標の実時間比を満たす中で最も高画質なもの（PresetTuner）
+            from core.encoder_registry import EncoderRegistry
+            from core.preset_tuner import PresetTuner
+            video_encoder = EncoderRegistry.default().best_h264()
+            preset_args = PresetTuner.default().preset_args(
+                video_encoder, ref.get('width'), ref.get('height'), threads, fps=30000 / 1001, log_func=log_func
+            )
             # 入力ファイルをすべて -i で指定
             cmd = ["ffmpeg", "-y"]
             for f in input_files:
@@ -248,7 +518,8 @@ class CommandBuilder:
                 "-filter_complex", filter_complex,
                 "-map", "[outv]",
                 "-map", "[outa]",
-                "-c:v", "h264_videotoolbox",
+                "-c:v", video_encoder,
+                *preset_args,
                 "-pix_fmt", "yuv420p",
                 "-profile:v", "high",
                 "-level", "4.2",
@@ -258,4 +529,90 @@ class CommandBuilder:
                 "-movflags", "+faststart",
                 str(output_path)
             ]
-        return cmd, concat_list.name, need_reencode, format_list, force_reason
+        return apply_threads(cmd, threads), concat_list, need_reencode, format_list, force_reason
+
+    @staticmethod
+    def build_normalized_concat_cmd(
+        input_files: list,
+        output_path: Path,
+        analyses: dict,
+        durations: Optional[list] = None,
+        material_mode: bool = False,
+        true_peak_limit: float = -1.5,
+        add_limiter: bool = True,
+        measure_output: bool = False,
+        threads: Optional[int] = None,
+        log_func=None
+    ) -> tuple:
+        """
+        ラウドネス補正と結合を1回のffmpeg実行で行うコマンドを生成（クリップごとの中間ファイルを作らない）
+        - 映像: concat demuxerでストリームコピー（build_video_concat_cmdと同じ判定で、再エンコードが必要な場合はValueError）
+        - 音声: クリップごとの入力に測定値から選んだ補正（一定ゲイン or loudnorm）を適用し、
+          apad/atrimでクリップの長さにそろえてからconcatフィルタでつなぐ（映像との同期を保つ）
+        - analyses: {パス文字列: MediaAnalysisResult}（MediaAnalysis.analyze_manyの結果）
+        - durations: 各クリップの長さ（秒）。省略時はffprobeで取得し、失敗したら解析結果の長さを使う
+        - threads: ffmpegのスレッド数（CpuBudgetの割り当て。省略時はffmpegの既定）
+        - log_func: 映像プロパティの取得方法の通知先（probe_video_formatsを参照）
+        戻り値: (コマンドリスト, 一時リストファイルパス, フォーマット判定情報, クリップごとの補正方式リスト)
+        """
+        from core.ffprobe_loudness import FFprobeLoudness
+        # コピーできるかだけを判定する（再エンコード用のエンコーダ確認・プリセット測定は行わない）
+        format_list = CommandBuilder.probe_video_formats(input_files, log_func=log_func)
+        need_reencode, force_reason = CommandBuilder._copy_concat_check(input_files, output_path, format_list)
+        if need_reencode:
+            raise ValueError(f"映像の再エンコードが必要なため補正しながらの結合はできません: {force_reason}")
+        concat_list = CommandBuilder._write_concat_list(input_files)
+        if durations is None:
+            durations = []
+            for f in input_files:
+                try:
+                    durations.append(FFprobeLoudness.get_duration(Path(f)))
+                except Exception:
+                    durations.append(analyses[str(f)].duration)
+
+        cmd = ["ffmpeg", "-y", "-f", "concat", "-safe", "0", "-i", concat_list]
+        chains = []
+        modes = []
+        input_index = 0  # 0番はconcat demuxer（映像）
+        for idx, (f, duration) in enumerate(zip(input_files, durations)):
+            analysis = analyses[str(f)]
+            fit = f"aresample=48000,aformat=sample_fmts=fltp:channel_layouts=stereo,apad,atrim=end={duration:.6f}"
+            if not analysis.has_audio:
+                # 音声のないクリップは無音で埋める
+                chains.append(f"anullsrc=r=48000:cl=stereo,atrim=end={duration:.6f}[a{idx}]")
+                modes.append('silence')
+                continue
+            cmd += ["-i", str(f)]
+            input_index += 1
+            if analysis.is_silent():
+                af, mode = "anull", 'copy'
+            else:
+                af, mode = CommandBuilder.plan_loudness_filter(
+                    analysis.loudness,
+                    use_dynaudnorm=False,
+                    material_mode=material_mode,
+                    true_peak_limit=true_peak_limit,
+                    add_limiter=add_limiter
+                )
+            chains.append(f"[{input_index}:a:0]{af},{fit}[a{idx}]")
+            modes.append(mode)
+        labels = "".join(f"[a{idx}]" for idx in range(len(input_files)))
+        concat = f"{labels}concat=n={len(input_files)}:v=0:a=1"
+        if measure_output:
+            graph = ";".join(chains + [f"{concat}[program]", CommandBuilder.build_output_meter_graph("program", "anull")])
+        else:
+            graph = ";".join(chains + [f"{concat}[aout]"])
+        cmd += [
+            "-filter_complex", graph,
+            "-map", "0:v:0",
+            "-map", "[aout]",
+            "-c:v", "copy",
+            "-c:a", "aac",
+            "-b:a", "192k",
+            "-ar", "48000",
+            "-movflags", "+faststart",
+            str(output_path)
+        ]
+        if measure_output:
+            cmd += OUTPUT_METER_ARGS
+        return apply_threads(cmd, threads), concat_list, format_list, modes
@@ -0,0 +1,180 @@
+"""
+CPUコアの割り当て（Whisperのtorchスレッドとffmpegの-threadsをジョブ単位で調整する）
+- ジョブごとにCpuBudget.allocate()でスレッド数を受け取り、ffmpegコマンド・torchへ反映する
+- 既定の要求は実行中のエンコード・音声認識ジョブでコアを等分した数。空きが足りなければ返却されるまで待つ
+  （コア数を超えて割り当てると全ジョブが遅くなり、後から来たジョブが1スレッドのまま動き続けるため）
+- pin=True（サイドバーの「コアを固定」）の場合は負荷の少ないコアを選び、起動した子プロセスをos.sched_setaffinityで固定する（Linuxのみ）
+"""
+import os
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, List, Optional, Sequence, Tuple
+
+# 空きコアを待つ間に要求（等分の数）を見直す間隔（秒）。コアを割り当てないジョブの終了でも等分が変わるため
+ALLOCATE_POLL_SEC = 0.5
+
+def available_cores() -> List[int]:
+    """
+    このプロセスが使えるCPUコア番号（affinity非対応のOSではcpu_countから作る）
+    """
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+def apply_threads(cmd: List[str], threads: Optional[int]) -> List[str]:
+    """
+    ffmpegコマンドにスレッド数の指定を追加したコピーを返す（threadsがNone・ffmpeg以外・指定済みならそのまま）
+    - -filter_threads / -filter_complex_threads: グローバルオプションとして先頭に追加
+    - -threads: 各入力（デコーダ）の前と、最後の入力の直後（最初の出力のエンコーダ）に追加
+    """
+    if not threads or not cmd or not Path(cmd[0]).name.lower().startswith("ffmpeg") or "-threads" in cmd:
+        return cmd
+    n = str(int(threads))
+    result = [cmd[0], "-filter_threads", n, "-filter_complex_threads", n]
+    last_input = max((i for i, arg in enumerate(cmd) if arg == "-i"), default=None)
+    for i, arg in enumerate(cmd[1:], 1):
+        if arg == "-i":
+            result += ["-threads", n]
+        result.append(arg)
+        if last_input is not None and i == last_input + 1:
+            result += ["-threads", n]
+    return result
+
+def set_torch_threads(threads: int) -> Optional[int]:
+    """
+    torchのスレッド数を設定し、変更前の値を返す（torch未インストールならNone）
+    """
+    try:
+        import torch
+    except ImportError:
+        return None
+    previous = torch.get_num_threads()
+    torch.set_num_threads(max(1, int(threads)))
+    return previous
+
+def pinning_supported() -> bool:
+    return hasattr(os, "sched_setaffinity")
+
+def pin_process(pid: int, cores: Optional[Sequence[int]]) -> None:
+    """
+    起動した子プロセスを指定コアに固定する（固定しない・非対応のOS・終了済みのプロセスなら何もしない）
+    - preexec_fnはマルチスレッドのプロセスでは安全でなく、このアプリはスケジューラのスレッドからffmpegを起動するため、
+      Popenの後にpidを指定して設定する（ffmpegが後から作るスレッドは起動時のスレッドの設定を引き継ぐ）
+    """
+    if not cores or not pinning_supported():
+        return
+    try:
+        os.sched_setaffinity(pid, set(cores))
+    except OSError:
+        pass
+
+@dataclass
+class CpuAllocation:
+    """
+    CpuBudget.allocateが返す割り当て（withで使うと終了時に返却する）
+    - threads: ffmpegの-threads・torchのスレッド数に使う値
+    - cores: pin=Trueの場合に固定するコア番号（固定しない場合はNone）
+    """
+    threads: int
+    cores: Optional[Tuple[int, ...]] = None
+    budget: Optional["CpuBudget"] = field(default=None, repr=False)
+
+    def apply(self, cmd: List[str]) -> List[str]:
+        return apply_threads(cmd, self.threads)
+
+    def release(self) -> None:
+        if self.budget is not None:
+            self.budget._release(self)
+            self.budget = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+class CpuBudget:
+    """
+    アプリ全体のCPUコアをジョブに配分する
+    """
+    _default = None
+    _default_lock = threading.Lock()
+
+    def __init__(self, cores: Optional[Sequence[int]] = None, pin: bool = False,
+                 demand: Optional[Callable[[], int]] = None):
+        """
+        demand: コアを分け合う実行中のジョブ数を返す関数（省略時はallocate()が全コアを要求する）
+        """
+        self.cores = sorted(cores) if cores else available_cores()
+        self.pin = pin
+        self.demand = demand
+        self._load = {core: 0 for core in self.cores}
+        self._used = 0
+        self._lock = threading.Condition()
+
+    @classmethod
+    def default(cls) -> "CpuBudget":
+        """
+        アプリ全体で共有するインスタンスを返す（全ページのジョブでコアを分け合う）
+        - スケジューラで実行中のencode枠・asr枠のジョブでコアを等分する
+        """
+        from core.job_scheduler import ASR, ENCODE, JobScheduler
+        with cls._default_lock:
+            if cls._default is None:
+                cls._default = cls(demand=lambda: JobScheduler.default().running_count(ENCODE, ASR))
+            return cls._default
+
+    def set_pin(self, enabled: bool) -> None:
+        """
+        以降の割り当てで子プロセスをコアに固定するか（割り当て済みのジョブには影響しない）
+        """
+        with self._lock:
+            self.pin = bool(enabled) and pinning_supported()
+
+    @property
+    def total(self) -> int:
+        return len(self.cores)
+
+    @property
+    def free(self) -> int:
+        with self._lock:
+            return max(self.total - self._used, 0)
+
+    def share(self, jobs: int) -> int:
+        """
+        jobs個のジョブを同時に動かす場合の1ジョブあたりのスレッド数
+        """
+        return max(1, self.total // max(1, jobs))
+
+    def fair_share(self) -> int:
+        """
+        実行中のジョブ（demand）でコアを等分した1ジョブあたりのスレッド数（demand未指定なら全コア）
+        """
+        return self.share(self.demand()) if self.demand else self.total
+
+    def allocate(self, threads: Optional[int] = None) -> CpuAllocation:
+        """
+        スレッド数を割り当てる（threads省略時はfair_share()）
+        空きコアが要求に足りなければ、他のジョブが返却するまで待つ
+        """
+        with self._lock:
+            while True:
+                granted = min(threads or self.fair_share(), self.total)
+                if self.total - self._used >= granted:
+                    break
+                self._lock.wait(ALLOCATE_POLL_SEC)
+            self._used += granted
+            cores = None
+            if self.pin:
+                cores = tuple(sorted(sorted(self._load, key=lambda c: (self._load[c], c))[:granted]))
+                for core in cores:
+                    self._load[core] += 1
+            return CpuAllocation(threads=granted, cores=cores, budget=self)
+
+    def _release(self, allocation: CpuAllocation) -> None:
+        with self._lock:
+            self._used = max(self._used - allocation.threads, 0)
+            for core in allocation.cores or ():
+                self._load[core] = max(self._load[core] - 1, 0)
+            self._lock.notify_all()
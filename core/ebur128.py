@@ -0,0 +1,625 @@
+"""
+NumPyによるEBU R128（ITU-R BS.1770-4 / EBU Tech 3341・3342）ラウドネス測定エンジン
+- ffmpegのパイプからfloat32 PCMをブロック単位で受け取り、プロセス内で測定する
+- K特性フィルタはブロック行列演算でベクトル化したIIR（状態はブロック間で引き継ぎ）
+- 400msゲーティングブロック／3s短期ラウドネスはヒストグラムに集計するため、
+  メモリ使用量は入力の長さに依存せずブロックサイズにのみ比例する
+"""
+import math
+import struct
+import subprocess
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+ABSOLUTE_GATE_LUFS = -70.0
+INTEGRATED_RELATIVE_GATE_LU = -10.0
+LRA_RELATIVE_GATE_LU = -20.0
+
+def k_weighting_coefficients(sample_rate: int) -> List[Tuple[List[float], List[float]]]:
+    """
+    任意サンプルレートのK特性フィルタ係数を2段のバイクワッド[(b, a), (b, a)]で返す
+    （高域シェルフ→RLBハイパス。4次に畳み込むと極が重根に近く数値誤差が増えるため分けて適用する）
+    """
+    # 1段目: 高域シェルフ（頭部の音響効果）
+    f0 = 1681.974450955533
+    gain_db = 3.999843853973347
+    q = 0.7071752369554196
+    k = math.tan(math.pi * f0 / sample_rate)
+    vh = 10.0 ** (gain_db / 20.0)
+    vb = vh ** 0.4996667741545416
+    a0 = 1.0 + k / q + k * k
+    shelf_b = [(vh + vb * k / q + k * k) / a0, 2.0 * (k * k - vh) / a0, (vh - vb * k / q + k * k) / a0]
+    shelf_a = [1.0, 2.0 * (k * k - 1.0) / a0, (1.0 - k / q + k * k) / a0]
+    # 2段目: RLBハイパス
+    f0 = 38.13547087602444
+    q = 0.5003270373238773
+    k = math.tan(math.pi * f0 / sample_rate)
+    a0 = 1.0 + k / q + k * k
+    hp_b = [1.0, -2.0, 1.0]
+    hp_a = [1.0, 2.0 * (k * k - 1.0) / a0, (1.0 - k / q + k * k) / a0]
+    return [(shelf_b, shelf_a), (hp_b, hp_a)]
+
+def channel_weights(channels: int) -> np.ndarray:
+    """
+    BS.1770のチャンネル重み（5.1ch/5chのサラウンドは1.41、LFEは0）
+    """
+    if channels == 6:
+        return np.array([1.0, 1.0, 1.0, 0.0, 1.41, 1.41])
+    if channels == 5:
+        return np.array([1.0, 1.0, 1.0, 1.41, 1.41])
+    return np.ones(channels)
+
+def energy_to_lufs(energy):
+    """
+    平均二乗値（チャンネル重み付き）をLUFSに変換
+    """
+    with np.errstate(divide="ignore"):
+        return -0.691 + 10.0 * np.log10(energy)
+
+class BlockIIR:
+    """
+    IIRフィルタを長さblock_lenのブロック行列演算で適用するクラス
+    ブロック内: y = T x + O s（T: インパルス応答のテプリッツ行列, s: ブロック先頭の状態）
+    ブロック間の状態遷移 s' = A^L s + R x は並列プレフィックス（倍加法）でまとめて解くため、
+    サンプル単位・ブロック単位のPythonループを持たない
+    """
+    def __init__(self, b, a, channels: int, block_len: int = 32):
+        b = np.asarray(b, dtype=np.float64) / a[0]
+        a = np.asarray(a, dtype=np.float64) / a[0]
+        order = len(a) - 1
+        b = np.concatenate([b, np.zeros(order + 1 - len(b))])
+        # 転置直接II形の状態空間表現
+        A = np.zeros((order, order))
+        A[:, 0] = -a[1:]
+        A[np.arange(order - 1), np.arange(1, order)] = 1.0
+        B = b[1:] - a[1:] * b[0]
+        L = block_len
+        powers = [np.eye(order)]
+        for _ in range(L):
+            powers.append(A @ powers[-1])
+        powers = np.array(powers)
+        h = np.concatenate([[b[0]], (powers[:L - 1] @ B)[:, 0]])
+        idx = np.arange(L)
+        lag = idx[:, None] - idx[None, :]
+        self.T = np.where(lag >= 0, h[np.clip(lag, 0, None)], 0.0)
+        self.O = powers[:L, 0, :]
+        self.R = np.stack([powers[L - 1 - k] @ B for k in range(L)], axis=1)
+        self.powers = powers
+        self.block_len = L
+        self.order = order
+        self.state = np.zeros((order, channels))
+        self._scan_powers = [powers[L]]
+
+    def _scan_power(self, level: int) -> np.ndarray:
+        # (A^L)^(2^level) を必要に応じて二乗で求める
+        while len(self._scan_powers) <= level:
+            m = self._scan_powers[-1]
+            self._scan_powers.append(m @ m)
+        return self._scan_powers[level]
+
+    def process(self, x: np.ndarray) -> np.ndarray:
+        """
+        x: (サンプル数, チャンネル数) を入力し、同じ形のフィルタ出力を返す（状態は引き継ぐ）
+        """
+        x = np.asarray(x, dtype=np.float64)
+        m, ch = x.shape
+        L = self.block_len
+        nb = m // L
+        y = np.empty_like(x)
+        s = self.state
+        if nb:
+            xm = x[:nb * L].reshape(nb, L, ch).transpose(1, 0, 2).reshape(L, nb * ch)
+            y_zero_state = (self.T @ xm).reshape(L, nb, ch).transpose(1, 0, 2)
+            # w[0] = 初期状態, w[j] = ブロックj-1の入力による状態増分 → 包含スキャンで各ブロック先頭の状態へ
+            w = np.empty((nb + 1, self.order, ch))
+            w[0] = s
+            w[1:] = (self.R @ xm).reshape(self.order, nb, ch).transpose(1, 0, 2)
+            d, level = 1, 0
+            while d <= nb:
+                w[d:] = w[d:] + self._scan_power(level) @ w[:-d]
+                d *= 2
+                level += 1
+            y[:nb * L] = (y_zero_state + self.O @ w[:nb]).reshape(nb * L, ch)
+            s = w[nb]
+        rem = m - nb * L
+        if rem:
+            xr = x[nb * L:]
+            y[nb * L:] = self.T[:rem, :rem] @ xr + self.O[:rem] @ s
+            s = self.powers[rem] @ s + self.R[:, L - rem:] @ xr
+        self.state = s
+        return y
+
+class LoudnessHistogram:
+    """
+    ゲーティングブロックのラウドネス分布（0.01LU刻み）
+    各ビンに個数とエネルギー総和を持つため、統合ラウドネスはビン幅によらずほぼ厳密に求まる
+    """
+    MIN_LUFS = ABSOLUTE_GATE_LUFS
+    MAX_LUFS = 10.0
+    STEP = 0.01
+
+    def __init__(self):
+        bins = int(round((self.MAX_LUFS - self.MIN_LUFS) / self.STEP))
+        self.counts = np.zeros(bins, dtype=np.int64)
+        self.energy = np.zeros(bins, dtype=np.float64)
+
+    def add(self, energies: np.ndarray) -> None:
+        """
+        ブロックのエネルギー（チャンネル重み付き平均二乗値）を追加（絶対ゲート以下は捨てる）
+        """
+        energies = np.asarray(energies, dtype=np.float64)
+        loudness = energy_to_lufs(energies)
+        keep = loudness > ABSOLUTE_GATE_LUFS
+        if not np.any(keep):
+            return
+        energies = energies[keep]
+        idx = np.clip(((loudness[keep] - self.MIN_LUFS) / self.STEP).astype(np.int64), 0, len(self.counts) - 1)
+        self.counts += np.bincount(idx, minlength=len(self.counts))
+        self.energy += np.bincount(idx, weights=energies, minlength=len(self.counts))
+
+    def merge(self, other: "LoudnessHistogram") -> "LoudnessHistogram":
+        """
+        別区間のヒストグラムを加算する（ブロックの集合の和に相当し、厳密に結合できる）
+        """
+        self.counts += other.counts
+        self.energy += other.energy
+        return self
+
+    def without(self, other: "LoudnessHistogram") -> "LoudnessHistogram":
+        """
+        otherのブロックを取り除いたヒストグラムを新しく返す（ジャックナイフ推定用）
+        """
+        hist = LoudnessHistogram()
+        hist.counts = self.counts - other.counts
+        hist.energy = np.where(hist.counts > 0, self.energy - other.energy, 0.0)
+        return hist
+
+    def to_dict(self) -> dict:
+        """
+        保存用に空でないビンだけを取り出す
+        """
+        idx = np.nonzero(self.counts)[0]
+        return {"bins": idx.tolist(), "counts": self.counts[idx].tolist(), "energy": self.energy[idx].tolist()}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "LoudnessHistogram":
+        hist = cls()
+        idx = np.asarray(data["bins"], dtype=np.int64)
+        hist.counts[idx] = data["counts"]
+        hist.energy[idx] = data["energy"]
+        return hist
+
+    def _gated(self, relative_gate_lu: float):
+        # 相対ゲート閾値と、閾値を超えるビンのマスクを返す
+        total = self.counts.sum()
+        if total == 0:
+            return ABSOLUTE_GATE_LUFS, None
+        threshold = float(energy_to_lufs(self.energy.sum() / total)) + relative_gate_lu
+        filled = self.counts > 0
+        bin_loudness = np.full(len(self.counts), -np.inf)
+        bin_loudness[filled] = energy_to_lufs(self.energy[filled] / self.counts[filled])
+        return threshold, bin_loudness > threshold
+
+    def integrated(self) -> Tuple[float, float]:
+        """
+        (統合ラウドネスLUFS, 相対ゲート閾値LUFS) を返す
+        """
+        threshold, mask = self._gated(INTEGRATED_RELATIVE_GATE_LU)
+        if mask is None or not np.any(mask):
+            return float("-inf"), threshold
+        return float(energy_to_lufs(self.energy[mask].sum() / self.counts[mask].sum())), threshold
+
+    def loudness_range(self) -> float:
+        """
+        短期ラウドネス分布からLRA（95パーセンタイル−10パーセンタイル, EBU Tech 3342）を返す
+        """
+        _, mask = self._gated(LRA_RELATIVE_GATE_LU)
+        if mask is None or not np.any(mask):
+            return 0.0
+        counts = np.where(mask, self.counts, 0)
+        n = counts.sum()
+        cumulative = np.cumsum(counts)
+        bin_loudness = energy_to_lufs(self.energy / np.maximum(self.counts, 1))
+        low = bin_loudness[np.searchsorted(cumulative, int((n - 1) * 0.10 + 0.5), side="right")]
+        high = bin_loudness[np.searchsorted(cumulative, int((n - 1) * 0.95 + 0.5), side="right")]
+        return float(high - low)
+
+class TruePeakMeter:
+    """
+    ポリフェーズFIRによるオーバーサンプリング（96kHz未満は4倍）トゥルーピーク測定
+    """
+    def __init__(self, sample_rate: int, channels: int, taps_per_phase: int = 40):
+        self.factor = 4 if sample_rate < 96000 else 2 if sample_rate < 192000 else 1
+        n = self.factor * taps_per_phase
+        t = np.arange(n) - (n - 1) / 2.0
+        h = np.sinc(t / self.factor) * np.kaiser(n, 8.0)
+        h = h.reshape(taps_per_phase, self.factor)
+        h = h / h.sum(axis=0, keepdims=True)  # 各位相のDCゲインを1に
+        # 窓の古い順（先頭）→ 係数の遅延が大きい順
+        self.phases = h[::-1]
+        self.taps = taps_per_phase
+        self.history = np.zeros((taps_per_phase - 1, channels))
+        self.peak = 0.0
+
+    def add(self, x: np.ndarray) -> None:
+        if len(x) == 0:
+            return
+        xx = np.concatenate([self.history, x])
+        self.history = xx[len(xx) - (self.taps - 1):]
+        if self.factor > 1:
+            for c in range(xx.shape[1]):
+                for p in range(self.factor):
+                    upsampled = np.convolve(xx[:, c], self.phases[::-1, p], mode="valid")
+                    self.peak = max(self.peak, float(np.abs(upsampled).max()))
+        self.peak = max(self.peak, float(np.abs(x).max()))
+
+    def true_peak_db(self) -> float:
+        return 20.0 * math.log10(self.peak) if self.peak > 0 else float("-inf")
+
+class LoudnessStats:
+    """
+    結合可能な測定統計（400msブロック・3s短期のヒストグラムとピーク値）
+    時間チャンクごと・ファイルごとの統計をmerge()すると、
+    再デコードなしで全体（複数ファイルを連結した場合を含む）の統合ラウドネス・LRAを求められる
+    ※ファイル連結時は継ぎ目をまたぐブロック（最大で400ms×3個・3s×29個）は含まれない
+    """
+    def __init__(self, momentary: Optional[LoudnessHistogram] = None,
+                 short_term: Optional[LoudnessHistogram] = None, peak: float = 0.0):
+        self.momentary = momentary or LoudnessHistogram()
+        self.short_term = short_term or LoudnessHistogram()
+        self.peak = peak
+
+    def merge(self, other: "LoudnessStats") -> "LoudnessStats":
+        self.momentary.merge(other.momentary)
+        self.short_term.merge(other.short_term)
+        self.peak = max(self.peak, other.peak)
+        return self
+
+    def result(self) -> Dict[str, float]:
+        """
+        measure_loudnessと同じキー（input_i, input_tp, input_lra, input_thresh）で測定値を返す
+        """
+        integrated, threshold = self.momentary.integrated()
+        true_peak = 20.0 * math.log10(self.peak) if self.peak > 0 else float("-inf")
+        return {
+            "input_i": round(integrated, 2),
+            "input_tp": round(true_peak, 2),
+            "input_lra": round(self.short_term.loudness_range(), 2),
+            "input_thresh": round(threshold, 2),
+        }
+
+    def to_dict(self) -> dict:
+        return {
+            "momentary": self.momentary.to_dict(),
+            "short_term": self.short_term.to_dict(),
+            "peak": self.peak,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "LoudnessStats":
+        return cls(
+            LoudnessHistogram.from_dict(data["momentary"]),
+            LoudnessHistogram.from_dict(data["short_term"]),
+            float(data["peak"]),
+        )
+
+class R128Meter:
+    """
+    ストリーミングEBU R128メーター
+    add_frames()に(サンプル数, チャンネル数)のfloat PCMを順に渡し、result()で測定値を得る
+    - block_offset: 最初に渡すサンプルの位置（ファイル先頭からの100msサブブロック番号）
+    - count_range: 集計するブロックの開始サブブロック番号の範囲 [lo, hi)（hi=Noneは末尾まで）
+      時間チャンク分割時に、前後の重複デコード区間のブロックを二重に数えないために使う
+    """
+    SUBBLOCK_SEC = 0.1       # ブロックの更新間隔（100ms, 75%オーバーラップ）
+    MOMENTARY_SUBBLOCKS = 4  # 400msゲーティングブロック
+    SHORT_TERM_SUBBLOCKS = 30  # 3s短期ラウドネス
+
+    def __init__(self, sample_rate: int, channels: int, block_offset: int = 0,
+                 count_range: Optional[Tuple[int, Optional[int]]] = None):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self._filters = [BlockIIR(b, a, channels) for b, a in k_weighting_coefficients(sample_rate)]
+        self._weights = channel_weights(channels)
+        self._subblock_len = int(round(sample_rate * self.SUBBLOCK_SEC))
+        self._pending = np.zeros((0, channels))
+        self._recent = deque(maxlen=self.SHORT_TERM_SUBBLOCKS - 1)
+        self.momentary = LoudnessHistogram()
+        self.short_term = LoudnessHistogram()
+        self.true_peak = TruePeakMeter(sample_rate, channels)
+        self.samples = 0
+        self._subblocks = block_offset  # 次に確定するサブブロックの通し番号
+        self._count_range = count_range
+
+    def add_frames(self, frames: np.ndarray) -> None:
+        frames = np.asarray(frames, dtype=np.float64).reshape(-1, self.channels)
+        self.samples += len(frames)
+        self.true_peak.add(frames)
+        filtered = frames
+        for section in self._filters:
+            filtered = section.process(filtered)
+        squared = np.concatenate([self._pending, filtered * filtered])
+        n_sub = len(squared) // self._subblock_len
+        self._pending = squared[n_sub * self._subblock_len:]
+        if n_sub == 0:
+            return
+        # 100ms単位のチャンネル重み付き平均二乗値
+        sub = squared[:n_sub * self._subblock_len].reshape(n_sub, self._subblock_len, self.channels)
+        sub_energy = sub.mean(axis=1) @ self._weights
+        self._add_subblocks(sub_energy)
+
+    def _add_subblocks(self, sub_energy: np.ndarray) -> None:
+        history = np.array(self._recent)
+        series = np.concatenate([history, sub_energy])
+        csum = np.concatenate([[0.0], np.cumsum(series)])
+        end = np.arange(len(history), len(series)) + 1  # 今回追加したサブブロックで終わる窓
+        base = self._subblocks - len(history)  # series[0]の通し番号
+        for n_sub, hist in ((self.MOMENTARY_SUBBLOCKS, self.momentary), (self.SHORT_TERM_SUBBLOCKS, self.short_term)):
+            valid = end[end >= n_sub]
+            if self._count_range is not None:
+                lo, hi = self._count_range
+                start = base + valid - n_sub
+                keep = start >= lo
+                if hi is not None:
+                    keep &= start < hi
+                valid = valid[keep]
+            if len(valid):
+                hist.add((csum[valid] - csum[valid - n_sub]) / n_sub)
+        self._recent.extend(sub_energy[-(self.SHORT_TERM_SUBBLOCKS - 1):])
+        self._subblocks += len(sub_energy)
+
+    def stats(self) -> LoudnessStats:
+        """
+        結合可能な測定統計を返す
+        """
+        return LoudnessStats(self.momentary, self.short_term, self.true_peak.peak)
+
+    def result(self) -> Dict[str, float]:
+        """
+        measure_loudnessと同じキー（input_i, input_tp, input_lra, input_thresh）で測定値を返す
+        """
+        return self.stats().result()
+
+def _read_exact(stream, n: int) -> bytes:
+    data = stream.read(n)
+    if len(data) < n:
+        raise EOFError("PCMストリームが途中で終了しました")
+    return data
+
+def read_wav_header(stream) -> Tuple[int, int]:
+    """
+    ffmpegがパイプに書き出すWAVヘッダを読み、(チャンネル数, サンプルレート)を返す
+    dataチャンク直前まで読み進める（dataサイズはパイプ出力では不定のため無視）
+    """
+    riff = _read_exact(stream, 12)
+    if riff[:4] not in (b"RIFF", b"RF64") or riff[8:12] != b"WAVE":
+        raise ValueError("WAVストリームではありません")
+    channels = sample_rate = None
+    while True:
+        chunk_id, size = struct.unpack("<4sI", _read_exact(stream, 8))
+        if chunk_id == b"data":
+            if channels is None:
+                raise ValueError("fmtチャンクがありません")
+            return channels, sample_rate
+        body = _read_exact(stream, size + (size & 1))
+        if chunk_id == b"fmt ":
+            _, channels, sample_rate = struct.unpack("<HHI", body[:8])
+
+def build_pcm_cmd(input_path: Path, start: Optional[float] = None, duration: Optional[float] = None) -> list:
+    """
+    最初の音声ストリームをfloat32 WAVとして標準出力へ書き出すffmpegコマンド
+    """
+    cmd = ["ffmpeg", "-hide_banner", "-nostats", "-v", "error"]
+    if start:
+        cmd += ["-ss", str(start)]
+    cmd += ["-i", str(input_path)]
+    if duration is not None:
+        cmd += ["-t", str(duration)]
+    cmd += ["-map", "0:a:0", "-vn", "-c:a", "pcm_f32le", "-f", "wav", "-"]
+    return cmd
+
+def iter_pcm_blocks(proc: subprocess.Popen, channels: int, block_frames: int):
+    """
+    WAVヘッダを読み終えたプロセスのstdoutから(フレーム数, チャンネル数)のfloat32ブロックを順に返す
+    """
+    frame_bytes = channels * 4
+    while True:
+        data = proc.stdout.read(block_frames * frame_bytes)
+        usable = len(data) - len(data) % frame_bytes
+        if usable:
+            yield np.frombuffer(data[:usable], dtype="<f4").reshape(-1, channels)
+        if len(data) < block_frames * frame_bytes:
+            return
+
+def _drain(stream, sink: deque) -> None:
+    # stderrを読み捨てつつ末尾だけ保持（パイプ詰まりによるデッドロック防止）
+    for line in iter(stream.readline, b""):
+        sink.append(line.decode("utf-8", errors="ignore"))
+    stream.close()
+
+def measure_file(input_path: Path, start: Optional[float] = None, duration: Optional[float] = None,
+                 block_seconds: float = 0.5) -> Dict[str, float]:
+    """
+    ffmpegでデコードしたPCMをR128Meterで測定し、measure_loudnessと同じキーのdictを返す
+    """
+    meter = run_meter(input_path, start=start, duration=duration, block_seconds=block_seconds)
+    return meter.result()
+
+def run_meter(input_path: Path, start: Optional[float] = None, duration: Optional[float] = None,
+              block_seconds: float = 0.5, meter_factory=None, progress_callback=None) -> R128Meter:
+    """
+    ffmpegのPCMパイプをメーターに流し込み、測定済みのメーターを返す
+    meter_factory(sample_rate, channels) でメーターの生成方法を差し替え可能
+    progress_callback(秒数) にはブロックごとに、そのブロックまでにデコードした長さを渡す
+    """
+    proc = subprocess.Popen(build_pcm_cmd(input_path, start, duration),
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    stderr_tail = deque(maxlen=50)
+    drainer = threading.Thread(target=_drain, args=(proc.stderr, stderr_tail), daemon=True)
+    drainer.start()
+    meter = None
+    try:
+        channels, sample_rate = read_wav_header(proc.stdout)
+        meter = (meter_factory or R128Meter)(sample_rate, channels)
+        frames = 0
+        for block in iter_pcm_blocks(proc, channels, int(sample_rate * block_seconds)):
+            meter.add_frames(block)
+            frames += len(block)
+            if progress_callback:
+                progress_callback(frames / sample_rate)
+    except (EOFError, ValueError):
+        pass
+    finally:
+        proc.stdout.close()
+        ret = proc.wait()
+        drainer.join()
+    if meter is None or ret != 0:
+        raise RuntimeError(f"PCMデコードに失敗しました (return code={ret}): {''.join(stderr_tail)}")
+    return meter
+
+# チャンク先頭で読み捨てるフィルタ安定用の区間（100msサブブロック数）
+CHUNK_PREROLL_SUBBLOCKS = 5
+
+def chunk_ranges(duration: float, chunks: int) -> List[Tuple[int, Optional[int]]]:
+    """
+    再生時間をchunks個の区間に分け、各区間が集計するブロック開始位置 [lo, hi)（サブブロック番号）を返す
+    最後の区間はhi=None（ファイル末尾まで）
+    """
+    total = max(int(duration / R128Meter.SUBBLOCK_SEC), 1)
+    chunks = max(1, min(chunks, total))
+    bounds = [total * i // chunks for i in range(chunks)]
+    return [(lo, hi) for lo, hi in zip(bounds, bounds[1:] + [None])]
+
+def measure_chunk(input_path: Path, count_range: Tuple[int, Optional[int]],
+                  block_seconds: float = 0.5, progress_callback=None) -> LoudnessStats:
+    """
+    1区間を測定する
+    区間の前はフィルタ安定用に少し余分にデコードし、後ろは区間内で始まる3sブロックが揃うまでデコードする
+    progress_callback: run_meterと同じ（区間内でデコードした秒数）
+    """
+    lo, hi = count_range
+    first = max(lo - CHUNK_PREROLL_SUBBLOCKS, 0)
+    start = first * R128Meter.SUBBLOCK_SEC
+    duration = None
+    if hi is not None:
+        duration = (hi + R128Meter.SHORT_TERM_SUBBLOCKS - first) * R128Meter.SUBBLOCK_SEC
+    meter = run_meter(
+        input_path, start=start, duration=duration, block_seconds=block_seconds,
+        meter_factory=lambda sr, ch: R128Meter(sr, ch, block_offset=first, count_range=count_range),
+        progress_callback=progress_callback
+    )
+    return meter.stats()
+
+def measure_file_chunked(input_path: Path, duration: float, chunks: int,
+                         max_workers: Optional[int] = None, progress_callback=None) -> LoudnessStats:
+    """
+    ファイルを時間チャンクに分割して並列に測定し、ヒストグラムを結合した統計を返す
+    各チャンクは別のffmpegプロセスでデコードされ、NumPy演算中はGILが解放されるためコア数に応じて速くなる
+    progress_callback(割合) には全チャンクでデコードした長さの割合(0〜1)を1%進むごとに渡す
+    """
+    ranges = chunk_ranges(duration, chunks)
+    decoded = [0.0] * len(ranges)
+    reported = [-1]
+    lock = threading.Lock()
+
+    def on_chunk_progress(index, seconds):
+        with lock:
+            decoded[index] = seconds
+            fraction = min(sum(decoded) / duration, 1.0) if duration > 0 else 0.0
+            if int(fraction * 100) <= reported[0]:
+                return
+            reported[0] = int(fraction * 100)
+        progress_callback(fraction)
+
+    def measure(index):
+        callback = (lambda seconds: on_chunk_progress(index, seconds)) if progress_callback else None
+        return measure_chunk(input_path, ranges[index], progress_callback=callback)
+
+    with ThreadPoolExecutor(max_workers=max_workers or len(ranges)) as pool:
+        parts = list(pool.map(measure, range(len(ranges))))
+    stats = LoudnessStats()
+    for part in parts:
+        stats.merge(part)
+    return stats
+
+def jackknife_halfwidth(total: LoudnessHistogram, parts: List[LoudnessHistogram],
+                        population: int, z: float = 1.96) -> float:
+    """
+    窓ごとのヒストグラムから統合ラウドネスの信頼区間の半幅（LU）をジャックナイフ法で求める
+    population: 窓の総数（有限母集団修正に使う。全窓を測定済みなら0）
+    """
+    n = len(parts)
+    if n < 2:
+        return float("inf")
+    loo = np.array([total.without(part).integrated()[0] for part in parts])
+    finite = np.isfinite(loo)
+    if not np.any(finite):
+        return 0.0  # どの窓を除いても無音（全窓が絶対ゲート以下）
+    if not np.all(finite):
+        return float("inf")
+    variance = (n - 1) / n * float(((loo - loo.mean()) ** 2).sum())
+    fpc = max(1.0 - n / population, 0.0) if population else 0.0
+    return z * math.sqrt(variance * fpc)
+
+def estimate_file(input_path: Path, duration: float, tolerance_lu: float = 0.3, window_sec: float = 10.0,
+                  strata: int = 6, max_workers: Optional[int] = None, min_windows: int = 4,
+                  z: float = 1.96, seed: Optional[int] = None, log_callback=None) -> Dict[str, float]:
+    """
+    層化ランダム窓でラウドネスを推定し、信頼区間が±tolerance_lu以内になった時点で打ち切る
+    - ファイルをwindow_sec秒の窓に区切り、strata個の層から1窓ずつ無作為に選んで並列に測定する
+    - 推定値は測定済み窓のヒストグラムを結合した統合ラウドネス（全窓を測れば全区間測定と一致）
+    - 信頼区間は窓単位のジャックナイフ＋有限母集団修正（TP・LRAは測定窓からの参考値）
+    戻り値: input_i/input_tp/input_lra/input_thresh に ci_low/ci_high/decoded_fraction/windows を加えたdict
+    """
+    window = max(int(round(window_sec / R128Meter.SUBBLOCK_SEC)), R128Meter.SHORT_TERM_SUBBLOCKS)
+    total_subblocks = max(int(duration / R128Meter.SUBBLOCK_SEC), 1)
+    slots = max(total_subblocks // window, 1)
+    strata = max(1, min(strata, slots))
+    rng = np.random.default_rng(seed)
+    # 層ごとの未測定の窓（無作為順）
+    remaining = [list(rng.permutation(np.arange(slots * k // strata, slots * (k + 1) // strata)))
+                 for k in range(strata)]
+
+    def window_range(slot):
+        # 最後の窓はファイル末尾までを受け持つ（全窓測定で全区間と一致させるため）
+        return slot * window, (None if slot == slots - 1 else (slot + 1) * window)
+
+    def decoded_seconds(slot):
+        lo, hi = window_range(slot)
+        first = max(lo - CHUNK_PREROLL_SUBBLOCKS, 0)
+        end = total_subblocks if hi is None else min(hi + R128Meter.SHORT_TERM_SUBBLOCKS, total_subblocks)
+        return (end - first) * R128Meter.SUBBLOCK_SEC
+
+    total = LoudnessStats()
+    parts: List[LoudnessHistogram] = []
+    decoded = 0.0
+    halfwidth = float("inf")
+    with ThreadPoolExecutor(max_workers=max_workers or strata) as pool:
+        while any(remaining):
+            batch = [stratum.pop() for stratum in remaining if stratum]
+            for slot, stats in zip(batch, pool.map(lambda slot: measure_chunk(input_path, window_range(slot)), batch)):
+                total.merge(stats)
+                parts.append(stats.momentary)
+                decoded += decoded_seconds(slot)
+            unmeasured = sum(len(stratum) for stratum in remaining)
+            halfwidth = jackknife_halfwidth(total.momentary, parts, len(parts) + unmeasured, z) if unmeasured else 0.0
+            if log_callback:
+                log_callback(f"窓{len(parts)}/{slots}: I={total.result()['input_i']} LUFS ±{halfwidth:.2f} LU")
+            if len(parts) >= min(min_windows, slots) and halfwidth <= tolerance_lu:
+                break
+    result = total.result()
+    integrated = result["input_i"]
+    if not math.isfinite(integrated):
+        halfwidth = 0.0
+    result.update({
+        "ci_low": round(integrated - halfwidth, 2),
+        "ci_high": round(integrated + halfwidth, 2),
+        "decoded_fraction": round(min(float(decoded) / duration, 1.0), 3) if duration > 0 else 1.0,
+        "windows": len(parts),
+    })
+    return result
@@ -0,0 +1,165 @@
+"""
+映像エンコーダの対応状況を調べてキャッシュするレジストリ
+- ffmpeg -encoders で組み込まれているエンコーダを調べ、候補は1フレームの試し書き出しで実際に使えるか確認する
+- 結果はユーザーキャッシュにJSONで保存（ffmpegのバージョン行と実行ファイルのサンプリングハッシュがキー）
+- コマンド生成側は失敗するまで順に試すのではなく、最初から使えるエンコーダを選ぶ
+"""
+import json
+import re
+import shutil
+import subprocess
+import threading
+from pathlib import Path
+from typing import Optional, Sequence, Set
+
+from core.loudness_cache import file_fingerprint, user_cache_dir
+
+# 優先順（HWエンコーダ → ソフトウェア）。組み込まれていない・デバイスがないものは試し書き出しで除外される
+H264_ENCODERS = ("h264_videotoolbox", "h264_nvenc", "h264_qsv", "h264_amf", "libx264", "libopenh264")
+HEVC_ENCODERS = ("hevc_videotoolbox", "hevc_nvenc", "hevc_qsv", "hevc_amf", "libx265")
+# 試し書き出しの時間上限（秒）
+TEST_TIMEOUT = 20
+# ffmpeg -encoders の1行（例: " V....D libx264  libx264 H.264 ..."）
+_ENCODER_LINE = re.compile(r"^\s*[VAS][A-Z.]{5}\s+(\S+)", re.MULTILINE)
+
+def parse_encoders(output: str) -> Set[str]:
+    """
+    ffmpeg -encoders の出力からエンコーダ名を取り出す（凡例の "V..... = Video" 行は除く）
+    """
+    return {name for name in _ENCODER_LINE.findall(output) if name != "="}
+
+def ffmpeg_binary_key(ffmpeg: str = "ffmpeg") -> Optional[str]:
+    """
+    ffmpegの実行ファイルを識別するキー（バージョン行＋サンプリングハッシュ。見つからなければNone）
+    """
+    path = shutil.which(ffmpeg)
+    if path is None:
+        return None
+    try:
+        out = subprocess.run([path, "-hide_banner", "-version"], capture_output=True, text=True,
+                             encoding="utf-8", errors="ignore").stdout
+    except OSError:
+        return None
+    version = out.splitlines()[0].strip() if out else ""
+    return f"{version}|{file_fingerprint(Path(path).resolve())[3]}"
+
+class EncoderRegistry:
+    """
+    エンコーダの対応状況（ffmpegの実行ファイルごとにディスクへキャッシュ）
+    """
+    _default = None
+    _default_lock = threading.Lock()
+
+    def __init__(self, ffmpeg: str = "ffmpeg", cache_path: Optional[Path] = None):
+        self.ffmpeg = ffmpeg
+        self.cache_path = Path(cache_path) if cache_path else user_cache_dir() / "encoders.json"
+        self._lock = threading.Lock()
+        self._key = None
+        self._entry = None
+
+    @classmethod
+    def default(cls) -> "EncoderRegistry":
+        """
+        アプリ全体で共有するインスタンスを返す
+        """
+        with cls._default_lock:
+            if cls._default is None:
+                cls._default = cls()
+            return cls._default
+
+    def binary_key(self) -> Optional[str]:
+        """
+        キャッシュのキー（ffmpeg_binary_keyを参照）
+        """
+        return ffmpeg_binary_key(self.ffmpeg)
+
+    def _load_entry(self) -> Optional[dict]:
+        # 呼び出し側で self._lock を取得済み
+        if self._entry is not None:
+            return self._entry
+        self._key = self.binary_key()
+        if self._key is None:
+            return None
+        cache = self._read_cache()
+        entry = cache.get(self._key)
+        if entry is None:
+            out = subprocess.run([self.ffmpeg, "-hide_banner", "-encoders"], capture_output=True, text=True,
+                                 encoding="utf-8", errors="ignore").stdout
+            entry = {"encoders": sorted(parse_encoders(out)), "tested": {}}
+            cache[self._key] = entry
+            self._write_cache(cache)
+        self._entry = entry
+        return entry
+
+    def _read_cache(self) -> dict:
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def _write_cache(self, cache: dict) -> None:
+        tmp = self.cache_path.with_suffix(".tmp")
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(cache, f, ensure_ascii=False, indent=1)
+            tmp.replace(self.cache_path)
+        except OSError:
+            pass
+
+    def encoders(self) -> Set[str]:
+        """
+        ffmpegに組み込まれているエンコーダ名
+        """
+        with self._lock:
+            entry = self._load_entry()
+            return set(entry["encoders"]) if entry else set()
+
+    def works(self, name: str) -> bool:
+        """
+        エンコーダが実際に使えるか（初回のみ1フレームを試し書き出しし、結果をキャッシュ）
+        """
+        with self._lock:
+            entry = self._load_entry()
+            if entry is None or name not in entry["encoders"]:
+                return False
+            if name not in entry["tested"]:
+                entry["tested"][name] = self._test_encode(name)
+                cache = self._read_cache()
+                cache[self._key] = entry
+                self._write_cache(cache)
+            return entry["tested"][name]
+
+    def _test_encode(self, name: str) -> bool:
+        # HWエンコーダの最小解像度を満たすサイズで1フレームだけ書き出す
+        cmd = [
+            self.ffmpeg, "-hide_banner", "-v", "error",
+            "-f", "lavfi", "-i", "color=c=black:s=256x256:r=30",
+            "-frames:v", "1", "-c:v", name, "-f", "null", "-"
+        ]
+        try:
+            return subprocess.run(cmd, capture_output=True, timeout=TEST_TIMEOUT).returncode == 0
+        except (OSError, subprocess.TimeoutExpired):
+            return False
+
+    def best(self, candidates: Sequence[str], fallback: Optional[str] = None) -> Optional[str]:
+        """
+        候補のうち最初に使えるエンコーダ（どれも使えなければfallback）
+        """
+        for name in candidates:
+            if self.works(name):
+                return name
+        return fallback
+
+    def best_h264(self) -> str:
+        """
+        H.264で使えるエンコーダ（確認できなければlibx264）
+        """
+        return self.best(H264_ENCODERS, fallback="libx264")
+
+    def best_hevc(self) -> Optional[str]:
+        """
+        H.265で使えるエンコーダ（なければNone）
+        """
+        return self.best(HEVC_ENCODERS)
@@ -1,26 +1,224 @@
 """
 ffmpegコマンド実行＋ログストリーム
 """
+import os
+import re
 import subprocess
-from typing import Callable, List
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+from core.cpu_budget import pin_process
+from core.log_capture import LogCapture
+from core.proc_sampler import ProcSampler, ResourceSummary, record_command, wait_exited
+
+# 進捗イベントをコールバックへ渡す最小間隔（秒）
+PROGRESS_INTERVAL = 0.5
+# 入力ヘッダの再生時間（durationを渡さなかった場合の進捗率の基準）
+_DURATION_LINE = re.compile(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)")
+
+@dataclass
+class ProgressEvent:
+    """
+    ffmpegの-progress出力1ブロック分の進捗
+    - out_time: 書き出し済みの長さ(秒) / speed: 実時間比（1.0で等速）
+    - percent / eta: 全体の長さが分かる場合のみ（eta は残り秒数）
+    """
+    out_time: float = 0.0
+    speed: Optional[float] = None
+    fps: Optional[float] = None
+    total_size: Optional[int] = None
+    frame: Optional[int] = None
+    duration: Optional[float] = None
+    percent: Optional[float] = None
+    eta: Optional[float] = None
+    done: bool = False
+
+    def format(self) -> str:
+        """
+        進捗列に表示する文字列（例: "42% 3.1x 残り0:12"）
+        """
+        if self.done:
+            return "100%"
+        parts = [f"{self.percent:.0f}%" if self.percent is not None else _format_seconds(self.out_time)]
+        if self.speed is not None:
+            parts.append(f"{self.speed:.1f}x")
+        if self.eta is not None:
+            parts.append(f"残り{_format_seconds(self.eta)}")
+        return " ".join(parts)
+
+def duration_from_log(line: str) -> Optional[float]:
+    """
+    ffmpegのログ行 "Duration: 00:01:02.50" から秒数を取り出す（該当しなければNone）
+    """
+    m = _DURATION_LINE.search(line)
+    if not m:
+        return None
+    return int(m.group(1)) * 3600 + int(m.group(2)) * 60 + float(m.group(3))
+
+def _format_seconds(seconds: float) -> str:
+    seconds = int(max(seconds, 0))
+    h, rest = divmod(seconds, 3600)
+    m, s = divmod(rest, 60)
+    return f"{h}:{m:02d}:{s:02d}" if h else f"{m}:{s:02d}"
+
+def _number(value: Optional[str], cast=float):
+    # "N/A" や " 48x" を数値に（変換できなければNone）
+    if value is None:
+        return None
+    try:
+        return cast(value.strip().rstrip("x"))
+    except ValueError:
+        return None
+
+class ProgressParser:
+    """
+    ffmpegの-progress出力（key=valueの行が progress=continue/end で区切られる）を
+    ProgressEventに変換する
+    """
+    def __init__(self, duration: Optional[float] = None):
+        self.duration = duration
+        self._block: Dict[str, str] = {}
+
+    def feed(self, line: str) -> Optional[ProgressEvent]:
+        """
+        1行を読み込み、ブロックの終わり（progress=）ならイベントを返す
+        """
+        key, sep, value = line.strip().partition("=")
+        if not sep:
+            return None
+        if key != "progress":
+            self._block[key] = value
+            return None
+        block, self._block = self._block, {}
+        # out_time_msも実際はマイクロ秒（ffmpegの仕様）
+        out_us = _number(block.get("out_time_us"), int)
+        if out_us is None:
+            out_us = _number(block.get("out_time_ms"), int)
+        return self.event(
+            max(out_us or 0, 0) / 1e6,
+            speed=_number(block.get("speed")),
+            done=value.strip() == "end",
+            fps=_number(block.get("fps")),
+            total_size=_number(block.get("total_size"), int),
+            frame=_number(block.get("frame"), int),
+        )
+
+    def event(self, out_time: float, speed: Optional[float] = None, done: bool = False, **fields) -> ProgressEvent:
+        """
+        書き出し済みの長さと速度から、進捗率・残り時間を補ったProgressEventを作る
+        （ffmpeg以外の処理が同じ形式で進捗を通知するときにも使う）
+        """
+        event = ProgressEvent(out_time=out_time, speed=speed, duration=self.duration, done=done, **fields)
+        if self.duration and self.duration > 0:
+            event.percent = 100.0 if done else min(event.out_time / self.duration * 100.0, 100.0)
+            if not done and event.speed:
+                event.eta = max(self.duration - event.out_time, 0.0) / event.speed
+        return event
 
 class Executor:
     """
     コマンド実行・ログストリームクラス
     """
     @staticmethod
-    def run_command(cmd: List[str], log_callback: Callable[[str], None]=None) -> int:
+    def _is_ffmpeg(cmd: List[str]) -> bool:
+        return bool(cmd) and Path(cmd[0]).name.lower().startswith("ffmpeg")
+
+    @staticmethod
+    def with_progress(cmd: List[str], fd: int) -> List[str]:
+        """
+        ffmpegコマンドに -progress pipe:{fd} -nostats を追加（ffmpeg以外はそのまま返す）
+        -nostatsで\\r区切りの統計行を止め、進捗は専用のパイプから読む
+        """
+        if not Executor._is_ffmpeg(cmd):
+            return cmd
+        return [cmd[0], "-progress", f"pipe:{fd}", "-nostats", *cmd[1:]]
+
+    @staticmethod
+    def run_command(cmd: List[str], log_callback: Callable[[str], None]=None,
+                    progress_callback: Callable[[ProgressEvent], None]=None,
+                    duration: Optional[float]=None, progress_interval: float=PROGRESS_INTERVAL,
+                    capture: Optional[LogCapture]=None, affinity: Optional[Sequence[int]]=None,
+                    resources_callback: Callable[[ResourceSummary], None]=None) -> int:
         """
         コマンドを実行し、標準出力・標準エラーをリアルタイムでコールバックに渡す
         Args:
             cmd (List[str]): 実行コマンド
             log_callback (Callable): ログ出力用コールバック
+            progress_callback (Callable): 進捗(ProgressEvent)の通知先。ffmpegのみ対応、progress_interval秒ごとに間引く
+            duration (float): 出力の長さ(秒)。進捗率・残り時間の基準（省略時はログの入力Durationを使う）
+            capture (LogCapture): ログの保存先（末尾と重要行のみ保持するため長時間のジョブでもメモリが増えない）
+            affinity (Sequence[int]): 子プロセスを固定するCPUコア（CpuAllocation.cores。Linuxのみ）
+            resources_callback (Callable): 終了時のリソース使用量(ResourceSummary)の通知先（ジョブログには常に記録）
         Returns:
             int: プロセスの終了コード
         """
-        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1)
+        if progress_callback is None or os.name == "nt" or not Executor._is_ffmpeg(cmd):
+            # 進捗不要（Windowsはpass_fds非対応のため進捗なし）
+            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1)
+            pin_process(process.pid, affinity)
+            sampler = ProcSampler(process.pid).start()
+            for line in process.stdout:
+                Executor._emit(line.rstrip(), log_callback, capture)
+            process.stdout.close()
+            return Executor._finish(cmd, process, sampler, resources_callback)
+
+        parser = ProgressParser(duration)
+        read_fd, write_fd = os.pipe()
+        try:
+            process = subprocess.Popen(Executor.with_progress(cmd, write_fd), stdout=subprocess.PIPE,
+                                       stderr=subprocess.STDOUT, text=True, bufsize=1, pass_fds=(write_fd,))
+        except Exception:
+            os.close(read_fd)
+            raise
+        finally:
+            os.close(write_fd)
+        pin_process(process.pid, affinity)
+        sampler = ProcSampler(process.pid).start()
+        reader = threading.Thread(target=Executor._read_progress,
+                                  args=(read_fd, parser, progress_callback, progress_interval), daemon=True)
+        reader.start()
         for line in process.stdout:
-            if log_callback:
-                log_callback(line.rstrip())
+            if parser.duration is None:
+                parser.duration = duration_from_log(line)
+            Executor._emit(line.rstrip(), log_callback, capture)
         process.stdout.close()
-        return process.wait()
+        ret = Executor._finish(cmd, process, sampler, resources_callback)
+        reader.join()
+        return ret
+
+    @staticmethod
+    def _finish(cmd: List[str], process: subprocess.Popen, sampler: ProcSampler,
+                resources_callback: Optional[Callable[[ResourceSummary], None]]) -> int:
+        # 終了を待ってゾンビのうちに最後の値を読んでから回収し、ジョブログに記録する
+        wait_exited(process.pid)
+        summary = sampler.stop()
+        ret = process.wait()
+        record_command(cmd, summary, ret)
+        if resources_callback:
+            resources_callback(summary)
+        return ret
+
+    @staticmethod
+    def _emit(line: str, log_callback: Optional[Callable[[str], None]], capture: Optional[LogCapture]) -> None:
+        if capture is not None:
+            capture.append(line)
+        if log_callback:
+            log_callback(line)
+
+    @staticmethod
+    def _read_progress(fd: int, parser: ProgressParser, callback: Callable[[ProgressEvent], None],
+                       interval: float) -> None:
+        # 進捗パイプを読み、完了イベント以外はinterval秒ごとに間引いて通知
+        last = 0.0
+        with os.fdopen(fd, "r", encoding="utf-8", errors="ignore") as stream:
+            for line in stream:
+                event = parser.feed(line)
+                if event is None:
+                    continue
+                now = time.monotonic()
+                if event.done or now - last >= interval:
+                    last = now
+                    callback(event)
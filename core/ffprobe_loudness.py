@@ -3,65 +3,59 @@ ffprobeによるラウドネス測定ユーティリティ
 """
 import subprocess
 import json
+import math
+import os
 from pathlib import Path
-from typing import Dict, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
+
+from core.log_capture import LogCapture
+from core.loudness_cache import LoudnessCache
+
+# R128統計（結合可能なヒストグラム）のキャッシュ識別子
+R128_STATS_PARAMS = "r128-numpy;hist-v1"
+# 自動分割時のチャンク長の下限（秒）
+R128_MIN_CHUNK_SEC = 60.0
 
 class FFprobeLoudness:
     @staticmethod
-    def is_silent(input_path: Path, threshold_db: float = -90.0) -> bool:
+    def has_audio_stream(input_path: Path) -> bool:
         """
-        音声が完全無音か判定（max_volumeがthreshold_db未満なら無音とみなす）
+        指定ファイルに音声ストリームが存在するか判定（取得に失敗した場合はFalse）
         """
-        import subprocess, re
-        cmd = [
-            "ffmpeg", "-y", "-i", str(input_path),
-            "-af", "volumedetect", "-f", "null", "-"
-        ]
-        try:
-            proc = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
-            out = proc.stderr
-            m = re.search(r"max_volume: ([\-\d\.]+) dB", out)
-            if m:
-                max_vol = float(m.group(1))
-                return max_vol < threshold_db
-        except Exception:
-            pass
-        return False
+        from core.media_probe import probe
+        return probe(input_path).has_audio
 
     @staticmethod
-    def has_audio_stream(input_path: Path) -> bool:
+    def get_duration(input_path: Path) -> float:
         """
-        指定ファイルに音声ストリームが存在するか判定
+        コンテナの再生時間（秒）を取得（media_probeのキャッシュを使う。失敗時は例外）
         """
-        import subprocess, json
-        cmd = [
-            "ffprobe", "-v", "error",
-            "-select_streams", "a",
-            "-show_entries", "stream=index",
-            "-of", "json", str(input_path)
-        ]
-        try:
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
-            info = json.loads(result.stdout)
-            return bool(info.get('streams'))
-        except Exception:
-            return False
+        from core.media_probe import probe
+        info = probe(input_path)
+        if info.duration is None:
+            raise ValueError(info.error or f"再生時間を取得できません: {input_path}")
+        return info.duration
 
     @staticmethod
-    def measure_loudness(input_path: Path) -> Optional[Tuple[Dict[str, float], str]]:
+    def measure_loudness(input_path: Path, use_cache: bool = True) -> Optional[Tuple[Dict[str, float], str]]:
         """
         前半・中盤・後半の3点でラウドネス値（LUFS, LRA, TPなど）をサンプリングし平均値を返す
-        戻り値: (平均測定値dict, ffmpegのstderr全文)
+        - キャッシュに全区間の測定結果があればそれを優先して返す（補正ページの解析結果も共有）
+        戻り値: (平均測定値dict, ffmpegのstderr（LogCaptureで末尾と重要行のみ）)
         """
         import subprocess, json, re
+        params = "loudnorm=I=-23:TP=-1.5:LRA=7;windows=3x60s"
+        if use_cache:
+            cache = LoudnessCache.default()
+            cached = cache.get_full(input_path)
+            if cached:
+                return cached, "[キャッシュ] 全区間の測定結果を使用しました"
+            cached = cache.get(input_path, "sampled", params)
+            if cached:
+                return cached, "[キャッシュ] サンプリング測定結果を使用しました"
         # --- 動画全体の長さ（秒）を取得 ---
         try:
-            ffprobe_cmd = [
-                "ffprobe", "-v", "error", "-show_entries", "format=duration",
-                "-of", "default=noprint_wrappers=1:nokey=1", str(input_path)
-            ]
-            duration_result = subprocess.run(ffprobe_cmd, capture_output=True, text=True, timeout=10)
-            total_duration = float(duration_result.stdout.strip())
+            total_duration = FFprobeLoudness.get_duration(input_path)
         except Exception as e:
             return None, f"duration取得失敗: {e}"
 
@@ -69,7 +63,7 @@ class FFprobeLoudness:
         sample_length = 60.0
         positions = [0.0, max((total_duration - sample_length) / 2, 0), max(total_duration - sample_length, 0)]
         results = []
-        stderrs = []
+        stderrs = LogCapture()
         for ss in positions:
             # ffmpeg loudnormで各区間を測定
             cmd = [
@@ -81,7 +75,7 @@ class FFprobeLoudness:
             try:
                 proc = subprocess.run(cmd, capture_output=True, text=True, timeout=90)
                 out = proc.stderr
-                stderrs.append(out)
+                stderrs.extend(out.splitlines())
                 m = re.search(r'\{[\s\S]+?\}', out)
                 if m:
                     loudness_json = json.loads(m.group(0))
@@ -90,7 +84,7 @@ class FFprobeLoudness:
                 stderrs.append(str(e))
 
         if not results:
-            return None, '\n'.join(stderrs)
+            return None, stderrs.text()
 
         # --- 各値を平均化 ---
         keys = [
@@ -101,5 +95,143 @@ class FFprobeLoudness:
         for k in keys:
             vals = [float(r.get(k, 0)) for r in results if k in r]
             avg[k] = sum(vals) / len(vals) if vals else 0.0
-        return avg, '\n'.join(stderrs)
+        if use_cache:
+            LoudnessCache.default().put(input_path, "sampled", params, avg)
+        return avg, stderrs.text()
+
+    @staticmethod
+    def measure_many(input_paths: List[Path], use_cache: bool = True) -> Dict[str, Tuple[Optional[Dict[str, str]], str]]:
+        """
+        複数ファイルの全区間ラウドネス（loudnorm）をまとめて測定し {パス文字列: (測定値dict, ログ文字列)} を返す
+        短いクリップは複数入力を1回のffmpeg実行にまとめる（MediaAnalysis.analyze_many）
+        """
+        from core.media_analysis import MediaAnalysis
+        analyses = MediaAnalysis.analyze_many(input_paths, use_cache=use_cache)
+        results = {}
+        for path in input_paths:
+            analysis = analyses[str(path)]
+            if analysis.loudness:
+                results[str(path)] = (analysis.loudness, "[一括] 全区間をloudnormで測定しました")
+            elif not analysis.has_audio:
+                results[str(path)] = (None, analysis.error or "音声ストリームがありません")
+            else:
+                results[str(path)] = (None, analysis.error or analysis.log)
+        return results
+
+    @staticmethod
+    def measure_loudness_r128(input_path: Path, use_cache: bool = True, chunks: Optional[int] = None,
+                              max_workers: Optional[int] = None,
+                              progress_callback=None) -> Optional[Tuple[Dict[str, float], str]]:
+        """
+        全区間をNumPyのEBU R128エンジンで測定（stderrのJSON解析に依存しない）
+        - ファイルを時間チャンクに分け、-ss/-tで並列にデコード・測定してヒストグラムを結合する（結果は1パス測定と一致）
+        - chunks=Noneなら再生時間とCPU数から自動決定（60秒未満のチャンクは作らない）
+        - 結合可能な統計もキャッシュに保存し、loudness_of_concatenationで再利用する
+        - progress_callback(割合) にデコードの進み具合(0〜1)を渡す（キャッシュから返す場合は呼ばない）
+        戻り値: (measure_loudnessと同じキーの測定値dict, ログ文字列)
+        """
+        stats, log = FFprobeLoudness._r128_stats(input_path, use_cache, chunks, max_workers, progress_callback)
+        if stats is None:
+            if log.startswith("[キャッシュ]"):
+                return LoudnessCache.default().get_full(input_path), log
+            return None, log
+        return stats.result(), log
+
+    @staticmethod
+    def _r128_stats(input_path: Path, use_cache: bool, chunks: Optional[int], max_workers: Optional[int],
+                    progress_callback=None):
+        """
+        R128統計を取得（キャッシュ優先）。全区間の測定値だけがキャッシュにある場合は(None, キャッシュログ)を返す
+        """
+        from core.ebur128 import LoudnessStats, measure_file_chunked
+        cache = LoudnessCache.default() if use_cache else None
+        if cache:
+            cached = cache.get(input_path, "r128-stats", R128_STATS_PARAMS)
+            if cached:
+                return LoudnessStats.from_dict(cached), "[キャッシュ] R128統計を使用しました"
+            if cache.get_full(input_path):
+                return None, "[キャッシュ] 全区間の測定結果を使用しました"
+        try:
+            duration = FFprobeLoudness.get_duration(input_path)
+        except Exception as e:
+            return None, f"duration取得失敗: {e}"
+        if chunks is None:
+            chunks = max(1, min(os.cpu_count() or 1, math.ceil(duration / R128_MIN_CHUNK_SEC)))
+        try:
+            stats = measure_file_chunked(input_path, duration, chunks, max_workers, progress_callback)
+        except Exception as e:
+            return None, str(e)
+        if cache:
+            cache.put(input_path, "r128-stats", R128_STATS_PARAMS, stats.to_dict())
+            result = stats.result()
+            # 無音（-inf）はloudnormのmeasured_*に渡せないため、全区間の測定値としては共有しない
+            if math.isfinite(result["input_i"]) and math.isfinite(result["input_tp"]):
+                cache.put(input_path, "full", R128_STATS_PARAMS, result)
+        return stats, f"[R128] 全区間をNumPyエンジンで測定しました（{chunks}チャンク並列）"
 
+    @staticmethod
+    def estimate_loudness(input_path: Path, tolerance_lu: float = 0.3, window_sec: float = 10.0,
+                          max_workers: Optional[int] = None, use_cache: bool = True,
+                          log_callback=None) -> Optional[Tuple[Dict[str, float], str]]:
+        """
+        層化ランダム窓を並列に測定し、統合ラウドネスの95%信頼区間が±tolerance_lu以内になったら打ち切る推定モード
+        - 結果には ci_low / ci_high（信頼区間）と decoded_fraction（デコードした割合）を含む
+        - 全区間の測定結果がキャッシュにあればそれを返す（信頼区間の幅は0）
+        戻り値: (測定値dict, ログ文字列)
+        """
+        from core.ebur128 import estimate_file
+        params = f"r128-estimate;tol={tolerance_lu};win={window_sec}"
+        cache = LoudnessCache.default() if use_cache else None
+        if cache:
+            cached = cache.get_full(input_path)
+            if cached:
+                integrated = cached["input_i"]
+                return dict(cached, ci_low=integrated, ci_high=integrated, decoded_fraction=0.0), \
+                    "[キャッシュ] 全区間の測定結果を使用しました"
+            cached = cache.get(input_path, "estimate", params)
+            if cached:
+                return cached, "[キャッシュ] 推定結果を使用しました"
+        try:
+            duration = FFprobeLoudness.get_duration(input_path)
+        except Exception as e:
+            return None, f"duration取得失敗: {e}"
+        try:
+            result = estimate_file(input_path, duration, tolerance_lu=tolerance_lu, window_sec=window_sec,
+                                   max_workers=max_workers, log_callback=log_callback)
+        except Exception as e:
+            return None, str(e)
+        if cache:
+            cache.put(input_path, "estimate", params, result)
+        return result, (f"[R128推定] {result['windows']}窓・{result['decoded_fraction'] * 100:.1f}%をデコード "
+                        f"(95%信頼区間 {result['ci_low']}〜{result['ci_high']} LUFS)")
+
+    @staticmethod
+    def loudness_of_concatenation(input_paths: List[Path], use_cache: bool = True,
+                                  progress_callback=None) -> Optional[Tuple[Dict[str, float], str]]:
+        """
+        複数ファイルを連結した場合のラウドネスを、各ファイルのR128統計の結合から求める
+        - 統計がキャッシュ済みのファイルは再デコードしない
+        - ファイルの継ぎ目をまたぐブロックは含まれないため、連結後に実測した値とはわずかに異なりうる
+        - progress_callback(割合) に全ファイルを通した進み具合(0〜1)を渡す
+        戻り値: (測定値dict, ログ文字列)
+        """
+        from core.ebur128 import LoudnessStats
+        total = LoudnessStats()
+        logs = []
+        for index, path in enumerate(input_paths):
+            on_progress = None
+            if progress_callback:
+                on_progress = lambda fraction, index=index: progress_callback((index + fraction) / len(input_paths))
+            stats, log = FFprobeLoudness._r128_stats(path, use_cache, None, None, on_progress)
+            if stats is None and log.startswith("[キャッシュ]"):
+                # 統計のないキャッシュ（loudnorm測定値のみ）は結合できないため測り直す
+                stats, log = FFprobeLoudness._r128_stats(path, False, None, None, on_progress)
+                if stats is not None and use_cache:
+                    LoudnessCache.default().put(path, "r128-stats", R128_STATS_PARAMS, stats.to_dict())
+            if stats is None:
+                return None, f"{Path(path).name}: {log}"
+            logs.append(f"{Path(path).name}: {log}")
+            total.merge(stats)
+            if progress_callback:
+                progress_callback((index + 1) / len(input_paths))
+        return total.result(), "\n".join(logs)
@@ -1,10 +1,17 @@
 """
-動画ファイル再帰抽出ユーティリティ
+動画・音声ファイル再帰抽出ユーティリティ
 """
 from pathlib import Path
 from typing import List
 
 VIDEO_EXTENSIONS = {'.mp4', '.mov', '.mkv'}
+AUDIO_EXTENSIONS = {'.wav', '.aac', '.mp3', '.m4a', '.flac'}
+
+def is_audio_file(path) -> bool:
+    """
+    拡張子から音声のみのファイルか判定
+    """
+    return Path(path).suffix.lower() in AUDIO_EXTENSIONS
 
 def scan_video_files(directory: Path) -> List[Path]:
     """
@@ -19,3 +26,14 @@ def scan_video_files(directory: Path) -> List[Path]:
         if path.is_file() and path.suffix.lower() in VIDEO_EXTENSIONS:
             files.append(path)
     return files
+
+def scan_media_files(directory: Path) -> List[Path]:
+    """
+    指定ディレクトリ以下から動画・音声ファイルを再帰的に抽出（フォルダごとのドロップ用）
+    Args:
+        directory (Path): 走査対象ディレクトリ
+    Returns:
+        List[Path]: 動画・音声ファイルのパス一覧（パス順）
+    """
+    extensions = VIDEO_EXTENSIONS | AUDIO_EXTENSIONS
+    return sorted(path for path in directory.rglob('*') if path.is_file() and path.suffix.lower() in extensions)
@@ -0,0 +1,520 @@
+"""
+ISO-BMFF（mp4/mov/m4a）のボックスを直接読むメタデータリーダー（サブプロセスを起動しない）
+- ファイルをmmapし、moov/trak/mdia/minf/stblだけをたどる（mdatは読まない）
+- mvhd・tkhd・mdhd・hdlr・stsd・sttsから長さ・コーデック・解像度・フレームレート・音声の有無を取り出す
+- stss（同期サンプル＝キーフレームの表）とsttsの全エントリは、必要になったときに読む
+- 対応していないコーデック・フラグメント化MP4・壊れたファイルはIsobmffErrorを送出し、呼び出し側（media_probe）がffprobeに切り替える
+"""
+import mmap
+import struct
+from collections import Counter
+from fractions import Fraction
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# このリーダーで読む拡張子
+ISOBMFF_EXTENSIONS = {'.mp4', '.mov', '.m4v', '.m4a', '.3gp'}
+# ffprobeのformat_name（mov/mp4系はすべて同じ名前になる）
+FORMAT_NAME = "mov,mp4,m4a,3gp,3g2,mj2"
+# 子ボックスをたどるコンテナ
+_CONTAINERS = {b"moov", b"trak", b"mdia", b"minf", b"stbl", b"edts", b"dinf"}
+# サンプルエントリのfourcc → ffprobeのcodec_name
+VIDEO_CODECS = {
+    b"avc1": "h264", b"avc3": "h264", b"hvc1": "hevc", b"hev1": "hevc", b"av01": "av1", b"vp09": "vp9",
+    b"mp4v": "mpeg4", b"jpeg": "mjpeg",
+    b"apch": "prores", b"apcn": "prores", b"apcs": "prores", b"apco": "prores", b"ap4h": "prores", b"ap4x": "prores",
+}
+AUDIO_CODECS = {
+    b"Opus": "opus", b"fLaC": "flac", b"alac": "alac", b"ac-3": "ac3", b"ec-3": "eac3",
+    b"sowt": "pcm_s16le", b"twos": "pcm_s16be",
+}
+# esdsのobjectTypeIndication → codec_name（mp4aの中身）
+_MP4A_OBJECT_TYPES = {0x40: "aac", 0x66: "aac", 0x67: "aac", 0x68: "aac", 0x69: "mp3", 0x6B: "mp3"}
+# ProResの種類ごとの画素形式（4444はアルファの有無が分からないためffprobeに任せる）
+_PRORES_PIX_FMTS = {b"apch": "yuv422p10le", b"apcn": "yuv422p10le", b"apcs": "yuv422p10le", b"apco": "yuv422p10le"}
+_CHROMA = {1: "yuv420p", 2: "yuv422p", 3: "yuv444p"}
+# chroma_format_idc・ビット深度・スケーリング行列を持つH.264のプロファイル
+_H264_HIGH_PROFILES = {100, 110, 122, 244, 44, 83, 86, 118, 128, 138, 139, 134, 135}
+
+class IsobmffError(ValueError):
+    """
+    ボックス構造が壊れている・このリーダーで扱えない内容の場合に送出する
+    """
+
+def _boxes(data, start: int, end: int) -> Iterator[Tuple[bytes, int, int]]:
+    """
+    [start, end) の範囲のボックスを (種類, 中身の開始位置, 終了位置) で順に返す
+    """
+    pos = start
+    while pos + 8 <= end:
+        size, kind = struct.unpack_from(">I4s", data, pos)
+        header = 8
+        if size == 1:
+            if pos + 16 > end:
+                raise IsobmffError("ボックスヘッダが途中で切れています")
+            size = struct.unpack_from(">Q", data, pos + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header or pos + size > end:
+            raise IsobmffError(f"ボックス {kind!r} のサイズが不正です")
+        yield kind, pos + header, pos + size
+        pos += size
+
+def _child(data, start: int, end: int, kind: bytes) -> Optional[Tuple[int, int]]:
+    for child, body, child_end in _boxes(data, start, end):
+        if child == kind:
+            return body, child_end
+    return None
+
+def _full_box(data, pos: int) -> Tuple[int, int]:
+    # FullBoxのversionとflags
+    version_flags = struct.unpack_from(">I", data, pos)[0]
+    return version_flags >> 24, version_flags & 0xFFFFFF
+
+class Track:
+    """
+    trak 1つ分（ヘッダはすぐに読み、サンプル表は必要になったときに読む）
+    """
+    def __init__(self, data, index: int, start: int, end: int):
+        self._data = data
+        self.index = index
+        self.handler = None
+        self.timescale = None
+        self.duration = None
+        self.fourcc = None
+        self.codec_name = None
+        self.width = None
+        self.height = None
+        self.pix_fmt = None
+        self.sample_rate = None
+        self.channels = None
+        self.sample_count = None
+        self._stts = None
+        self._stss = None
+        self._parse(start, end)
+
+    @property
+    def codec_type(self) -> str:
+        return {b"vide": "video", b"soun": "audio"}.get(self.handler, "data")
+
+    def _parse(self, start: int, end: int) -> None:
+        data = self._data
+        mdia = _child(data, start, end, b"mdia")
+        if mdia is None:
+            raise IsobmffError("mdiaがありません")
+        mdhd = _child(data, *mdia, b"mdhd")
+        hdlr = _child(data, *mdia, b"hdlr")
+        if mdhd is None or hdlr is None:
+            raise IsobmffError("mdhd/hdlrがありません")
+        version, _ = _full_box(data, mdhd[0])
+        if version == 1:
+            self.timescale, self.duration = struct.unpack_from(">IQ", data, mdhd[0] + 20)
+        else:
+            self.timescale, self.duration = struct.unpack_from(">II", data, mdhd[0] + 12)
+        if not self.timescale:
+            raise IsobmffError("mdhdのtimescaleが0です")
+        self.handler = bytes(data[hdlr[0] + 8:hdlr[0] + 12])
+        stbl = None
+        minf = _child(data, *mdia, b"minf")
+        if minf is not None:
+            stbl = _child(data, *minf, b"stbl")
+        if stbl is None:
+            raise IsobmffError("stblがありません")
+        self._stbl = stbl
+        stsd = _child(data, *stbl, b"stsd")
+        stsz = _child(data, *stbl, b"stsz")
+        if stsz is not None:
+            self.sample_count = struct.unpack_from(">I", data, stsz[0] + 8)[0]
+        if stsd is not None and self.codec_type != "data":
+            entry = next(_boxes(data, stsd[0] + 8, stsd[1]), None)
+            if entry is None:
+                raise IsobmffError("stsdにサンプルエントリがありません")
+            self._parse_sample_entry(*entry)
+
+    def _parse_sample_entry(self, fourcc: bytes, body: int, end: int) -> None:
+        data = self._data
+        self.fourcc = fourcc
+        if self.codec_type == "video":
+            # VisualSampleEntry: 予約6 + data_reference_index 2 + 16バイト後にwidth/height
+            self.codec_name = VIDEO_CODECS.get(fourcc)
+            self.width, self.height = struct.unpack_from(">HH", data, body + 24)
+            self.pix_fmt = self._video_pix_fmt(fourcc, body + 78, end)
+        else:
+            # AudioSampleEntry: version(QuickTime) 2 + ... + channels 2 + samplesize 2 + ... + samplerate 16.16
+            qt_version = struct.unpack_from(">H", data, body + 8)[0]
+            self.channels = struct.unpack_from(">H", data, body + 16)[0]
+            rate = struct.unpack_from(">I", data, body + 24)[0] >> 16
+            self.sample_rate = rate or self.timescale
+            if qt_version == 2:
+                raise IsobmffError("QuickTime v2の音声サンプルエントリには対応していません")
+            children = body + 28 + (16 if qt_version == 1 else 0)
+            if fourcc == b"mp4a":
+                esds = _child(data, children, end, b"esds")
+                self.codec_name = _MP4A_OBJECT_TYPES.get(self._object_type(esds)) if esds else None
+            else:
+                self.codec_name = AUDIO_CODECS.get(fourcc)
+
+    def _video_pix_fmt(self, fourcc: bytes, children: int, end: int) -> Optional[str]:
+        # 画素形式はffmpegのデコーダーと同じ規則で決める（8bitのフルレンジはyuvj系）。分からなければNone
+        data = self._data
+        if fourcc in _PRORES_PIX_FMTS:
+            return _PRORES_PIX_FMTS[fourcc]
+        if fourcc in (b"avc1", b"avc3"):
+            avcc = _child(data, children, end, b"avcC")
+            if avcc is None or not data[avcc[0] + 5] & 0x1F:
+                return None
+            # avcCにはレンジが入っていないため、最初のSPSのVUIまで読む
+            length = struct.unpack_from(">H", data, avcc[0] + 6)[0]
+            sps = bytes(data[avcc[0] + 8:avcc[0] + 8 + length])
+            if len(sps) != length:
+                raise IsobmffError("avcCのSPSが途中で切れています")
+            return _pix_fmt(*_parse_h264_sps(sps))
+        if fourcc in (b"hvc1", b"hev1"):
+            hvcc = _child(data, children, end, b"hvcC")
+            if hvcc is None or hvcc[1] - hvcc[0] < 19:
+                return None
+            chroma, bit_depth = data[hvcc[0] + 16] & 0x03, (data[hvcc[0] + 17] & 0x07) + 8
+            full_range = False
+            if (chroma, bit_depth) == (1, 8):
+                # yuvj420pになり得るのは8bit 4:2:0のみ。レンジはcolr(nclx)がある場合だけ分かる
+                full_range = self._colr_full_range(children, end)
+                if full_range is None:
+                    return None
+            return _pix_fmt(chroma, bit_depth, full_range)
+        return None
+
+    def _colr_full_range(self, children: int, end: int) -> Optional[bool]:
+        # colr(nclx)のfull_range_flag（nclc・colrなしの場合はNone）
+        data = self._data
+        colr = _child(data, children, end, b"colr")
+        if colr is None or colr[1] - colr[0] < 11 or bytes(data[colr[0]:colr[0] + 4]) != b"nclx":
+            return None
+        return bool(data[colr[0] + 10] & 0x80)
+
+    def _object_type(self, esds: Tuple[int, int]) -> Optional[int]:
+        # ES_Descriptor(0x03) → DecoderConfigDescriptor(0x04) の objectTypeIndication
+        data = self._data
+        pos, end = esds[0] + 4, esds[1]
+        while pos < end:
+            tag = data[pos]
+            pos += 1
+            length = 0
+            for _ in range(4):
+                byte = data[pos]
+                pos += 1
+                length = (length << 7) | (byte & 0x7F)
+                if not byte & 0x80:
+                    break
+            if tag == 0x03:
+                flags = data[pos + 2]
+                pos += 3 + (2 if flags & 0x80 else 0)
+                if flags & 0x40:
+                    pos += 1 + data[pos]
+                if flags & 0x20:
+                    pos += 2
+                continue
+            if tag == 0x04:
+                return data[pos]
+            pos += length
+        return None
+
+    @property
+    def time_to_sample(self) -> List[Tuple[int, int]]:
+        """
+        sttsの (サンプル数, 1サンプルの長さ[timescale単位]) の表
+        """
+        if self._stts is None:
+            stts = _child(self._data, *self._stbl, b"stts")
+            if stts is None:
+                raise IsobmffError("sttsがありません")
+            count = struct.unpack_from(">I", self._data, stts[0] + 4)[0]
+            if stts[0] + 8 + count * 8 > stts[1]:
+                raise IsobmffError("sttsのエントリ数が不正です")
+            self._stts = [struct.unpack_from(">II", self._data, stts[0] + 8 + i * 8) for i in range(count)]
+        return self._stts
+
+    @property
+    def sync_samples(self) -> Optional[List[int]]:
+        """
+        stssの同期サンプル番号（1始まり）。stssがない場合は全サンプルがキーフレームのためNone
+        """
+        if self._stss is None:
+            stss = _child(self._data, *self._stbl, b"stss")
+            if stss is None:
+                return None
+            count = struct.unpack_from(">I", self._data, stss[0] + 4)[0]
+            if stss[0] + 8 + count * 4 > stss[1]:
+                raise IsobmffError("stssのエントリ数が不正です")
+            self._stss = list(struct.unpack_from(f">{count}I", self._data, stss[0] + 8))
+        return self._stss
+
+    def frame_rate(self) -> Optional[Fraction]:
+        """
+        最も多いサンプル長から求めたフレームレート（ffprobeのr_frame_rateに相当）
+        """
+        entries = [(count, delta) for count, delta in self.time_to_sample if delta]
+        if not entries:
+            return None
+        counts = Counter()
+        for count, delta in entries:
+            counts[delta] += count
+        delta = counts.most_common(1)[0][0]
+        return Fraction(self.timescale, delta)
+
+    def keyframe_times(self) -> List[float]:
+        """
+        キーフレームの時刻（秒。デコード順の時刻で、編集リストやcttsのずれは含めない）
+        """
+        sync = self.sync_samples
+        times = []
+        wanted = iter(sync) if sync is not None else None
+        target = next(wanted, None) if wanted is not None else None
+        sample, t = 1, 0
+        for count, delta in self.time_to_sample:
+            for _ in range(count):
+                if wanted is None:
+                    times.append(t / self.timescale)
+                elif sample == target:
+                    times.append(t / self.timescale)
+                    target = next(wanted, None)
+                    if target is None:
+                        return times
+                sample += 1
+                t += delta
+        return times
+
+def _pix_fmt(chroma: int, bit_depth: int, full_range: bool = False) -> Optional[str]:
+    base = _CHROMA.get(chroma)
+    if base is None or bit_depth not in (8, 10, 12):
+        return None
+    if bit_depth != 8:
+        return f"{base}{bit_depth}le"
+    return base.replace("yuv", "yuvj") if full_range else base
+
+class _BitReader:
+    """
+    NALユニットのRBSPを読む（エミュレーション防止バイト 00 00 03 は取り除いてから渡す）
+    """
+    def __init__(self, data: bytes):
+        self._data = data
+        self._pos = 0
+
+    def u(self, bits: int) -> int:
+        value = 0
+        for _ in range(bits):
+            byte = self._data[self._pos >> 3]
+            value = (value << 1) | ((byte >> (7 - (self._pos & 7))) & 1)
+            self._pos += 1
+        return value
+
+    def ue(self) -> int:
+        zeros = 0
+        while not self.u(1):
+            zeros += 1
+            if zeros > 31:
+                raise IsobmffError("指数ゴロム符号が不正です")
+        return (1 << zeros) - 1 + self.u(zeros)
+
+    def se(self) -> int:
+        value = self.ue()
+        return (value + 1) // 2 if value & 1 else -(value // 2)
+
+def _rbsp(nal: bytes) -> bytes:
+    # NALヘッダ（1バイト）を除き、00 00 03 の03を取り除く
+    out = bytearray()
+    zeros = 0
+    for byte in nal[1:]:
+        if zeros >= 2 and byte == 3:
+            zeros = 0
+            continue
+        out.append(byte)
+        zeros = zeros + 1 if byte == 0 else 0
+    return bytes(out)
+
+def _parse_h264_sps(nal: bytes) -> Tuple[int, int, bool]:
+    """
+    H.264のSPSから (chroma_format_idc, ビット深度, video_full_range_flag) を読む
+    """
+    r = _BitReader(_rbsp(nal))
+    try:
+        profile = r.u(8)
+        r.u(16)  # constraint_set_flags, level_idc
+        r.ue()  # seq_parameter_set_id
+        chroma, bit_depth = 1, 8
+        if profile in _H264_HIGH_PROFILES:
+            chroma = r.ue()
+            if chroma == 3:
+                r.u(1)  # separate_colour_plane_flag
+            bit_depth = r.ue() + 8
+            r.ue()  # bit_depth_chroma_minus8
+            r.u(1)  # qpprime_y_zero_transform_bypass_flag
+            if r.u(1):  # seq_scaling_matrix_present_flag
+                for i in range(12 if chroma == 3 else 8):
+                    if r.u(1):
+                        last = next_scale = 8
+                        for _ in range(16 if i < 6 else 64):
+                            if next_scale:
+                                next_scale = (last + r.se() + 256) % 256
+                            last = next_scale or last
+        r.ue()  # log2_max_frame_num_minus4
+        poc_type = r.ue()
+        if poc_type == 0:
+            r.ue()
+        elif poc_type == 1:
+            r.u(1)
+            r.se()
+            r.se()
+            for _ in range(r.ue()):
+                r.se()
+        r.ue()  # max_num_ref_frames
+        r.u(1)  # gaps_in_frame_num_value_allowed_flag
+        r.ue()  # pic_width_in_mbs_minus1
+        r.ue()  # pic_height_in_map_units_minus1
+        if not r.u(1):  # frame_mbs_only_flag
+            r.u(1)
+        r.u(1)  # direct_8x8_inference_flag
+        if r.u(1):  # frame_cropping_flag
+            for _ in range(4):
+                r.ue()
+        full_range = False
+        if r.u(1):  # vui_parameters_present_flag
+            if r.u(1) and r.u(8) == 255:  # aspect_ratio_info_present_flag / Extended_SAR
+                r.u(32)
+            if r.u(1):  # overscan_info_present_flag
+                r.u(1)
+            if r.u(1):  # video_signal_type_present_flag
+                r.u(3)
+                full_range = bool(r.u(1))
+    except IndexError as e:
+        raise IsobmffError("SPSが途中で切れています") from e
+    return chroma, bit_depth, full_range
+
+class IsoFile:
+    """
+    mmapしたmp4/movファイル（withで使い、抜けたらmmapを閉じる）
+    """
+    def __init__(self, path):
+        self.path = Path(path)
+        self._file = open(self.path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # 空ファイル
+            self._file.close()
+            raise IsobmffError("ファイルが空です")
+        self.size = len(self._map)
+        self.timescale = None
+        self.duration = None
+        self.tracks: List[Track] = []
+        try:
+            self._parse()
+        except (struct.error, IndexError) as e:
+            self.close()
+            raise IsobmffError(f"ボックスを読めません: {e}") from e
+        except IsobmffError:
+            self.close()
+            raise
+
+    def _parse(self) -> None:
+        data = self._map
+        kinds = []
+        moov = None
+        for kind, body, end in _boxes(data, 0, self.size):
+            kinds.append(kind)
+            if kind == b"moov":
+                moov = (body, end)
+                break
+        if not kinds or kinds[0] not in (b"ftyp", b"moov", b"wide", b"free", b"mdat", b"skip"):
+            raise IsobmffError("ISO-BMFFのファイルではありません")
+        if moov is None:
+            raise IsobmffError("moovがありません")
+        mvhd = _child(data, *moov, b"mvhd")
+        if mvhd is None:
+            raise IsobmffError("mvhdがありません")
+        version, _ = _full_box(data, mvhd[0])
+        if version == 1:
+            self.timescale, self.duration = struct.unpack_from(">IQ", data, mvhd[0] + 20)
+        else:
+            self.timescale, self.duration = struct.unpack_from(">II", data, mvhd[0] + 12)
+        if not self.timescale:
+            raise IsobmffError("mvhdのtimescaleが0です")
+        # フラグメント化MP4はサンプルがmoofにあり、moov内の長さ・サンプル表が空になる
+        if _child(data, *moov, b"mvex") is not None:
+            raise IsobmffError("フラグメント化MP4には対応していません")
+        if not self.duration:
+            raise IsobmffError("mvhdの長さが0です")
+        for kind, body, end in _boxes(data, *moov):
+            if kind == b"trak":
+                self.tracks.append(Track(data, len(self.tracks), body, end))
+
+    @property
+    def duration_sec(self) -> float:
+        return self.duration / self.timescale
+
+    def track(self, codec_type: str) -> Optional[Track]:
+        """
+        最初の映像（"video"）・音声（"audio"）トラック
+        """
+        return next((t for t in self.tracks if t.codec_type == codec_type), None)
+
+    def close(self) -> None:
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def probe_dict(path) -> Dict:
+    """
+    ffprobe -show_format -show_streams -of json と同じ形のdictを返す（media_probeが使う）
+    映像・音声トラックのコーデック・画素形式が特定できない場合はIsobmffError（ffprobeに任せる）
+    """
+    try:
+        return _probe_dict(path)
+    except (struct.error, IndexError) as e:
+        raise IsobmffError(f"ボックスを読めません: {e}") from e
+
+def _probe_dict(path) -> Dict:
+    with IsoFile(path) as iso:
+        streams = []
+        for track in iso.tracks:
+            stream = {"index": track.index, "codec_type": track.codec_type}
+            if track.codec_type != "data" and track.codec_name is None:
+                raise IsobmffError(f"コーデックを特定できません: {track.fourcc!r}")
+            if track.codec_type == "video" and track.pix_fmt is None:
+                raise IsobmffError(f"画素形式を特定できません: {track.fourcc!r}")
+            if track.codec_type == "data":
+                streams.append(stream)
+                continue
+            if not track.duration or not track.sample_count:
+                raise IsobmffError(f"トラック{track.index}の長さ・サンプル数が0です")
+            stream["codec_name"] = track.codec_name
+            stream["duration"] = f"{track.duration / track.timescale:.6f}"
+            if track.codec_type == "video":
+                rate = track.frame_rate()
+                stream.update(width=track.width, height=track.height, pix_fmt=track.pix_fmt,
+                              r_frame_rate=f"{rate.numerator}/{rate.denominator}" if rate else "0/0",
+                              nb_frames=str(track.sample_count))
+            else:
+                stream.update(sample_rate=str(track.sample_rate), channels=track.channels)
+            streams.append(stream)
+        duration = iso.duration_sec
+        fmt = {"format_name": FORMAT_NAME, "duration": f"{duration:.6f}", "nb_streams": len(streams),
+               "size": str(iso.size)}
+        if duration > 0:
+            fmt["bit_rate"] = str(int(iso.size * 8 / duration))
+        return {"streams": streams, "format": fmt, "reader": "isobmff"}
+
+def keyframe_times(path) -> Optional[List[float]]:
+    """
+    最初の映像トラックのキーフレーム時刻（秒）。mp4/movでない・映像がない場合はNone
+    """
+    try:
+        with IsoFile(path) as iso:
+            track = iso.track("video")
+            return track.keyframe_times() if track else None
+    except (OSError, IsobmffError, struct.error, IndexError):
+        return None
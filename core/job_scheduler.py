@@ -0,0 +1,287 @@
+"""
+アプリ全体のジョブスケジューラ（ページごとのスレッド起動を置き換える）
+- リソースクラス: encode（CPUエンコード枠）/ decode（デコード・読み込み枠）/ asr（音声認識枠）とメモリ予算(MB)
+- 優先度の小さいジョブから、必要なリソースが空いたものを起動する（対話的な操作はバッチより先に動く）
+- 同じgroupのジョブは同時に1つだけ受け付ける（ボタンの二度押しで同じバッチが2つ動かないように）
+- 状態の変化とジョブからの通知は、1つのイベントチャネル（subscribeしたコールバック）に流す
+  コールバックはジョブのスレッドから呼ばれるため、UIはui_parts.job_events.JobEventBridgeで受け取る
+"""
+import itertools
+import os
+import threading
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Any, Callable, Dict, List, Optional
+
+from core.proc_sampler import JobLog, ProcSampler, ResourceSummary
+
+# リソースクラス
+ENCODE = "encode"
+DECODE = "decode"
+ASR = "asr"
+
+class Priority(IntEnum):
+    """
+    ジョブの優先度（小さいほど先に起動する）
+    """
+    INTERACTIVE = 0
+    NORMAL = 10
+    BATCH = 20
+
+def default_slots() -> Dict[str, int]:
+    """
+    リソースクラスごとの同時実行数（エンコードはffmpegが内部で並列化するためコア数の半分）
+    """
+    cores = os.cpu_count() or 1
+    return {ENCODE: max(1, cores // 2), DECODE: cores, ASR: 1}
+
+def default_ram_mb() -> int:
+    """
+    ジョブに使わせるメモリの上限（物理メモリの半分。取得できなければ4GB）
+    """
+    try:
+        return int(os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / (1024 * 1024) / 2)
+    except (AttributeError, ValueError, OSError):
+        return 4096
+
+@dataclass
+class JobEvent:
+    """
+    イベントチャネルに流れる通知
+    - kind: queued / started / finished / failed / cancelled（ジョブの状態）、
+      それ以外はジョブがJobContext.emitで送った任意の種類（log / progress / status など）
+    """
+    job_id: int
+    name: str
+    group: Optional[str]
+    kind: str
+    data: Any = None
+
+class JobCancelled(Exception):
+    """
+    キャンセルされたジョブがJobContext.check_cancelledで送出する
+    """
+
+class JobContext:
+    """
+    ジョブ関数に渡される実行中の情報（通知・キャンセル確認）
+    """
+    def __init__(self, scheduler: "JobScheduler", job: "Job"):
+        self._scheduler = scheduler
+        self.job = job
+
+    def emit(self, kind: str, data: Any = None) -> None:
+        self._scheduler._publish(self.job, kind, data)
+
+    def log(self, text: str) -> None:
+        self.emit("log", text)
+
+    @property
+    def cancelled(self) -> bool:
+        return self.job._cancel_event.is_set()
+
+    def check_cancelled(self) -> None:
+        if self.cancelled:
+            raise JobCancelled()
+
+    def on_cancel(self, callback: Callable[[], None]) -> None:
+        """
+        キャンセル時に呼ぶ処理（実行中の子プロセスの停止など）を登録する
+        """
+        self.job._cancel_callbacks.append(callback)
+        if self.cancelled:
+            callback()
+
+@dataclass
+class Job:
+    """
+    スケジューラに投入されたジョブ（状態: queued / running / finished / failed / cancelled）
+    - usage: プロセス内で計算するジョブ（asr枠を使うもの）のリソース使用量（自プロセスを/procから記録）
+    """
+    id: int
+    name: str
+    func: Callable[[JobContext], Any]
+    resources: Dict[str, int]
+    ram_mb: int
+    priority: int
+    group: Optional[str]
+    seq: int
+    state: str = "queued"
+    result: Any = None
+    error: Optional[BaseException] = None
+    usage: Optional[ResourceSummary] = None
+    _done: threading.Event = field(default_factory=threading.Event, repr=False)
+    _cancel_event: threading.Event = field(default_factory=threading.Event, repr=False)
+    _cancel_callbacks: List[Callable[[], None]] = field(default_factory=list, repr=False)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        ジョブの終了を待つ（終了したらTrue）
+        """
+        return self._done.wait(timeout)
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+class JobScheduler:
+    """
+    リソースクラス・メモリ予算・優先度に基づいてジョブを起動する
+    """
+    _default = None
+    _default_lock = threading.Lock()
+
+    def __init__(self, slots: Optional[Dict[str, int]] = None, ram_mb: Optional[int] = None):
+        self.slots = dict(default_slots() if slots is None else slots)
+        self.ram_mb = default_ram_mb() if ram_mb is None else ram_mb
+        self._in_use = {name: 0 for name in self.slots}
+        self._ram_in_use = 0
+        self._queue: List[Job] = []
+        self._running: Dict[int, Job] = {}
+        self._listeners: List[Callable[[JobEvent], None]] = []
+        self._lock = threading.RLock()
+        self._ids = itertools.count(1)
+
+    @classmethod
+    def default(cls) -> "JobScheduler":
+        """
+        アプリ全体で共有するインスタンスを返す（全ページのジョブで同じリソースを分け合う）
+        """
+        with cls._default_lock:
+            if cls._default is None:
+                cls._default = cls()
+            return cls._default
+
+    def subscribe(self, callback: Callable[[JobEvent], None]) -> Callable[[], None]:
+        """
+        イベントチャネルにコールバックを登録し、登録解除用の関数を返す
+        """
+        with self._lock:
+            self._listeners.append(callback)
+        def unsubscribe():
+            with self._lock:
+                if callback in self._listeners:
+                    self._listeners.remove(callback)
+        return unsubscribe
+
+    def running_count(self, *resources: str) -> int:
+        """
+        resourcesのいずれかを使う実行中のジョブ数
+        """
+        with self._lock:
+            return sum(1 for job in self._running.values() if any(job.resources.get(name) for name in resources))
+
+    def busy(self, group: str) -> bool:
+        """
+        groupのジョブが待機中または実行中か
+        """
+        with self._lock:
+            return any(job.group == group for job in self._queue + list(self._running.values()))
+
+    def submit(self, name: str, func: Callable[[JobContext], Any], resources: Optional[Dict[str, int]] = None,
+               ram_mb: int = 0, priority: int = Priority.NORMAL, group: Optional[str] = None) -> Optional[Job]:
+        """
+        ジョブを投入する（同じgroupのジョブが待機中・実行中ならNoneを返して受け付けない）
+        - func: JobContextを受け取る関数（戻り値はJob.result、例外はJob.errorに入る）
+        - resources: {リソースクラス: 使う数}。枠数を超える要求は枠数に丸める（単独なら必ず起動できる）
+        - ram_mb: 使う見込みのメモリ。予算を超える場合も他のジョブが動いていなければ起動する
+        """
+        with self._lock:
+            if group is not None and self.busy(group):
+                return None
+            resources = {k: min(v, self.slots.get(k, v)) for k, v in (resources or {}).items() if v > 0}
+            job_id = next(self._ids)
+            job = Job(id=job_id, name=name, func=func, resources=resources, ram_mb=max(0, ram_mb),
+                      priority=int(priority), group=group, seq=job_id)
+            self._queue.append(job)
+        self._publish(job, "queued")
+        self._dispatch()
+        return job
+
+    def cancel(self, job: Job) -> None:
+        """
+        ジョブをキャンセルする（待機中なら取り除き、実行中ならキャンセルを通知して登録済みの停止処理を呼ぶ）
+        """
+        with self._lock:
+            queued = job in self._queue
+            if queued:
+                self._queue.remove(job)
+            job._cancel_event.set()
+            callbacks = list(job._cancel_callbacks)
+        if queued:
+            job.state = "cancelled"
+            self._publish(job, "cancelled")
+            job._done.set()
+            return
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                pass
+
+    def cancel_group(self, group: str) -> None:
+        with self._lock:
+            jobs = [job for job in self._queue + list(self._running.values()) if job.group == group]
+        for job in jobs:
+            self.cancel(job)
+
+    def _fits(self, job: Job) -> bool:
+        for name, count in job.resources.items():
+            if self._in_use.get(name, 0) + count > self.slots.get(name, count):
+                return False
+        if job.ram_mb and self._running and self._ram_in_use + job.ram_mb > self.ram_mb:
+            return False
+        return True
+
+    def _dispatch(self) -> None:
+        # 優先度順（同じなら投入順）に、リソースが空いているジョブを起動する
+        started = []
+        with self._lock:
+            for job in sorted(self._queue, key=lambda j: (j.priority, j.seq)):
+                if not self._fits(job):
+                    continue
+                self._queue.remove(job)
+                for name, count in job.resources.items():
+                    self._in_use[name] = self._in_use.get(name, 0) + count
+                self._ram_in_use += job.ram_mb
+                job.state = "running"
+                self._running[job.id] = job
+                started.append(job)
+        for job in started:
+            threading.Thread(target=self._run, args=(job,), name=f"job-{job.id}", daemon=True).start()
+
+    def _run(self, job: Job) -> None:
+        self._publish(job, "started")
+        # ffmpegの子プロセスはExecutor側で記録するため、プロセス内で動くASRジョブだけ自プロセスを記録する
+        sampler = ProcSampler().start() if ASR in job.resources else None
+        try:
+            job.result = job.func(JobContext(self, job))
+            job.state = "cancelled" if job._cancel_event.is_set() else "finished"
+        except JobCancelled:
+            job.state = "cancelled"
+        except Exception as e:
+            job.error = e
+            job.state = "failed"
+        finally:
+            if sampler is not None:
+                job.usage = sampler.stop()
+                JobLog.default().append("asr", job.name, job.usage, state=job.state)
+            with self._lock:
+                self._running.pop(job.id, None)
+                for name, count in job.resources.items():
+                    self._in_use[name] -= count
+                self._ram_in_use -= job.ram_mb
+        # 終了イベントを流してからwait()を返す（待っていた側が通知より先に進まないように）
+        self._publish(job, job.state, job.error if job.state == "failed" else job.result)
+        job._done.set()
+        self._dispatch()
+
+    def _publish(self, job: Job, kind: str, data: Any = None) -> None:
+        event = JobEvent(job.id, job.name, job.group, kind, data)
+        with self._lock:
+            listeners = list(self._listeners)
+        for listener in listeners:
+            try:
+                listener(event)
+            except Exception:
+                pass
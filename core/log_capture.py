@@ -0,0 +1,132 @@
+"""
+子プロセスのログを上限付きで保持するキャプチャ
+- 末尾tail_bytes（またはtail_lines行）だけをリングバッファに残す
+- エラー・警告・測定結果などのパターンに一致する行は、末尾から外れても別のリングバッファに残す
+- spill_pathを指定すると全行をgzip圧縮してディスクへ書き出す（メモリ使用量はジョブの長さによらず一定）
+"""
+import gzip
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+# 末尾として残すバイト数の既定値
+TAIL_BYTES = 64 * 1024
+# 末尾から外れても残す行（ffmpegのエラー・警告、loudnorm/ebur128の結果見出し）
+KEEP_PATTERN = re.compile(r"error|warning|invalid|failed|could not|no such|not found|summary|input integrated", re.IGNORECASE)
+# パターン一致行として残す行数
+KEEP_LINES = 200
+
+# 書き出した全ログを残す期間と件数（失敗時に残したログの掃除用）
+SPILL_MAX_AGE_SEC = 7 * 24 * 3600
+SPILL_MAX_FILES = 100
+
+def spill_dir() -> Path:
+    """
+    全ログを書き出す既定のフォルダ（ユーザーキャッシュ内）
+    古いログ・件数を超えた分はここで削除する
+    """
+    from core.loudness_cache import user_cache_dir
+    path = user_cache_dir() / "logs"
+    path.mkdir(parents=True, exist_ok=True)
+    prune_spill_dir(path)
+    return path
+
+def spill_path(name: str) -> Path:
+    """
+    全ログの書き出し先（同名の出力を並列に書き出しても衝突しないよう一意な名前を付ける）
+    """
+    return spill_dir() / f"{name}.{uuid.uuid4().hex[:8]}.log.gz"
+
+def prune_spill_dir(path: Path, max_age_sec: float = SPILL_MAX_AGE_SEC, max_files: int = SPILL_MAX_FILES) -> None:
+    """
+    max_age_secより古いログと、新しい順にmax_files件を超えたログを削除する
+    """
+    entries = []
+    for file in path.glob("*.log.gz"):
+        try:
+            entries.append((file.stat().st_mtime, file))
+        except OSError:
+            continue
+    entries.sort(reverse=True)
+    now = time.time()
+    for index, (mtime, file) in enumerate(entries):
+        if index >= max_files or now - mtime > max_age_sec:
+            file.unlink(missing_ok=True)
+
+class LogCapture:
+    """
+    上限付きのログキャプチャ（複数スレッドからappendしてよい）
+    """
+    def __init__(self, tail_bytes: Optional[int] = TAIL_BYTES, tail_lines: Optional[int] = None,
+                 keep_pattern: Optional[re.Pattern] = KEEP_PATTERN, keep_lines: int = KEEP_LINES,
+                 spill_path: Optional[Path] = None):
+        self.tail_bytes = tail_bytes
+        self.keep_pattern = keep_pattern
+        self.spill_path = Path(spill_path) if spill_path else None
+        self._tail = deque(maxlen=tail_lines)  # (通し番号, 行, バイト数)
+        self._tail_size = 0
+        self._kept = deque(maxlen=keep_lines)
+        self._lock = threading.Lock()
+        self._spill = gzip.open(self.spill_path, "wt", encoding="utf-8") if self.spill_path else None
+        self.total_lines = 0
+        self.total_bytes = 0
+
+    def append(self, line: str) -> None:
+        with self._lock:
+            seq = self.total_lines
+            self.total_lines += 1
+            size = len(line.encode("utf-8", errors="ignore")) + 1
+            self.total_bytes += size
+            if self._spill:
+                self._spill.write(line + "\n")
+            if self.keep_pattern is not None and self.keep_pattern.search(line):
+                self._kept.append((seq, line))
+            if self._tail.maxlen is not None and len(self._tail) == self._tail.maxlen:
+                self._tail_size -= self._tail[0][2]
+            self._tail.append((seq, line, size))
+            self._tail_size += size
+            while self.tail_bytes is not None and self._tail_size > self.tail_bytes and len(self._tail) > 1:
+                self._tail_size -= self._tail.popleft()[2]
+
+    def extend(self, lines: Iterable[str]) -> None:
+        for line in lines:
+            self.append(line)
+
+    def lines(self) -> List[str]:
+        """
+        保持している行（末尾から外れたパターン一致行＋省略の目印＋末尾）を元の順で返す
+        """
+        with self._lock:
+            tail = [(seq, line) for seq, line, _ in self._tail]
+            first = tail[0][0] if tail else self.total_lines
+            kept = [(seq, line) for seq, line in self._kept if seq < first]
+        result = []
+        previous = -1
+        for seq, line in kept + tail:
+            if seq != previous + 1:
+                result.append(f"...（{seq - previous - 1}行省略）...")
+            result.append(line)
+            previous = seq
+        return result
+
+    def text(self) -> str:
+        return "\n".join(self.lines())
+
+    def close(self) -> None:
+        """
+        ディスクへの書き出しを終える（spill_pathを指定した場合）
+        """
+        with self._lock:
+            if self._spill:
+                self._spill.close()
+                self._spill = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
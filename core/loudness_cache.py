@@ -0,0 +1,152 @@
+"""
+ラウドネス測定結果の永続キャッシュ（SQLite）
+測定ページ・補正ページの両方から参照し、同じファイルの再デコードを省く
+"""
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional, Tuple
+
+# サンプリングハッシュで読む1箇所あたりのバイト数
+SAMPLE_BYTES = 64 * 1024
+# 全区間の測定値で数値として扱うキー（loudnormのJSONは文字列、R128・ebur128は数値で保存される）
+MEASUREMENT_KEYS = ("input_i", "input_tp", "input_lra", "input_thresh")
+
+def user_cache_dir() -> Path:
+    """
+    OSごとのユーザーキャッシュディレクトリ（ffmpeg_gui用）を返す
+    """
+    if sys.platform == "darwin":
+        base = Path.home() / "Library" / "Caches"
+    elif os.name == "nt":
+        base = Path(os.environ.get("LOCALAPPDATA", Path.home() / "AppData" / "Local"))
+    else:
+        base = Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache"))
+    path = base / "ffmpeg_gui"
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+def file_fingerprint(path: Path) -> Tuple[str, int, int, str]:
+    """
+    ファイル識別子 (絶対パス, サイズ, mtime_ns, サンプリングハッシュ) を返す
+    ハッシュは先頭・中央・末尾の各64KiBとサイズから計算する（全体は読まない）
+    """
+    path = Path(path).absolute()
+    st = path.stat()
+    h = hashlib.sha1(str(st.st_size).encode())
+    with open(path, "rb") as f:
+        for offset in (0, max(st.st_size // 2 - SAMPLE_BYTES // 2, 0), max(st.st_size - SAMPLE_BYTES, 0)):
+            f.seek(offset)
+            h.update(f.read(SAMPLE_BYTES))
+    return str(path), st.st_size, st.st_mtime_ns, h.hexdigest()
+
+class LoudnessCache:
+    """
+    loudnorm/ebur128測定結果のキャッシュ
+    - キー: パス・サイズ・mtime・サンプリングハッシュ・測定範囲(scope)
+    - scope: 'full'（全区間）/ 'sampled'（3点サンプリング）など
+    - params: 測定時のフィルタパラメータ（一致を要求する場合のみ照合）
+    """
+    _default = None
+    _default_lock = threading.Lock()
+
+    def __init__(self, db_path: Optional[Path] = None):
+        self.db_path = Path(db_path) if db_path else user_cache_dir() / "loudness_cache.sqlite3"
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS loudness (
+                    path TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    sample_hash TEXT NOT NULL,
+                    scope TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    result TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (path, size, mtime_ns, sample_hash, scope)
+                )
+                """
+            )
+
+    @classmethod
+    def default(cls) -> "LoudnessCache":
+        """
+        アプリ全体で共有するキャッシュインスタンスを返す
+        """
+        with cls._default_lock:
+            if cls._default is None:
+                cls._default = cls()
+            return cls._default
+
+    @contextmanager
+    def _connect(self):
+        # スレッドごとに都度接続する（各ページのワーカースレッドから呼ばれるため）
+        conn = sqlite3.connect(str(self.db_path), timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, path: Path, scope: str, params: Optional[str] = None) -> Optional[dict]:
+        """
+        キャッシュ済み測定値を返す（無効・未登録ならNone）
+        """
+        try:
+            key = file_fingerprint(path)
+        except OSError:
+            return None
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT params, result FROM loudness WHERE path=? AND size=? AND mtime_ns=? AND sample_hash=? AND scope=?",
+                (*key, scope)
+            ).fetchone()
+        if row is None or (params is not None and row[0] != params):
+            return None
+        return json.loads(row[1])
+
+    def get_full(self, path: Path, params: Optional[str] = None) -> Optional[dict]:
+        """
+        全区間の測定値（scope='full'）をMEASUREMENT_KEYSをfloatにそろえて返す
+        - 'full'にはloudnorm・R128・書き出し時のebur128の結果が入るため、loudnormのmeasured_*に使う場合は
+          paramsで測定方法を限定する
+        - input_i・input_tpが数値でない・有限でない（無音の-inf）場合はNone
+        """
+        cached = self.get(path, "full", params)
+        if not cached:
+            return None
+        result = dict(cached)
+        try:
+            for key in MEASUREMENT_KEYS:
+                if key in result:
+                    result[key] = float(result[key])
+        except (TypeError, ValueError):
+            return None
+        if not all(math.isfinite(result.get(key, math.nan)) for key in ("input_i", "input_tp")):
+            return None
+        return result
+
+    def put(self, path: Path, scope: str, params: str, result: dict) -> None:
+        """
+        測定値を登録する（同じファイル・scopeの古い行は置き換え）
+        """
+        try:
+            key = file_fingerprint(path)
+        except OSError:
+            return
+        with self._lock, self._connect() as conn:
+            # 同じパスの古い世代（サイズ・mtimeが変わったもの）は削除
+            conn.execute("DELETE FROM loudness WHERE path=? AND scope=?", (key[0], scope))
+            conn.execute(
+                "INSERT INTO loudness VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (*key, scope, params, json.dumps(result), time.time())
+            )
@@ -0,0 +1,256 @@
+"""
+1回のffmpegデコードで音声の解析値をまとめて取得するユーティリティ
+（音声ストリーム有無・再生時間・volumedetect・astats・loudnorm測定値）
+"""
+import json
+import os
+import re
+import subprocess
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# 補正ページの2パス目と同じ条件で測定する（measured_*にそのまま渡せる）
+LOUDNORM_ANALYSIS_PARAMS = "loudnorm=I=-18:TP=-1.5:LRA=11"
+# 1プロセスにまとめる入力数の上限と、まとめる対象とするファイルサイズの上限（短いクリップ向け）
+BATCH_MAX_INPUTS = 8
+BATCH_MAX_FILE_BYTES = 200 * 1024 * 1024
+# 一括解析ログの行頭 "[volumedetect@i3 @ 0x...]" から入力番号を取り出す
+_LABELED_LINE = re.compile(r"^\[(\w+)@i(\d+) @ [^\]]*\]")
+
+@dataclass
+class MediaAnalysisResult:
+    """
+    MediaAnalysis.analyzeの結果
+    - loudness: loudnormのJSON（input_i, input_tp, input_lra, input_thresh など）
+    - max_volume / mean_volume: volumedetectの値(dB)
+    - peak_level / rms_level / noise_floor: astats(Overall)の値(dB)
+    """
+    has_audio: bool = False
+    duration: Optional[float] = None
+    audio_codec: Optional[str] = None
+    sample_rate: Optional[int] = None
+    channels: Optional[str] = None
+    max_volume: Optional[float] = None
+    mean_volume: Optional[float] = None
+    peak_level: Optional[float] = None
+    rms_level: Optional[float] = None
+    noise_floor: Optional[float] = None
+    loudness: Optional[Dict[str, str]] = None
+    error: Optional[str] = None
+    log: str = field(default="", repr=False)
+
+    def is_silent(self, threshold_db: float = -90.0) -> bool:
+        """
+        音声が完全無音か判定（max_volumeがthreshold_db未満なら無音とみなす）
+        """
+        return self.max_volume is not None and self.max_volume < threshold_db
+
+class MediaAnalysis:
+    """
+    volumedetect + astats + loudnorm を1つのフィルタグラフで実行する解析クラス
+    """
+    @staticmethod
+    def build_analysis_cmd(input_path: Path) -> list:
+        """
+        解析用ffmpegコマンドを生成（最初の音声ストリームのみをデコードしnullへ出力）
+        """
+        af = f"volumedetect,astats=measure_perchannel=none,{LOUDNORM_ANALYSIS_PARAMS}:print_format=json"
+        return [
+            "ffmpeg", "-hide_banner", "-nostats",
+            "-i", str(input_path),
+            "-map", "0:a:0?",
+            "-af", af,
+            "-f", "null", "-"
+        ]
+
+    @staticmethod
+    def parse_log(log: str) -> MediaAnalysisResult:
+        """
+        解析コマンドのstderrから各測定値を取り出す
+        """
+        result = MediaAnalysisResult(log=log)
+        # 入力ヘッダ部分（Stream mapping以前）から長さ・音声ストリーム情報を取得
+        header = log.split("Stream mapping:")[0]
+        m = re.search(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)", header)
+        if m:
+            result.duration = int(m.group(1)) * 3600 + int(m.group(2)) * 60 + float(m.group(3))
+        m = re.search(r"Stream #0:\d+[^:\n]*: Audio: (\w+)[^,\n]*, (\d+) Hz, ([^,\n]+)", header)
+        if m:
+            result.has_audio = True
+            result.audio_codec = m.group(1)
+            result.sample_rate = int(m.group(2))
+            result.channels = m.group(3).strip()
+        # volumedetect（グラフ初期化時の空出力があるため最後の値を採用）
+        vals = re.findall(r"max_volume: ([\-\d\.]+) dB", log)
+        if vals:
+            result.max_volume = float(vals[-1])
+        vals = re.findall(r"mean_volume: ([\-\d\.]+) dB", log)
+        if vals:
+            result.mean_volume = float(vals[-1])
+        # astats（Overall）
+        overall = log.split("] Overall")[-1] if "] Overall" in log else ""
+        for attr, key in (("peak_level", "Peak level dB"), ("rms_level", "RMS level dB"), ("noise_floor", "Noise floor dB")):
+            m = re.search(rf"{key}: ([\-\w\.]+)", overall)
+            if m:
+                try:
+                    setattr(result, attr, float(m.group(1)))
+                except ValueError:
+                    pass  # -inf など
+        # loudnorm
+        m = re.search(r"\{[^{}]*\"input_i\"[^{}]*\}", log)
+        if m:
+            result.loudness = json.loads(m.group(0))
+        return result
+
+    @staticmethod
+    def parse_ebur128_summary(log: str) -> Optional[Dict[str, float]]:
+        """
+        ebur128フィルタのSummaryから測定値を取り出す（measure_loudnessと同じキー。見つからなければNone）
+        """
+        if "Summary:" not in log:
+            return None
+        summary = log.split("Summary:")[-1]
+        keys = (
+            ("input_i", r"I:\s+([\-\d\.]+|-inf) LUFS"),
+            ("input_thresh", r"Integrated loudness:[\s\S]*?Threshold:\s+([\-\d\.]+|-inf) LUFS"),
+            ("input_lra", r"LRA:\s+([\-\d\.]+) LU"),
+            ("input_tp", r"Peak:\s+([\-\d\.]+|-inf) dBFS"),
+        )
+        result = {}
+        for key, pattern in keys:
+            m = re.search(pattern, summary)
+            if m is None:
+                return None
+            result[key] = float(m.group(1))
+        return result
+
+    @staticmethod
+    def build_batch_cmd(input_paths: List[Path]) -> list:
+        """
+        複数入力を1回のffmpeg実行で解析するコマンドを生成
+        入力iごとに [i:a:0] から始まる解析チェーンを作り、フィルタに@i{i}の名前を付けてログを振り分けられるようにする
+        """
+        chains = []
+        cmd = ["ffmpeg", "-hide_banner", "-nostats"]
+        for i, path in enumerate(input_paths):
+            cmd += ["-i", str(path)]
+            chains.append(
+                f"[{i}:a:0]volumedetect@i{i},astats@i{i}=measure_perchannel=none,"
+                f"{LOUDNORM_ANALYSIS_PARAMS.replace('loudnorm=', f'loudnorm@i{i}=')}:print_format=json[a{i}]"
+            )
+        cmd += ["-filter_complex", ";".join(chains)]
+        for i in range(len(input_paths)):
+            cmd += ["-map", f"[a{i}]"]
+        cmd += ["-f", "null", "-"]
+        return cmd
+
+    @staticmethod
+    def split_batch_log(log: str, count: int) -> List[str]:
+        """
+        一括解析のstderrを入力ごとに分け、単体解析（parse_log）と同じ形のログにして返す
+        - 入力ヘッダ（Input #i 〜）はStream #i:N を #0:N に読み替える
+        - フィルタのログは名前@i{i}で振り分け、行頭のない行（loudnormのJSON）は直前の入力に属させる
+        """
+        headers = [""] * count
+        bodies = [[] for _ in range(count)]
+        header_part, _, filter_part = log.partition("Stream mapping:")
+        for m in re.finditer(r"^Input #(\d+),[\s\S]*?(?=^Input #|^\[|\Z)", header_part, re.MULTILINE):
+            i = int(m.group(1))
+            if i < count:
+                headers[i] = re.sub(rf"Stream #{i}:", "Stream #0:", m.group(0))
+        owner = None
+        for line in log.splitlines():
+            m = _LABELED_LINE.match(line)
+            if m:
+                owner = int(m.group(2))
+                line = f"[{m.group(1)}{line[m.end(1) + len(m.group(2)) + 2:]}"
+            elif not line.startswith((" ", "\t", "{", "}")) or owner is None:
+                owner = None
+                continue
+            if owner is not None and owner < count:
+                bodies[owner].append(line)
+        return [headers[i] + "Stream mapping:\n" + "\n".join(bodies[i]) + "\n" for i in range(count)]
+
+    @staticmethod
+    def analyze_many(input_paths: List[Path], use_cache: bool = True, batch_size: int = BATCH_MAX_INPUTS,
+                     timeout: Optional[float] = None) -> Dict[str, MediaAnalysisResult]:
+        """
+        複数ファイルを解析し {パス文字列: MediaAnalysisResult} を返す
+        - キャッシュ済みのファイルはデコードしない
+        - BATCH_MAX_FILE_BYTES以下のファイルはbatch_size件ずつ1回のffmpeg実行にまとめる（起動・デマルチプレクサ初期化の削減）
+        - 一括実行が失敗した（音声のない入力を含む等）場合や、結果が取れなかった入力は1件ずつ解析し直す
+        """
+        from core.loudness_cache import LoudnessCache
+        cache = LoudnessCache.default() if use_cache else None
+        results: Dict[str, MediaAnalysisResult] = {}
+        batchable, single = [], []
+        for path in input_paths:
+            cached = cache.get(path, "analysis", LOUDNORM_ANALYSIS_PARAMS) if cache else None
+            if cached:
+                results[str(path)] = MediaAnalysisResult(**cached)
+                continue
+            try:
+                small = os.path.getsize(path) <= BATCH_MAX_FILE_BYTES
+            except OSError:
+                small = False
+            (batchable if small else single).append(path)
+        for start in range(0, len(batchable), max(batch_size, 1)):
+            batch = batchable[start:start + batch_size]
+            if len(batch) == 1:
+                single.extend(batch)
+                continue
+            try:
+                proc = subprocess.run(MediaAnalysis.build_batch_cmd(batch), capture_output=True, text=True,
+                                      errors="ignore", timeout=timeout)
+            except Exception:
+                single.extend(batch)
+                continue
+            if proc.returncode != 0:
+                single.extend(batch)
+                continue
+            for path, log in zip(batch, MediaAnalysis.split_batch_log(proc.stderr, len(batch))):
+                result = MediaAnalysis.parse_log(log)
+                if not result.has_audio or result.loudness is None:
+                    single.append(path)
+                    continue
+                results[str(path)] = result
+                if cache:
+                    MediaAnalysis._store(cache, path, result)
+        for path in single:
+            results[str(path)] = MediaAnalysis.analyze(path, use_cache=use_cache, timeout=timeout)
+        return results
+
+    @staticmethod
+    def _store(cache, input_path: Path, result: MediaAnalysisResult) -> None:
+        # 解析結果（ログは除く）とloudnorm測定値をキャッシュへ保存
+        data = asdict(result)
+        data["log"] = ""
+        cache.put(input_path, "analysis", LOUDNORM_ANALYSIS_PARAMS, data)
+        if result.loudness:
+            cache.put(input_path, "full", LOUDNORM_ANALYSIS_PARAMS, result.loudness)
+
+    @staticmethod
+    def analyze(input_path: Path, use_cache: bool = True, timeout: Optional[float] = None) -> MediaAnalysisResult:
+        """
+        1回のffmpeg実行で音声ストリーム有無・長さ・無音判定値・loudnorm測定値を取得
+        - 結果はLoudnessCacheに保存し、loudnorm測定値は全区間測定として測定ページとも共有する
+        """
+        from core.loudness_cache import LoudnessCache
+        cache = LoudnessCache.default() if use_cache else None
+        if cache:
+            cached = cache.get(input_path, "analysis", LOUDNORM_ANALYSIS_PARAMS)
+            if cached:
+                return MediaAnalysisResult(**cached)
+        cmd = MediaAnalysis.build_analysis_cmd(input_path)
+        try:
+            proc = subprocess.run(cmd, capture_output=True, text=True, errors="ignore", timeout=timeout)
+        except Exception as e:
+            return MediaAnalysisResult(error=str(e))
+        result = MediaAnalysis.parse_log(proc.stderr)
+        if proc.returncode != 0 and result.has_audio:
+            # 音声なしファイルは「出力ストリームなし」で失敗するのが正常
+            result.error = f"ffmpeg return code={proc.returncode}"
+        if cache and result.error is None:
+            MediaAnalysis._store(cache, input_path, result)
+        return result
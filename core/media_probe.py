@@ -0,0 +1,255 @@
+"""
+メディアファイルのメタデータ取得（ffprobe 1回＋永続キャッシュ）
+- probe(path) は ffprobe -show_format -show_streams を1回だけ実行し、MediaInfoにまとめて返す
+  mp4/movはcore.isobmffでボックスを直接読み、扱えない内容・壊れたファイルの場合だけffprobeを起動する
+- 結果はメモリ上のLRUと、ユーザーキャッシュのSQLiteに保存する
+  キーはファイルの (dev, inode, size, mtime_ns)。内容が変われば（サイズ・mtimeが変われば）取り直す
+- ffprobeの出力（JSON）をそのまま保存し、読み出すたびにMediaInfoへ変換する
+"""
+import json
+import os
+import sqlite3
+import subprocess
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.isobmff import ISOBMFF_EXTENSIONS, IsobmffError, probe_dict
+
+# メモリ上に保持する件数
+LRU_SIZE = 512
+# ffprobeの時間上限（秒）
+PROBE_TIMEOUT = 30
+
+def file_identity(path: Path) -> Tuple[int, int, int, int]:
+    """
+    キャッシュのキー (dev, inode, size, mtime_ns)（ファイルがなければOSError）
+    """
+    st = os.stat(path)
+    return st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns
+
+def _float(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def _int(value) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+@dataclass
+class StreamInfo:
+    """
+    ffprobeのstreamsの1要素（使う項目のみ。それ以外はrawに残る）
+    """
+    index: int
+    codec_type: Optional[str] = None
+    codec_name: Optional[str] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    r_frame_rate: Optional[str] = None
+    pix_fmt: Optional[str] = None
+    sample_rate: Optional[int] = None
+    channels: Optional[int] = None
+    duration: Optional[float] = None
+    raw: Dict[str, Any] = field(default_factory=dict, repr=False)
+
+    @classmethod
+    def from_ffprobe(cls, data: Dict[str, Any]) -> "StreamInfo":
+        return cls(
+            index=_int(data.get("index")) or 0,
+            codec_type=data.get("codec_type"),
+            codec_name=data.get("codec_name"),
+            width=_int(data.get("width")),
+            height=_int(data.get("height")),
+            r_frame_rate=data.get("r_frame_rate"),
+            pix_fmt=data.get("pix_fmt"),
+            sample_rate=_int(data.get("sample_rate")),
+            channels=_int(data.get("channels")),
+            duration=_float(data.get("duration")),
+            raw=data,
+        )
+
+@dataclass
+class MediaInfo:
+    """
+    probe()の結果（取得に失敗した場合はerrorにメッセージが入り、他の項目は空）
+    """
+    path: str
+    duration: Optional[float] = None
+    format_name: Optional[str] = None
+    bit_rate: Optional[int] = None
+    streams: List[StreamInfo] = field(default_factory=list)
+    error: Optional[str] = None
+
+    @classmethod
+    def from_ffprobe(cls, path: str, data: Dict[str, Any]) -> "MediaInfo":
+        fmt = data.get("format", {})
+        return cls(
+            path=path,
+            duration=_float(fmt.get("duration")),
+            format_name=fmt.get("format_name"),
+            bit_rate=_int(fmt.get("bit_rate")),
+            streams=[StreamInfo.from_ffprobe(s) for s in data.get("streams", [])],
+        )
+
+    @property
+    def video(self) -> Optional[StreamInfo]:
+        """
+        最初の映像ストリーム（カバー画像などのattached_picは除く）
+        """
+        return next((s for s in self.streams if s.codec_type == "video"
+                     and not s.raw.get("disposition", {}).get("attached_pic")), None)
+
+    @property
+    def audio(self) -> Optional[StreamInfo]:
+        """
+        最初の音声ストリーム
+        """
+        return next((s for s in self.streams if s.codec_type == "audio"), None)
+
+    @property
+    def has_audio(self) -> bool:
+        return self.audio is not None
+
+    def video_format(self) -> Dict[str, Any]:
+        """
+        結合可否の判定に使う映像プロパティ（CommandBuilder.get_video_format_infoと同じキー）
+        """
+        video = self.video
+        return {key: getattr(video, key) if video else None
+                for key in ("codec_name", "width", "height", "r_frame_rate", "pix_fmt")}
+
+class MediaProbe:
+    """
+    ffprobeの結果のキャッシュ（メモリLRU＋SQLite）
+    """
+    _default = None
+    _default_lock = threading.Lock()
+
+    def __init__(self, db_path: Optional[Path] = None, lru_size: int = LRU_SIZE, ffprobe: str = "ffprobe",
+                 use_isobmff: bool = True):
+        if db_path is None:
+            from core.loudness_cache import user_cache_dir
+            db_path = user_cache_dir() / "media_probe.sqlite3"
+        self.db_path = Path(db_path)
+        self.lru_size = lru_size
+        self.ffprobe = ffprobe
+        self.use_isobmff = use_isobmff
+        self._memory: "OrderedDict[Tuple[int, int, int, int], Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS probe (
+                    dev INTEGER NOT NULL,
+                    inode INTEGER NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    path TEXT NOT NULL,
+                    result TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (dev, inode, size, mtime_ns)
+                )
+                """
+            )
+
+    @classmethod
+    def default(cls) -> "MediaProbe":
+        """
+        アプリ全体で共有するインスタンスを返す
+        """
+        with cls._default_lock:
+            if cls._default is None:
+                cls._default = cls()
+            return cls._default
+
+    @contextmanager
+    def _connect(self):
+        # スレッドごとに都度接続する（LoudnessCacheと同じ）
+        conn = sqlite3.connect(str(self.db_path), timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def probe(self, path) -> MediaInfo:
+        """
+        メタデータを返す（メモリ → ディスク → ffprobeの順に探す。失敗した結果はキャッシュしない）
+        """
+        path = str(path)
+        try:
+            key = file_identity(path)
+        except OSError as e:
+            return MediaInfo(path=path, error=str(e))
+        data = self._get(key)
+        if data is None:
+            try:
+                data = self._read_metadata(path)
+            except Exception as e:
+                return MediaInfo(path=path, error=str(e))
+            self._put(key, path, data)
+        return MediaInfo.from_ffprobe(path, data)
+
+    def _get(self, key) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+        with self._connect() as conn:
+            row = conn.execute("SELECT result FROM probe WHERE dev=? AND inode=? AND size=? AND mtime_ns=?",
+                               key).fetchone()
+        if row is None:
+            return None
+        data = json.loads(row[0])
+        self._remember(key, data)
+        return data
+
+    def _put(self, key, path: str, data: Dict[str, Any]) -> None:
+        self._remember(key, data)
+        with self._connect() as conn:
+            # 同じファイルの古い世代（サイズ・mtimeが変わったもの）は削除
+            conn.execute("DELETE FROM probe WHERE dev=? AND inode=?", key[:2])
+            conn.execute("INSERT OR REPLACE INTO probe VALUES (?, ?, ?, ?, ?, ?, ?)",
+                         (*key, path, json.dumps(data), time.time()))
+
+    def _remember(self, key, data: Dict[str, Any]) -> None:
+        with self._lock:
+            self._memory[key] = data
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.lru_size:
+                self._memory.popitem(last=False)
+
+    def _read_metadata(self, path: str) -> Dict[str, Any]:
+        if self.use_isobmff and Path(path).suffix.lower() in ISOBMFF_EXTENSIONS:
+            try:
+                return probe_dict(path)
+            except (IsobmffError, OSError):
+                pass
+        return self._run_ffprobe(path)
+
+    def _run_ffprobe(self, path: str) -> Dict[str, Any]:
+        cmd = [self.ffprobe, "-v", "error", "-show_format", "-show_streams", "-of", "json", path]
+        result = subprocess.run(cmd, capture_output=True, text=True, encoding="utf-8", errors="ignore",
+                                timeout=PROBE_TIMEOUT)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip() or f"ffprobe failed (return code={result.returncode})")
+        return json.loads(result.stdout)
+
+    def clear_memory(self) -> None:
+        with self._lock:
+            self._memory.clear()
+
+def probe(path) -> MediaInfo:
+    """
+    MediaProbe.default().probe(path) の省略形
+    """
+    return MediaProbe.default().probe(path)
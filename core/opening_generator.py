@@ -1,16 +1,16 @@
 """
 オープニング動画生成コア処理
 """
-import subprocess
 import os
 from pathlib import Path
 
-def generate_opening(text: str, output_path: str, log_func=None) -> bool:
+def generate_opening(text: str, output_path: str, log_func=None, progress_callback=None) -> bool:
     """
     指定テキストを右下にフェードイン・フェードアウトで表示したオープニング動画を生成
     :param text: 埋め込みテキスト
     :param output_path: 出力ファイルパス
     :param log_func: ログ出力用関数
+    :param progress_callback: エンコード進捗(ProgressEvent)の通知先
     :return: 成功時True
     """
     # テンプレート動画パス
@@ -40,11 +40,19 @@ def generate_opening(text: str, output_path: str, log_func=None) -> bool:
     drawtext = (
         f"drawtext=text='{esc_text}':x=w-tw-{offset}:y=h-th-{offset}:fontsize={fontsize}:fontcolor=white:font='Arial':shadowcolor=black:shadowx=3:shadowy=3"
     )
+    # プリセットはテンプレートの解像度で目標の実時間比を満たす中で最も高画質なもの（測定できなければveryfast）
+    from core.command_builder import CommandBuilder
+    from core.executor import Executor
+    from core.log_capture import LogCapture
+    from core.preset_tuner import PresetTuner
+    fmt = CommandBuilder.get_video_format_info(template_path)
+    preset_args = PresetTuner.default().preset_args(
+        "libx264", fmt.get('width'), fmt.get('height'), log_func=log_func) or ["-preset", "veryfast"]
     ffmpeg_cmd = [
         "ffmpeg", "-y",
         "-i", template_path,
         "-vf", drawtext,
-        "-c:v", "libx264", "-crf", "18", "-preset", "veryfast",
+        "-c:v", "libx264", "-crf", "18", *preset_args,
         "-c:a", "aac", "-b:a", "192k",
         output_path
     ]
@@ -53,12 +61,13 @@ def generate_opening(text: str, output_path: str, log_func=None) -> bool:
         if log_func:
             log_func("ffmpegコマンド実行中...")
             log_func("実行コマンド: " + ' '.join(ffmpeg_cmd))
-        result = subprocess.run(ffmpeg_cmd, capture_output=True, text=True)
-        if result.returncode == 0:
+        # 長さはテンプレートのDurationをログから読む
+        capture = LogCapture()
+        if Executor.run_command(ffmpeg_cmd, progress_callback=progress_callback, capture=capture) == 0:
             return True
         else:
             if log_func:
-                log_func(f"[エラー] ffmpeg失敗: {result.stderr}")
+                log_func(f"[エラー] ffmpeg失敗: {capture.text()}")
             return False
     except Exception as e:
         if log_func:
@@ -67,5 +76,5 @@ def generate_opening(text: str, output_path: str, log_func=None) -> bool:
 
 class OpeningGenerator:
     @staticmethod
-    def generate_opening(text, output_path, log_func=None):
-        return generate_opening(text, output_path, log_func)
+    def generate_opening(text, output_path, log_func=None, progress_callback=None):
+        return generate_opening(text, output_path, log_func, progress_callback)
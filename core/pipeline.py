@@ -0,0 +1,192 @@
+"""
+複数プロセスをパイプでつないで実行するユーティリティ（例: 音声抽出ffmpeg → 補正ffmpeg）
+- 段の間のパイプはLinuxではF_SETPIPE_SZで拡大し、PCMの受け渡しでのコンテキストスイッチを減らす
+- 各段のstderrを専用スレッドで読み続け、LogCaptureに末尾と重要行だけを残す（詰まりによるデッドロック防止）
+- どれかの段が失敗したら残りの段を終了させ、最初に失敗した段を結果として返す
+"""
+import os
+import re
+import subprocess
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional
+
+from core.log_capture import LogCapture
+from core.proc_sampler import ProcSampler, ResourceSummary, record_command, wait_exited
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# Linuxのfcntlコマンド番号（Pythonのfcntlモジュールに定数がない版でも使えるように）
+F_SETPIPE_SZ = getattr(fcntl, "F_SETPIPE_SZ", 1031)
+F_GETPIPE_SZ = getattr(fcntl, "F_GETPIPE_SZ", 1032)
+# 段の間のパイプサイズ（既定の/proc/sys/fs/pipe-max-sizeと同じ1MiB）
+PIPE_SIZE = 1024 * 1024
+# 各段のstderrとして残す行数
+STDERR_TAIL_LINES = 200
+_LINE_BREAK = re.compile(rb"[\r\n]")
+
+@dataclass
+class StageResult:
+    """
+    パイプライン1段分の結果（stderrは末尾STDERR_TAIL_LINES行と、それ以前のエラー・警告行、resourcesはリソース使用量）
+    """
+    cmd: List[str]
+    returncode: Optional[int] = None
+    stderr: List[str] = field(default_factory=list, repr=False)
+    resources: Optional[ResourceSummary] = field(default=None, repr=False)
+
+@dataclass
+class PipelineResult:
+    """
+    Pipeline.runの結果
+    - failed_stage: 最初に失敗した段の番号（全段成功ならNone）
+    - timed_out: タイムアウトで全段を終了させた場合True
+    """
+    stages: List[StageResult]
+    failed_stage: Optional[int] = None
+    timed_out: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.failed_stage is None and not self.timed_out
+
+    def error_message(self) -> str:
+        """
+        失敗した段のコマンド名・終了コード・stderr末尾をまとめた文字列
+        """
+        if self.timed_out:
+            return "タイムアウトしました"
+        if self.failed_stage is None:
+            return ""
+        stage = self.stages[self.failed_stage]
+        tail = "\n".join(stage.stderr[-20:])
+        return f"{self.failed_stage + 1}段目({os.path.basename(stage.cmd[0])})が失敗しました (return code={stage.returncode})\n{tail}"
+
+def set_pipe_size(fd: int, size: int = PIPE_SIZE) -> int:
+    """
+    パイプのバッファサイズを変更し、変更後のサイズを返す（非対応・権限不足なら0）
+    """
+    if fcntl is None or not size:
+        return 0
+    try:
+        return fcntl.fcntl(fd, F_SETPIPE_SZ, size)
+    except OSError:
+        return 0
+
+class Pipeline:
+    """
+    cmds[0]のstdout → cmds[1]のstdin → ... とつないで実行する
+    """
+    def __init__(self, cmds: List[List[str]], pipe_size: int = PIPE_SIZE, stderr_lines: int = STDERR_TAIL_LINES,
+                 log_callback: Callable[[int, str], None] = None, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL):
+        """
+        - log_callback(段番号, 行): stderrの各行の通知先（読み出しスレッドから呼ばれる）
+        - stdin / stdout: 先頭段の入力・最終段の出力（既定はどちらもDEVNULL）
+        """
+        if not cmds:
+            raise ValueError("コマンドが空です")
+        self.cmds = cmds
+        self.pipe_size = pipe_size
+        self.stderr_lines = stderr_lines
+        self.log_callback = log_callback
+        self.stdin = stdin
+        self.stdout = stdout
+
+    def run(self, timeout: Optional[float] = None) -> PipelineResult:
+        """
+        全段を起動して終了を待つ
+        """
+        procs: List[subprocess.Popen] = []
+        samplers: List[ProcSampler] = []
+        buffers = [LogCapture(tail_lines=self.stderr_lines) for _ in self.cmds]
+        drains = []
+        try:
+            for i, cmd in enumerate(self.cmds):
+                last = i == len(self.cmds) - 1
+                stdin = procs[-1].stdout if procs else self.stdin
+                proc = subprocess.Popen(cmd, stdin=stdin, stdout=self.stdout if last else subprocess.PIPE,
+                                        stderr=subprocess.PIPE)
+                if procs:
+                    # 親側の読み口を閉じ、下流が終了したら上流にSIGPIPEが届くようにする
+                    procs[-1].stdout.close()
+                if not last:
+                    set_pipe_size(proc.stdout.fileno(), self.pipe_size)
+                procs.append(proc)
+                samplers.append(ProcSampler(proc.pid).start())
+                drain = threading.Thread(target=self._drain, args=(i, proc.stderr, buffers[i]), daemon=True)
+                drain.start()
+                drains.append(drain)
+        except Exception:
+            self._kill(procs)
+            for sampler in samplers:
+                sampler.stop()
+            raise
+
+        result = PipelineResult(stages=[StageResult(cmd=cmd) for cmd in self.cmds])
+        # 各段の終了時刻を記録する（失敗の連鎖から最初に失敗した段を選ぶため）
+        exit_times: List[Optional[float]] = [None] * len(procs)
+        changed = threading.Event()
+        def wait(index: int, proc: subprocess.Popen):
+            # 回収前に最後の値を読む
+            wait_exited(proc.pid)
+            result.stages[index].resources = samplers[index].stop()
+            proc.wait()
+            exit_times[index] = time.monotonic()
+            changed.set()
+        waiters = [threading.Thread(target=wait, args=(i, p), daemon=True) for i, p in enumerate(procs)]
+        for waiter in waiters:
+            waiter.start()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+            changed.wait(remaining)
+            changed.clear()
+            failed = [i for i, p in enumerate(procs) if exit_times[i] is not None and p.returncode != 0]
+            if failed:
+                # 上流はパイプ切断で後から失敗するため、最も早く失敗した段を原因とする
+                result.failed_stage = min(failed, key=lambda i: exit_times[i])
+                self._kill(procs)
+                break
+            if all(t is not None for t in exit_times):
+                break
+            if deadline is not None and time.monotonic() >= deadline:
+                result.timed_out = True
+                self._kill(procs)
+                break
+        for waiter in waiters:
+            waiter.join()
+        for drain in drains:
+            drain.join()
+        for stage, proc, buffer in zip(result.stages, procs, buffers):
+            stage.returncode = proc.returncode
+            stage.stderr = buffer.lines()
+            record_command(stage.cmd, stage.resources, stage.returncode, kind="pipeline")
+        return result
+
+    def _drain(self, index: int, stream, buffer: LogCapture) -> None:
+        # ffmpegの統計行は\r区切りのため、\rと\nの両方で行に分ける
+        pending = b""
+        for chunk in iter(lambda: stream.read1(65536), b""):
+            *lines, pending = _LINE_BREAK.split(pending + chunk)
+            for line in lines:
+                if line:
+                    self._emit(index, line, buffer)
+        if pending:
+            self._emit(index, pending, buffer)
+        stream.close()
+
+    def _emit(self, index: int, line: bytes, buffer: LogCapture) -> None:
+        text = line.decode("utf-8", errors="ignore").rstrip()
+        buffer.append(text)
+        if self.log_callback:
+            self.log_callback(index, text)
+
+    @staticmethod
+    def _kill(procs: List[subprocess.Popen]) -> None:
+        for proc in procs:
+            if proc.poll() is None:
+                proc.kill()
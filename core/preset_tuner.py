@@ -0,0 +1,242 @@
+"""
+エンコーダのプリセットをこのマシンの速度に合わせて選ぶ
+- 解像度クラスごとに合成映像（testsrc2）を短く書き出し、プリセット×スレッド数ごとのfpsを測定する
+- コマンド生成側は、目標の実時間比（例: 2倍速以上）を満たす中で最も高画質なプリセットを使う
+- 測定結果はユーザーキャッシュにJSONで保存し、ffmpegが変わったら（EncoderRegistryのキーが変わったら）測り直す
+"""
+import json
+import os
+import subprocess
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+from core.encoder_registry import ffmpeg_binary_key
+from core.loudness_cache import user_cache_dir
+
+# エンコーダごとのプリセット（高画質・低速 → 低画質・高速の順）
+X26X_PRESETS = ("veryslow", "slower", "slow", "medium", "fast", "faster", "veryfast", "superfast", "ultrafast")
+NVENC_PRESETS = ("p7", "p6", "p5", "p4", "p3", "p2", "p1")
+ENCODER_PRESETS = {
+    "libx264": X26X_PRESETS,
+    "libx265": X26X_PRESETS,
+    "h264_nvenc": NVENC_PRESETS,
+    "hevc_nvenc": NVENC_PRESETS,
+}
+# 解像度クラス（名前, 幅, 高さ）。画素数がクラス以下なら、そのクラスの測定値を使う
+RESOLUTION_CLASSES = (("720p", 1280, 720), ("1080p", 1920, 1080), ("2160p", 3840, 2160))
+# 測定用の合成映像
+CALIBRATION_FPS = 30
+CALIBRATION_FRAMES = 30
+# 1組み合わせの測定時間の上限（秒）
+CALIBRATION_TIMEOUT = 15.0
+# 目標の実時間比の既定値
+DEFAULT_TARGET_SPEED = 2.0
+# これより遅いプリセットは測定を打ち切る（実時間比。どの目標でも選ばれないため）
+MIN_SPEED = 0.5
+
+def resolution_class(width: Optional[int], height: Optional[int]) -> str:
+    """
+    解像度に対応するクラス名（不明なら1080p、最大クラスを超える場合は2160p）
+    """
+    if not width or not height:
+        return "1080p"
+    pixels = int(width) * int(height)
+    for name, w, h in RESOLUTION_CLASSES:
+        if pixels <= w * h:
+            return name
+    return RESOLUTION_CLASSES[-1][0]
+
+def thread_options(total: Optional[int] = None) -> List[int]:
+    """
+    測定するスレッド数（1・半分・全コア）
+    """
+    total = total or os.cpu_count() or 1
+    return sorted({1, max(1, total // 2), total})
+
+def frame_rate(value: Optional[str]) -> Optional[float]:
+    """
+    ffprobeのr_frame_rate（例: "30000/1001"）を数値に（変換できなければNone）
+    """
+    try:
+        num, _, den = str(value).partition("/")
+        rate = float(num) / float(den or 1)
+    except (TypeError, ValueError, ZeroDivisionError):
+        return None
+    return rate if rate > 0 else None
+
+@dataclass
+class PresetChoice:
+    """
+    PresetTuner.chooseの結果（fpsは測定値、speedは目標fpsに対する実時間比）
+    """
+    preset: str
+    threads: int
+    fps: float
+    speed: float
+
+    def args(self) -> List[str]:
+        return ["-preset", self.preset]
+
+class PresetTuner:
+    """
+    プリセットの測定結果と目標速度の保存・選択
+    """
+    _default = None
+    _default_lock = threading.Lock()
+
+    def __init__(self, cache_path: Optional[Path] = None, ffmpeg: str = "ffmpeg"):
+        self.cache_path = Path(cache_path) if cache_path else user_cache_dir() / "encoder_presets.json"
+        self.ffmpeg = ffmpeg
+        self._lock = threading.Lock()
+        self._binary_key = None
+
+    @classmethod
+    def default(cls) -> "PresetTuner":
+        """
+        アプリ全体で共有するインスタンスを返す
+        """
+        with cls._default_lock:
+            if cls._default is None:
+                cls._default = cls()
+            return cls._default
+
+    def binary_key(self) -> Optional[str]:
+        # EncoderRegistryと同じキー（バージョン行＋実行ファイルのサンプリングハッシュ）
+        if self._binary_key is None:
+            self._binary_key = ffmpeg_binary_key(self.ffmpeg)
+        return self._binary_key
+
+    def _read(self) -> dict:
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def _write(self, data: dict) -> None:
+        tmp = self.cache_path.with_suffix(".tmp")
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=1)
+            tmp.replace(self.cache_path)
+        except OSError:
+            pass
+
+    @property
+    def target_speed(self) -> float:
+        """
+        ユーザーが選んだ目標の実時間比（保存されていなければDEFAULT_TARGET_SPEED）
+        """
+        with self._lock:
+            return float(self._read().get("target_speed", DEFAULT_TARGET_SPEED))
+
+    def set_target_speed(self, speed: float) -> None:
+        with self._lock:
+            data = self._read()
+            data["target_speed"] = float(speed)
+            self._write(data)
+
+    def profile(self, encoder: str, res_class: str) -> Optional[Dict[str, Dict[str, float]]]:
+        """
+        測定済みの {スレッド数: {プリセット: fps}}（未測定・ffmpegが変わった場合はNone）
+        """
+        with self._lock:
+            data = self._read()
+        profiles = data.get("profiles", {})
+        if profiles.get("ffmpeg") != self.binary_key():
+            return None
+        return profiles.get(encoder, {}).get(res_class)
+
+    def calibrate(self, encoder: str, res_class: str, threads: Optional[Sequence[int]] = None,
+                  log_func: Callable[[str], None] = None) -> Dict[str, Dict[str, float]]:
+        """
+        プリセット×スレッド数ごとに合成映像を書き出してfpsを測り、保存して返す
+        速いプリセットから順に測り、MIN_SPEEDを下回ったらそれより遅いプリセットは測らない
+        """
+        presets = ENCODER_PRESETS[encoder]
+        width, height = next((w, h) for name, w, h in RESOLUTION_CLASSES if name == res_class)
+        result = {}
+        for count in threads or thread_options():
+            measured = {}
+            for preset in reversed(presets):
+                fps = self._measure(encoder, preset, count, width, height)
+                measured[preset] = fps
+                if log_func:
+                    log_func(f"[プリセット測定] {encoder} {res_class} {preset} threads={count}: {fps:.1f}fps")
+                if fps < CALIBRATION_FPS * MIN_SPEED:
+                    break
+            result[str(count)] = measured
+        with self._lock:
+            data = self._read()
+            profiles = data.get("profiles", {})
+            if profiles.get("ffmpeg") != self.binary_key():
+                # ffmpegが変わったら古い測定結果は捨てる
+                profiles = {"ffmpeg": self.binary_key()}
+            profiles.setdefault(encoder, {})[res_class] = result
+            data["profiles"] = profiles
+            self._write(data)
+        return result
+
+    def _measure(self, encoder: str, preset: str, threads: int, width: int, height: int) -> float:
+        # 書き出しにかかった実時間からfpsを求める（時間切れ・失敗は0）
+        cmd = [
+            self.ffmpeg, "-hide_banner", "-v", "error",
+            "-f", "lavfi", "-i", f"testsrc2=s={width}x{height}:r={CALIBRATION_FPS}",
+            "-frames:v", str(CALIBRATION_FRAMES), "-threads", str(threads),
+            "-c:v", encoder, "-preset", preset, "-pix_fmt", "yuv420p", "-f", "null", "-"
+        ]
+        start = time.monotonic()
+        try:
+            ok = subprocess.run(cmd, capture_output=True, timeout=CALIBRATION_TIMEOUT).returncode == 0
+        except (OSError, subprocess.TimeoutExpired):
+            ok = False
+        if not ok:
+            return 0.0
+        return CALIBRATION_FRAMES / max(time.monotonic() - start, 1e-6)
+
+    def choose(self, encoder: str, width: Optional[int] = None, height: Optional[int] = None,
+               threads: Optional[int] = None, fps: float = CALIBRATION_FPS,
+               target_speed: Optional[float] = None, log_func: Callable[[str], None] = None) -> Optional[PresetChoice]:
+        """
+        目標の実時間比を満たす中で最も高画質なプリセットを選ぶ（未測定なら先に測定する）
+        - threads: ジョブに割り当てたスレッド数（CpuBudget）。測定したスレッド数のうちこれ以下で最大のものを使う
+        - fps: 書き出す映像のフレームレート
+        - log_func: 測定する場合の進み具合の通知先（初回は数十秒かかるため、ページのログに出す）
+        - 目標を満たすものがなければ最も速いプリセット、プリセットのないエンコーダはNone
+        """
+        if encoder not in ENCODER_PRESETS:
+            return None
+        res_class = resolution_class(width, height)
+        profile = self.profile(encoder, res_class)
+        if profile is None:
+            if log_func:
+                log_func(f"[プリセット測定] {encoder} {res_class} の速度を測定します（このマシンで初回のみ）")
+            profile = self.calibrate(encoder, res_class, log_func=log_func)
+        counts = sorted(int(c) for c in profile)
+        if not counts:
+            return None
+        usable = [c for c in counts if threads is None or c <= threads] or counts[:1]
+        count = usable[-1]
+        measured = profile[str(count)]
+        target = self.target_speed if target_speed is None else target_speed
+        presets = [p for p in ENCODER_PRESETS[encoder] if p in measured]
+        if not presets or max(measured.values()) <= 0:
+            return None
+        for preset in presets:
+            if measured[preset] >= target * fps:
+                return PresetChoice(preset, count, measured[preset], measured[preset] / fps)
+        fastest = presets[-1]
+        return PresetChoice(fastest, count, measured[fastest], measured[fastest] / fps)
+
+    def preset_args(self, encoder: str, width: Optional[int] = None, height: Optional[int] = None,
+                    threads: Optional[int] = None, fps: float = CALIBRATION_FPS,
+                    log_func: Callable[[str], None] = None) -> List[str]:
+        """
+        コマンドに追加する ["-preset", 名前]（選べない場合は空リスト。log_funcはchooseを参照）
+        """
+        choice = self.choose(encoder, width, height, threads, fps, log_func=log_func)
+        return choice.args() if choice else []
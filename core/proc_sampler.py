@@ -0,0 +1,296 @@
+"""
+子プロセスのリソース使用量を/procから一定間隔で記録する
+- /proc/<pid>/stat（CPU時間・ブロックI/O待ち）、status（RSS・ピークRSS）、io（ストレージの読み書きバイト数）を読む
+- ジョブ終了時にResourceSummary（実時間・CPU時間・ピークRSS・読み書きバイト数）にまとめる
+- 完了したジョブはユーザーキャッシュのJSONL（jobs.jsonl）に1行ずつ追記し、同時実行数の見直しや
+  外部ストレージ待ちのジョブ（CPU使用率が低くI/O待ちが長いもの）の発見に使う
+- /procがないOS（macOS・Windows）では実時間のみ記録する
+"""
+import json
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# サンプリング間隔（秒）
+SAMPLE_INTERVAL = 0.5
+# ジョブログの上限。超えたら jobs.jsonl.1 に退避して新しく書き始める
+JOB_LOG_MAX_BYTES = 8 * 1024 * 1024
+# ジョブログに残すコマンドの文字数
+COMMAND_CHARS = 400
+
+try:
+    _CLK_TCK = os.sysconf("SC_CLK_TCK")
+except (AttributeError, ValueError, OSError):
+    _CLK_TCK = 100
+
+@dataclass
+class ProcSample:
+    """
+    /procの1回分の読み取り値（読めなかった項目はNone）
+    """
+    user_time: Optional[float] = None
+    sys_time: Optional[float] = None
+    blkio_wait: Optional[float] = None
+    rss: Optional[int] = None
+    peak_rss: Optional[int] = None
+    read_bytes: Optional[int] = None
+    write_bytes: Optional[int] = None
+
+@dataclass
+class ResourceSummary:
+    """
+    ジョブ1つ分のリソース使用量
+    - wall_time / cpu_time / user_time / sys_time / blkio_wait: 秒（blkio_waitはカーネルの遅延計測が有効な場合のみ）
+    - peak_rss: バイト / read_bytes・write_bytes: ストレージへの読み書き（ページキャッシュのヒットは含まない）
+    """
+    wall_time: float = 0.0
+    cpu_time: Optional[float] = None
+    user_time: Optional[float] = None
+    sys_time: Optional[float] = None
+    blkio_wait: Optional[float] = None
+    peak_rss: Optional[int] = None
+    read_bytes: Optional[int] = None
+    write_bytes: Optional[int] = None
+    samples: int = 0
+
+    @property
+    def cpu_utilization(self) -> Optional[float]:
+        """
+        CPU時間÷実時間（1.0で1コア分。低ければI/Oや他の待ちが支配的）
+        """
+        if self.cpu_time is None or self.wall_time <= 0:
+            return None
+        return self.cpu_time / self.wall_time
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["cpu_utilization"] = self.cpu_utilization
+        return data
+
+    def format(self) -> str:
+        """
+        ログ用の1行（例: "実時間 12.3s / CPU 20.1s (163%) / ピークRSS 512MB / 読込 1.2GB / 書出 300MB"）
+        """
+        parts = [f"実時間 {self.wall_time:.1f}s"]
+        if self.cpu_time is not None:
+            parts.append(f"CPU {self.cpu_time:.1f}s ({(self.cpu_utilization or 0) * 100:.0f}%)")
+        if self.peak_rss is not None:
+            parts.append(f"ピークRSS {_format_bytes(self.peak_rss)}")
+        if self.read_bytes is not None:
+            parts.append(f"読込 {_format_bytes(self.read_bytes)}")
+        if self.write_bytes is not None:
+            parts.append(f"書出 {_format_bytes(self.write_bytes)}")
+        return " / ".join(parts)
+
+def _format_bytes(size: float) -> str:
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.0f}{unit}"
+        size /= 1024
+    return f"{size:.1f}GB"
+
+def parse_stat(text: str) -> Dict[str, float]:
+    """
+    /proc/<pid>/stat からCPU時間とブロックI/O待ち（秒）を取り出す
+    （コマンド名に空白や括弧が入ることがあるため、最後の ')' 以降を数える）
+    """
+    fields = text[text.rfind(")") + 2:].split()
+    # fields[0]はstat(5)の3番目の項目（state）。utime=14, stime=15, delayacct_blkio_ticks=42番目
+    result = {"user_time": int(fields[11]) / _CLK_TCK, "sys_time": int(fields[12]) / _CLK_TCK}
+    if len(fields) > 39:
+        result["blkio_wait"] = int(fields[39]) / _CLK_TCK
+    return result
+
+def parse_status(text: str) -> Dict[str, int]:
+    """
+    /proc/<pid>/status からRSS（VmRSS）とピークRSS（VmHWM）をバイトで取り出す（終了済みのプロセスには無い）
+    """
+    result = {}
+    for line in text.splitlines():
+        key, _, value = line.partition(":")
+        if key in ("VmRSS", "VmHWM"):
+            result["rss" if key == "VmRSS" else "peak_rss"] = int(value.split()[0]) * 1024
+    return result
+
+def parse_io(text: str) -> Dict[str, int]:
+    """
+    /proc/<pid>/io からストレージへの読み書きバイト数を取り出す
+    """
+    result = {}
+    for line in text.splitlines():
+        key, _, value = line.partition(":")
+        if key in ("read_bytes", "write_bytes"):
+            result[key] = int(value)
+    return result
+
+def read_proc(pid: int) -> Optional[ProcSample]:
+    """
+    プロセスの現在の値を読む（プロセスがない・/procがなければNone。ioは権限がなければ省略）
+    """
+    base = Path("/proc") / str(pid)
+    try:
+        sample = ProcSample(**parse_stat((base / "stat").read_text()))
+    except (OSError, ValueError, IndexError):
+        return None
+    for name, parse in (("status", parse_status), ("io", parse_io)):
+        try:
+            for key, value in parse((base / name).read_text()).items():
+                setattr(sample, key, value)
+        except (OSError, ValueError, IndexError):
+            pass
+    return sample
+
+def wait_exited(pid: int) -> None:
+    """
+    子プロセスの終了を回収せずに待つ（ゾンビの間は/proc/<pid>/statが残り、終了時点のCPU時間を読める）
+    回収はこの後のPopen.wait()で行う。waitid非対応のOSでは何もしない
+    """
+    if not hasattr(os, "waitid"):
+        return
+    try:
+        os.waitid(os.P_PID, pid, os.WEXITED | os.WNOWAIT)
+    except (ChildProcessError, OSError):
+        pass
+
+class ProcSampler:
+    """
+    1つのプロセスをSAMPLE_INTERVAL秒ごとに読み、stop()でResourceSummaryを返す
+    - 子プロセス: 起動直後から測るため値をそのまま使い、ピークRSSはカーネルの記録（VmHWM）を使う
+    - 自プロセス（Whisperなどプロセス内で動くジョブ）: 開始時の値との差分を取り、ピークRSSは測定中のRSSの最大値
+    """
+    def __init__(self, pid: Optional[int] = None, interval: float = SAMPLE_INTERVAL):
+        self.pid = os.getpid() if pid is None else pid
+        self.interval = interval
+        self._own = self.pid == os.getpid()
+        self._first: Optional[ProcSample] = None
+        self._last: Optional[ProcSample] = None
+        self._peak_rss: Optional[int] = None
+        self._samples = 0
+        self._started = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self) -> "ProcSampler":
+        self._started = time.monotonic()
+        self.sample()
+        self._thread = threading.Thread(target=self._loop, name=f"proc-sampler-{self.pid}", daemon=True)
+        self._thread.start()
+        return self
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.interval):
+            if not self.sample():
+                return
+
+    def sample(self) -> bool:
+        """
+        1回読み取る（プロセスが終了していればFalse）
+        """
+        sample = read_proc(self.pid)
+        if sample is None:
+            return False
+        with self._lock:
+            if self._first is None:
+                self._first = sample
+            self._last = sample
+            self._samples += 1
+            peak = sample.rss if self._own else (sample.peak_rss or sample.rss)
+            if peak is not None:
+                self._peak_rss = max(self._peak_rss or 0, peak)
+        return True
+
+    def stop(self) -> ResourceSummary:
+        """
+        最後にもう一度読み取ってから集計する（子プロセスはwait()で回収する前に呼ぶと終了直前の値が取れる）
+        """
+        wall_time = time.monotonic() - self._started if self._started is not None else 0.0
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.sample()
+        with self._lock:
+            summary = ResourceSummary(wall_time=wall_time, peak_rss=self._peak_rss, samples=self._samples)
+            if self._last is not None:
+                base = self._first if self._own else ProcSample()
+                for key in ("user_time", "sys_time", "blkio_wait", "read_bytes", "write_bytes"):
+                    value = getattr(self._last, key)
+                    if value is not None:
+                        setattr(summary, key, value - (getattr(base, key) or 0))
+                if summary.user_time is not None and summary.sys_time is not None:
+                    summary.cpu_time = summary.user_time + summary.sys_time
+        return summary
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        if not self._stop.is_set():
+            self.stop()
+
+class JobLog:
+    """
+    完了したジョブのリソース使用量を追記するJSONL（1行1ジョブ）
+    """
+    _default = None
+    _default_lock = threading.Lock()
+
+    def __init__(self, path: Optional[Path] = None, max_bytes: int = JOB_LOG_MAX_BYTES):
+        if path is None:
+            from core.loudness_cache import user_cache_dir
+            path = user_cache_dir() / "jobs.jsonl"
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    @classmethod
+    def default(cls) -> "JobLog":
+        """
+        アプリ全体で共有するインスタンスを返す
+        """
+        with cls._default_lock:
+            if cls._default is None:
+                cls._default = cls()
+            return cls._default
+
+    def append(self, kind: str, name: str, summary: ResourceSummary, **fields) -> None:
+        """
+        1ジョブ分を追記する（kind: ffmpeg / pipeline / asr など、name: コマンド名・ジョブ名）
+        """
+        record = {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "kind": kind, "name": name, **fields,
+                  **summary.to_dict()}
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            try:
+                if self.path.exists() and self.path.stat().st_size > self.max_bytes:
+                    self.path.replace(self.path.with_name(self.path.name + ".1"))
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+            except OSError:
+                pass
+
+    def read(self) -> List[Dict[str, Any]]:
+        """
+        記録済みのジョブを古い順に返す（壊れた行は読み飛ばす）
+        """
+        records = []
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        continue
+        except OSError:
+            pass
+        return records
+
+def record_command(cmd: List[str], summary: ResourceSummary, returncode: Optional[int], kind: str = "ffmpeg") -> None:
+    """
+    子プロセス1つ分をJobLog.default()に追記する（コマンド全体は長いため先頭COMMAND_CHARS文字まで）
+    """
+    name = Path(cmd[0]).name if cmd else ""
+    JobLog.default().append(kind, name, summary, returncode=returncode, command=" ".join(map(str, cmd))[:COMMAND_CHARS])
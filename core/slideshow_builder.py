@@ -9,12 +9,19 @@ from PIL import Image, ImageDraw, ImageFont, ExifTags
 from pydub import AudioSegment
 # 追加: pydub
 from pydub import AudioSegment
+from core.cpu_budget import CpuBudget, apply_threads
+from core.encoder_registry import EncoderRegistry
+from core.executor import Executor
+from core.log_capture import LogCapture
+from core.preset_tuner import PresetTuner
 
 class SlideshowBuilder:
     @staticmethod
-    def build_ffmpeg_command(image_files: List[str], output_file: str, duration_per_image: int = 5, se_path: Optional[str] = None) -> (List[str], str, Optional[List[str]], Optional[str]):
+    def build_ffmpeg_command(image_files: List[str], output_file: str, duration_per_image: int = 5, se_path: Optional[str] = None, threads: Optional[int] = None, log_func=None) -> (List[str], str, Optional[List[str]], Optional[str]):
         """
         スライドショー動画生成用ffmpegコマンドと、SE合成用コマンドも返す
+        threads: ffmpegのスレッド数（CpuBudgetの割り当て。省略時はffmpegの既定）
+        log_func: プリセットの測定（初回のみ）の通知先
         """
         list_path = Path(output_file).with_suffix('.txt')
         with open(list_path, 'w', encoding='utf-8') as f:
@@ -24,17 +31,21 @@ class SlideshowBuilder:
                 f.write(f"duration {duration_per_image}\n")
             # 最後の画像はduration無しでfileだけ追加（公式推奨）
             f.write(f"file '{image_files[-1]}'\n")
-        import sys, platform
-        is_macos = sys.platform == "darwin"
-        is_apple_silicon = is_macos and (platform.machine() == "arm64" or platform.processor() == "arm")
         # スライドショー動画生成コマンド（HWエンコーダ優先・高画質）
-        if is_macos:
-            # macOS: QuickTime/Final Cut Pro互換最優先（h264_videotoolbox）
+        # エンコーダは使えることを確認済みのもの（macはh264_videotoolbox、それ以外は高画質のlibx264。
+        # どちらも使えなければ他のH.264エンコーダ）
+        registry = EncoderRegistry.default()
+        video_encoder = registry.best(('h264_videotoolbox', 'libx264')) or registry.best_h264()
+        # libx264のプリセットは目標の実時間比を満たす中で最も高画質なもの（測定できなければslow）
+        preset_args = [] if video_encoder != 'libx264' else (
+            PresetTuner.default().preset_args('libx264', 3840, 2160, threads, log_func=log_func) or ['-preset', 'slow'])
+        if video_encoder != 'libx264':
+            # HWエンコーダ: QuickTime/Final Cut Pro互換最優先
             video_cmd = [
                 'ffmpeg', '-y',
                 '-f', 'concat', '-safe', '0',
                 '-i', str(list_path),
-                '-c:v', 'h264_videotoolbox',
+                '-c:v', video_encoder,
                 '-r', '30',
                 '-pix_fmt', 'yuv420p',
                 '-vf', 'format=yuv420p',
@@ -51,7 +62,7 @@ class SlideshowBuilder:
                 '-vsync', 'vfr',
                 '-c:v', 'libx264',
                 '-crf', '18',
-                '-preset', 'slow',
+                *preset_args,
                 '-profile:v', 'high',
                 '-level', '4.2',
                 '-pix_fmt', 'yuv420p',
@@ -82,12 +93,13 @@ class SlideshowBuilder:
             #
             # これによりSE音が画像枚数分、重なりなく均等に並ぶ
 
-        return video_cmd, str(list_path), audio_cmd, audio_out
+        return apply_threads(video_cmd, threads), str(list_path), audio_cmd, audio_out
 
     @staticmethod
-    def run_slideshow(image_files: List[str], output_dir: str, log_func=print, duration_per_image: int = 5, se_path: Optional[str] = None, exif_enable: bool = False, exif_missing_text: str = "Exif情報なし") -> Optional[str]:
+    def run_slideshow(image_files: List[str], output_dir: str, log_func=print, duration_per_image: int = 5, se_path: Optional[str] = None, exif_enable: bool = False, exif_missing_text: str = "Exif情報なし", progress_callback=None) -> Optional[str]:
         """
         画像リストからスライドショー動画を4K出力・縦横比維持・最大化・黒背景で生成（Exif/SE対応）
+        progress_callback: 動画生成（エンコード）の進捗(ProgressEvent)の通知先
         """
         if not image_files:
             log_func('[エラー] 画像ファイルが選択されていません')
@@ -242,12 +254,18 @@ class SlideshowBuilder:
                     except Exception as e2:
                         processed_images.append(img_path)
             image_files_for_video = processed_images
-            video_cmd, list_path, audio_cmd, audio_out = SlideshowBuilder.build_ffmpeg_command(
-                image_files_for_video, output_file, duration_per_image, se_path)
-            log_func('[INFO] スライドショー動画生成コマンド: ' + ' '.join(video_cmd))
-            proc_v = subprocess.run(video_cmd, capture_output=True, text=True)
-            if proc_v.returncode != 0:
-                log_func('[エラー] 動画生成失敗: ' + proc_v.stderr)
+            # 動画生成（エンコード）中は割り当てたコア数だけffmpegに使わせる
+            with CpuBudget.default().allocate() as cpu:
+                video_cmd, list_path, audio_cmd, audio_out = SlideshowBuilder.build_ffmpeg_command(
+                    image_files_for_video, output_file, duration_per_image, se_path, threads=cpu.threads,
+                    log_func=log_func)
+                log_func('[INFO] スライドショー動画生成コマンド: ' + ' '.join(video_cmd))
+                video_log = LogCapture()
+                ret_v = Executor.run_command(video_cmd, progress_callback=progress_callback,
+                                             duration=len(image_files_for_video) * duration_per_image,
+                                             capture=video_log, affinity=cpu.cores)
+            if ret_v != 0:
+                log_func('[エラー] 動画生成失敗: ' + video_log.text())
                 return None
             # --- SE合成済み音声(audio_out)が存在する場合は必ずそれをmux ---
             if se_path and audio_out and Path(audio_out).exists():
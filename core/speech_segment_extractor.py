@@ -8,6 +8,9 @@ import re
 import subprocess
 import mimetypes
 from typing import List, Tuple
+from core.cpu_budget import CpuBudget, apply_threads, set_torch_threads
+from core.encoder_registry import EncoderRegistry
+from core.preset_tuner import CALIBRATION_FPS, PresetTuner, frame_rate
 
 class SpeechSegmentExtractor:
     def __init__(self, whisper_model: str = "small"):
@@ -168,8 +171,15 @@ class SpeechSegmentExtractor:
             stdout_buf = io.StringIO()
             stderr_buf = io.StringIO()
             log(f"[INFO] Whisperモデル '{self.whisper_model}' で音声認識を開始します...")
-            with contextlib.redirect_stdout(stdout_buf), contextlib.redirect_stderr(stderr_buf):
-                result = self.model.transcribe(audio_path, **transcribe_kwargs)
+            # torchのスレッド数を割り当て分に絞る（同時に動くffmpegとコアを取り合わないように）
+            with CpuBudget.default().allocate() as cpu:
+                previous_threads = set_torch_threads(cpu.threads)
+                try:
+                    with contextlib.redirect_stdout(stdout_buf), contextlib.redirect_stderr(stderr_buf):
+                        result = self.model.transcribe(audio_path, **transcribe_kwargs)
+                finally:
+                    if previous_threads is not None:
+                        set_torch_threads(previous_threads)
             # キャプチャした内容をlog_funcに流す
             std_out = stdout_buf.getvalue()
             std_err = stderr_buf.getvalue()
@@ -194,11 +204,9 @@ class SpeechSegmentExtractor:
             total_speech += ed-st
             used.append((st, ed))
         # 元動画の再生時間を取得
+        from core.ffprobe_loudness import FFprobeLoudness
         try:
-            import subprocess, re
-            cmd = ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "default=noprint_wrappers=1:nokey=1", audio_path]
-            out = subprocess.check_output(cmd, encoding="utf-8", errors="ignore").strip()
-            original_duration = float(re.findall(r"[\d.]+", out)[0])
+            original_duration = FFprobeLoudness.get_duration(audio_path)
         except Exception as e:
             original_duration = None
             log(f"[警告] 元動画の再生時間取得失敗: {e}")
@@ -212,9 +220,7 @@ class SpeechSegmentExtractor:
         # 出力ファイルの実測再生時間もログ
         if output_path:
             try:
-                cmd2 = ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "default=noprint_wrappers=1:nokey=1", output_path]
-                out2 = subprocess.check_output(cmd2, encoding="utf-8", errors="ignore").strip()
-                actual_duration = float(re.findall(r"[\d.]+", out2)[0])
+                actual_duration = FFprobeLoudness.get_duration(output_path)
                 log(f"  出力ファイル実測: {actual_duration:.2f} 秒")
                 if original_duration:
                     log(f"  差分(実測): {original_duration-actual_duration:.2f} 秒")
@@ -243,13 +249,9 @@ class SpeechSegmentExtractor:
         # 入力メディアの長さ取得
         max_duration = None
         if reference_media_path:
+            from core.ffprobe_loudness import FFprobeLoudness
             try:
-                import subprocess
-                cmd = [
-                    "ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "default=noprint_wrappers=1:nokey=1", reference_media_path
-                ]
-                out = subprocess.check_output(cmd, encoding="utf-8", errors="ignore").strip()
-                max_duration = float(re.findall(r"[\d.]+", out)[0])
+                max_duration = FFprobeLoudness.get_duration(reference_media_path)
             except Exception:
                 max_duration = None
         raw_segments = []
@@ -308,9 +310,10 @@ class SpeechSegmentExtractor:
         return merged
 
     def build_ffmpeg_commands(self, video_path: str, segments: List[Tuple[float, float]], output_path: str, 
-                          merge_gap_sec: float = 0.0, crossfade_duration: float = 0.2, log_func=None) -> str:
+                          merge_gap_sec: float = 0.0, crossfade_duration: float = 0.2, log_func=None,
+                          threads: int = None) -> List[str]:
         """
-        FFmpegコマンド文字列を生成
+        FFmpegコマンド（引数のリスト）を生成
         
         Args:
             video_path: 入力動画ファイルのパス
@@ -319,12 +322,16 @@ class SpeechSegmentExtractor:
             merge_gap_sec: セリフ間隔のマージ閾値（秒）
             crossfade_duration: クロスフェードの持続時間（秒）
             log_func: ログ出力用コールバック関数
+            threads: ffmpegのスレッド数（CpuBudgetの割り当て。省略時はffmpegの既定）
             
         Returns:
-            FFmpegコマンドのリスト（複数のエンコーダオプションを試す場合）
+            FFmpegコマンド（引数のリスト。エンコーダはEncoderRegistryで使えることを確認済みのもの）
+
+        Raises:
+            ValueError: セリフ区間がない場合
         """
         if not segments or len(segments) == 0:
-            return "# セリフ区間がありません"
+            raise ValueError("セリフ区間がありません")
             
         # ログ出力用のヘルパー関数
         def log(msg):
@@ -416,56 +423,45 @@ class SpeechSegmentExtractor:
         # filter_complex全体
         filter_complex = ';'.join(afilters + vfilters)
         # コマンド組み立て
-        # macではHWエンコーダ(hevc_videotoolbox)を優先しH.265で出力
-        # libx265でのエンコードも可能だが速度・消費電力の観点でHW優先
+        # macではHWエンコーダ(hevc_videotoolbox)を優先しH.265で出力（Apple互換性を最大化）
+        # それ以外は使えることを確認済みのH.264エンコーダ（NVIDIA→Intel QSV→…→libx264）を最初から選ぶ
         # クォートは不要。コマンドリストをそのままExecutorに渡す
         import platform
-        # OSごとに適切なエンコーダを選択し、順に試せるようリストで返す
-        system = platform.system()
-        cmd_list = []
-        if system == "Windows" or system == "Linux":
-            # NVIDIA→Intel QSV→ソフトウェアの順で試行
-            for video_codec in ["h264_nvenc", "h264_qsv", "libx264"]:
-                cmd = [
-                    "ffmpeg", "-y",
-                    "-copyts",  # 入力タイムスタンプを維持
-                    "-start_at_zero",  # タイムスタンプを0から開始
-                    "-avoid_negative_ts", "make_zero",  # 負のタイムスタンプを防ぐ
-                    "-fflags", "+genpts+igndts",  # タイムスタンプを再生成しDTSを無視
-                    "-i", str(video_path),
-                    "-filter_complex", filter_complex,
-                    "-map", f"[{vout}]", "-map", f"[{aout}]",
-                    "-c:v", video_codec,  # HWエンコーダ指定
-                    "-c:a", "aac", "-b:a", "192k",
-                    "-shortest",  # 映像・音声ストリーム長不一致時に短い方で切ることでmux不整合を防ぐ
-                    "-movflags", "+faststart",  # QuickTime/Final Cut Pro互換性向上
-                    str(output_path)
-                ]
-                cmd_list.append(cmd)
-        elif system == "Darwin":
-            # macOSはHWエンコーダ(hevc_videotoolbox)で出力し、Apple互換性を最大化
-            cmd = [
-                "ffmpeg", "-y",
-                "-copyts",  # 入力タイムスタンプを維持
-                "-start_at_zero",  # タイムスタンプを0から開始
-                "-avoid_negative_ts", "make_zero",  # 負のタイムスタンプを防ぐ
-                "-fflags", "+genpts+igndts",  # タイムスタンプを再生成しDTSを無視
-                "-i", str(video_path),
-                "-filter_complex", filter_complex,
-                "-map", f"[{vout}]", "-map", f"[{aout}]",
-                "-c:v", "hevc_videotoolbox",
+        registry = EncoderRegistry.default()
+        hevc_encoder = registry.best(("hevc_videotoolbox",)) if platform.system() == "Darwin" else None
+        cmd = [
+            "ffmpeg", "-y",
+            "-copyts",  # 入力タイムスタンプを維持
+            "-start_at_zero",  # タイムスタンプを0から開始
+            "-avoid_negative_ts", "make_zero",  # 負のタイムスタンプを防ぐ
+            "-fflags", "+genpts+igndts",  # タイムスタンプを再生成しDTSを無視
+            "-i", str(video_path),
+            "-filter_complex", filter_complex,
+            "-map", f"[{vout}]", "-map", f"[{aout}]",
+        ]
+        if hevc_encoder:
+            cmd += [
+                "-c:v", hevc_encoder,
                 "-pix_fmt", "yuv420p",  # 8bit 4:2:0でApple互換性
                 "-profile:v", "main",   # Main10ではなくMain
                 "-tag:v", "hvc1",       # QuickTime/Final Cut Pro互換タグ
-                "-c:a", "aac", "-b:a", "192k",
-                "-shortest",
-                "-movflags", "+faststart",  # Web再生用に最適化
-                str(output_path)
             ]
-            cmd_list.append(cmd)
-        # 返り値をリストに変更（呼び出し側で順に実行し、成功したものを採用）
-        # 既存呼び出し側がstr/リスト両対応なので、1つだけの時はそのまま返す
-        return cmd_list if len(cmd_list) > 1 else cmd_list[0]
+        else:
+            # プリセットは元動画の解像度・フレームレートで目標の実時間比を満たす中で最も高画質なもの
+            from core.command_builder import CommandBuilder
+            video_encoder = registry.best_h264()
+            fmt = CommandBuilder.get_video_format_info(str(video_path))
+            cmd += ["-c:v", video_encoder, *PresetTuner.default().preset_args(
+                video_encoder, fmt.get('width'), fmt.get('height'), threads,
+                fps=frame_rate(fmt.get('r_frame_rate')) or CALIBRATION_FPS, log_func=log_func
+            )]
+        cmd += [
+            "-c:a", "aac", "-b:a", "192k",
+            "-shortest",  # 映像・音声ストリーム長不一致時に短い方で切ることでmux不整合を防ぐ
+            "-movflags", "+faststart",  # QuickTime/Final Cut Pro互換性向上
+            str(output_path)
+        ]
+        return apply_threads(cmd, threads)
 
     @staticmethod
     def _format_srt_time(seconds: float) -> str:
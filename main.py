@@ -3,7 +3,7 @@
 PySide6 + Draculaテーマ + サイドバー + QStackedWidget構成
 """
 import sys
-from PySide6.QtWidgets import QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QStackedWidget, QLabel
+from PySide6.QtWidgets import QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QStackedWidget, QLabel, QDoubleSpinBox, QCheckBox
 from PySide6.QtCore import Qt
 from ui_pages.loudness_page import LoudnessPage
 from ui_pages.loudness_measure_page import LoudnessMeasurePage
@@ -11,6 +11,8 @@ from ui_pages.video_concat_page import VideoConcatPage
 from ui_pages.slideshow_page import SlideshowPage
 from ui_pages.auto_speech_extract_page import AutoSpeechExtractPage
 from ui_pages.opening_generator_page import OpeningGeneratorPage  # 追加
+from core.cpu_budget import CpuBudget, pinning_supported
+from core.preset_tuner import PresetTuner
 
 class MainWindow(QMainWindow):
     def __init__(self):
@@ -41,6 +43,22 @@ class MainWindow(QMainWindow):
         self.btn_opening.setObjectName("btn_opening")
         sidebar.addWidget(self.btn_opening)
         sidebar.addStretch()
+        # エンコードの目標速度（実時間比）。プリセットはこれを満たす中で最も高画質なものを選ぶ
+        sidebar.addWidget(QLabel("エンコード目標速度"))
+        self.spin_target_speed = QDoubleSpinBox()
+        self.spin_target_speed.setRange(0.1, 20.0)
+        self.spin_target_speed.setSingleStep(0.5)
+        self.spin_target_speed.setSuffix("x")
+        self.spin_target_speed.setValue(PresetTuner.default().target_speed)
+        self.spin_target_speed.valueChanged.connect(PresetTuner.default().set_target_speed)
+        sidebar.addWidget(self.spin_target_speed)
+        # ffmpegをジョブごとに割り当てたCPUコアに固定する（Linuxのみ）
+        if pinning_supported():
+            self.chk_pin_cores = QCheckBox("ffmpegをCPUコアに固定")
+            self.chk_pin_cores.setToolTip("同時に動くジョブ同士が同じコアを奪い合わないよう、割り当てたコアにffmpegを固定します。")
+            self.chk_pin_cores.setChecked(CpuBudget.default().pin)
+            self.chk_pin_cores.toggled.connect(CpuBudget.default().set_pin)
+            sidebar.addWidget(self.chk_pin_cores)
         self.btn_reset = QPushButton("全リセット")
         self.btn_reset.setObjectName("btn_reset")
         self.btn_reset.clicked.connect(self.reset_all_file_lists)
@@ -0,0 +1,39 @@
+"""
+テスト共通の設定
+- ユーザーキャッシュ（ジョブログ・測定キャッシュ・エンコーダー情報など）をテストごとの一時ディレクトリに向け、
+  開発者の ~/.cache/ffmpeg_gui に書き込まないようにする
+- コマンド生成からPresetTunerに届いても実際の書き出し速度は測らない（@pytest.mark.real_calibrationのテストを除く）
+"""
+import sys
+
+import pytest
+
+from core.encoder_registry import EncoderRegistry
+from core.loudness_cache import LoudnessCache
+from core.media_probe import MediaProbe
+from core.preset_tuner import PresetTuner
+from core.proc_sampler import JobLog
+
+# user_cache_dir()の下にファイルを持つ共有インスタンス
+CACHE_SINGLETONS = (EncoderRegistry, JobLog, LoudnessCache, MediaProbe, PresetTuner)
+# 測定を省いたときの全プリセットのfps（どの目標速度でも最も高画質なプリセットが選ばれる）
+FAKE_CALIBRATION_FPS = 240.0
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "real_calibration: PresetTunerの測定で実際にffmpegを実行する")
+
+@pytest.fixture(autouse=True)
+def isolated_user_cache(tmp_path, monkeypatch):
+    cache_home = tmp_path / "user-cache"
+    monkeypatch.setenv("XDG_CACHE_HOME", str(cache_home))
+    monkeypatch.setenv("LOCALAPPDATA", str(cache_home))
+    if sys.platform == "darwin":
+        monkeypatch.setenv("HOME", str(cache_home))
+    for cls in CACHE_SINGLETONS:
+        monkeypatch.setattr(cls, "_default", None)
+    return cache_home / "ffmpeg_gui"
+
+@pytest.fixture(autouse=True)
+def fake_preset_calibration(request, monkeypatch):
+    if request.node.get_closest_marker("real_calibration") is None:
+        monkeypatch.setattr(PresetTuner, "_measure", lambda self, *args: FAKE_CALIBRATION_FPS)
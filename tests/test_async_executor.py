@@ -0,0 +1,76 @@
+"""
+async_executor.py テスト（子プロセスにはPythonインタプリタを使う）
+"""
+import os
+import sys
+import time
+
+import pytest
+
+from core.async_executor import AsyncExecutor
+
+def _py(code):
+    return [sys.executable, "-c", code]
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+def test_run_collects_log_and_returncode():
+    lines = []
+    result = AsyncExecutor().run_sync(_py("print('a'); print('b'); raise SystemExit(3)"), log_callback=lines.append)
+    assert result.returncode == 3 and not result.ok
+    assert lines == ["a", "b"] and result.log == ["a", "b"]
+
+def test_timeout_kills_process():
+    start = time.monotonic()
+    result = AsyncExecutor().run_sync(_py("import time; time.sleep(30)"), timeout=0.5)
+    assert result.timed_out and not result.stalled
+    assert time.monotonic() - start < 10
+
+def test_stall_watchdog():
+    code = "import sys, time; print('start'); sys.stdout.flush(); time.sleep(30)"
+    result = AsyncExecutor().run_sync(_py(code), stall_timeout=0.5)
+    assert result.stalled and not result.timed_out
+    assert result.log == ["start"]
+
+@pytest.mark.skipif(os.name == "nt", reason="プロセスグループはPOSIXのみ")
+def test_cancel_kills_process_group():
+    # 孫プロセスのPIDを出力してから待ち続ける
+    code = (
+        "import subprocess, sys, time;"
+        "p = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)']);"
+        "print(p.pid, flush=True); time.sleep(60)"
+    )
+    pids = []
+    handle = AsyncExecutor().submit(_py(code), log_callback=lambda line: pids.append(int(line)))
+    deadline = time.monotonic() + 10
+    while not pids and time.monotonic() < deadline:
+        time.sleep(0.05)
+    handle.cancel()
+    result = handle.result(timeout=10)
+    assert result.cancelled
+    deadline = time.monotonic() + 5
+    while _alive(pids[0]) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert not _alive(pids[0])
+
+def test_semaphore_limits_concurrency():
+    executor = AsyncExecutor(max_concurrent=1)
+    handles = [executor.submit(_py("import time; time.sleep(0.3)")) for _ in range(3)]
+    results = sorted((h.result(timeout=10) for h in handles), key=lambda r: r.started_at)
+    assert all(r.ok for r in results)
+    for prev, cur in zip(results, results[1:]):
+        assert cur.started_at >= prev.ended_at
+
+def test_cancel_before_start():
+    executor = AsyncExecutor(max_concurrent=1)
+    first = executor.submit(_py("import time; time.sleep(0.5)"))
+    queued = executor.submit(_py("print('never')"))
+    queued.cancel()
+    assert queued.result(timeout=10).cancelled
+    assert queued.result().log == []
+    assert first.result(timeout=10).ok
@@ -39,8 +39,12 @@ def test_build_video_concat_cmd_same_properties(monkeypatch):
 
 def test_build_video_concat_cmd_diff_properties(monkeypatch):
     """
-    主要プロパティが不一致の場合：filter_complex方式・h264_videotoolbox再エンコードになるかテスト
+    主要プロパティが不一致の場合：filter_complex方式・EncoderRegistryが選んだエンコーダで再エンコードになるかテスト
     """
+    from core.encoder_registry import EncoderRegistry
+    from core.preset_tuner import PresetTuner
+    monkeypatch.setattr(EncoderRegistry, 'best_h264', lambda self: 'h264_videotoolbox')
+    monkeypatch.setattr(PresetTuner, 'preset_args', lambda self, *args, **kwargs: [])
     # ffprobeの戻り値をモック
     def mock_get_video_format_info(file_path):
         if "a" in file_path:
@@ -69,3 +73,198 @@ def test_build_video_concat_cmd_diff_properties(monkeypatch):
     assert "h264_videotoolbox" in cmd
     assert force_reason is not None
     assert "不一致" in force_reason or "再エンコード" in force_reason
+
+
+def test_probe_video_formats_order_and_early_stop(monkeypatch):
+    """
+    並列取得でも入力順を保ち、先頭と異なるファイルが見つかったら残りの取得を省略するかテスト
+    """
+    import threading
+    import time
+    from core.encoder_registry import EncoderRegistry
+    from core.preset_tuner import PresetTuner
+    monkeypatch.setattr(EncoderRegistry, 'best_h264', lambda self: 'libx264')
+    monkeypatch.setattr(PresetTuner, 'preset_args', lambda self, *args, **kwargs: [])
+    probed = []
+    lock = threading.Lock()
+    def mock_get_video_format_info(file_path):
+        index = int(file_path.split(".")[0])
+        # 後ろのファイルほど早く終わるようにして、完了順と入力順をずらす
+        time.sleep(0.02 * (5 - index % 5))
+        with lock:
+            probed.append(index)
+        return {'codec_name': 'h264', 'width': 1920 if index != 3 else 1280, 'height': 1080,
+                'r_frame_rate': '30/1', 'pix_fmt': 'yuv420p'}
+    monkeypatch.setattr(CommandBuilder, 'get_video_format_info', mock_get_video_format_info)
+    files = [f"{i}.mp4" for i in range(40)]
+    logs = []
+    format_list = CommandBuilder.probe_video_formats(files[:6], max_workers=4, stop_on_mismatch=False)
+    assert [fmt['width'] for fmt in format_list] == [1920, 1920, 1920, 1280, 1920, 1920]
+    assert all(fmt['probe_sec'] >= 0 for fmt in format_list)
+    probed.clear()
+    format_list = CommandBuilder.probe_video_formats(files, max_workers=4, log_func=logs.append)
+    assert len(format_list) == 40 and format_list[3]['width'] == 1280
+    assert len(probed) < 40 and any(fmt.get('skipped') for fmt in format_list)
+    assert "4件目" in logs[0] and "省略" in logs[0]
+    # 省略があっても再エンコードの判定と理由は入力順の最初の不一致から作る
+    _, concat_list, need_reencode, _, force_reason = CommandBuilder.build_video_concat_cmd(
+        files, Path("out.mp4"), probe_workers=4)
+    import os
+    os.remove(concat_list)
+    assert need_reencode and force_reason.startswith("width不一致: 0.mp4=1920, 3.mp4=1280")
+
+
+def test_build_loudness_normalization_cmd_single_pass(monkeypatch):
+    """
+    single_pass=True: 解析結果を使い、映像コピー＋補正音声を1コマンドで書き出すかテスト
+    """
+    def mock_analyze_loudness(input_path, true_peak_limit=-1.5):
+        return {'input_i': '-24.0', 'input_tp': '-3.0', 'input_lra': '5.0', 'input_thresh': '-34.0'}
+    monkeypatch.setattr(CommandBuilder, 'analyze_loudness', mock_analyze_loudness)
+
+    input_path = Path("input.mp4")
+    output_path = Path("input_norm-14LUFS.mp4")
+    cmds = CommandBuilder.build_loudness_normalization_cmd(input_path, output_path, single_pass=True)
+    assert len(cmds) == 1
+    cmd = cmds[0]
+    assert cmd[-1] == str(output_path)
+    assert cmd.count("-i") == 1
+    assert cmd[cmd.index("-c:v") + 1] == "copy"
+    af = cmd[cmd.index("-af") + 1]
+    assert "loudnorm=I=-14" in af
+    assert "measured_I=-24.0" in af
+
+def test_build_loudness_normalization_cmd_measure_output():
+    """
+    measure_output=True: 補正後の音声をebur128に分岐して書き出しと同時に測定するかテスト
+    """
+    measured = {'input_i': '-24.0', 'input_tp': '-3.0', 'input_lra': '5.0', 'input_thresh': '-34.0'}
+    cmd = CommandBuilder.build_loudness_normalization_cmd(
+        Path("input.mp4"), Path("out.mp4"), measured_params=measured, single_pass=True, measure_output=True
+    )[0]
+    assert "-af" not in cmd
+    graph = cmd[cmd.index("-filter_complex") + 1]
+    assert graph.startswith("[0:a:0]")
+    assert "asplit=2[aout][meter]" in graph
+    assert "[meter]ebur128=peak=true:framelog=quiet[mout]" in graph
+    # 書き出し先の後ろに測定分岐のnull出力が続く
+    assert cmd[cmd.index("out.mp4") + 1:] == ['-map', '[mout]', '-f', 'null', '-']
+    assert cmd[cmd.index("-map", cmd.index("0:v?")) + 1] == "[aout]"
+
+def test_plan_loudness_filter_linear_gain():
+    """
+    一定ゲインで目標に届きピーク・LRAも収まる場合はvolumeのみ、収まらなければloudnormになるかテスト
+    """
+    measured = {'input_i': '-24.0', 'input_tp': '-12.0', 'input_lra': '5.0', 'input_thresh': '-34.0'}
+    af, mode = CommandBuilder.plan_loudness_filter(measured, use_dynaudnorm=False)
+    assert mode == 'linear'
+    assert af == "volume=10.00dB"
+    # ゲイン後のトゥルーピークが上限(-1.5dB)を超える
+    af, mode = CommandBuilder.plan_loudness_filter(dict(measured, input_tp='-11.0'), use_dynaudnorm=False)
+    assert mode == 'loudnorm' and "loudnorm=I=-14" in af
+    # LRAが目標(7LU)を超える
+    _, mode = CommandBuilder.plan_loudness_filter(dict(measured, input_lra='9.0'), use_dynaudnorm=False)
+    assert mode == 'loudnorm'
+    # 素材モードは目標-18LUFS/LRA11
+    af, mode = CommandBuilder.plan_loudness_filter(dict(measured, input_lra='9.0'), material_mode=True)
+    assert mode == 'linear' and af == "volume=6.00dB"
+    # dynaudnormを使う場合・測定値がない場合は常にloudnorm
+    assert CommandBuilder.plan_loudness_filter(measured, use_dynaudnorm=True)[1] == 'loudnorm'
+    assert CommandBuilder.plan_loudness_filter(None, use_dynaudnorm=False)[1] == 'loudnorm'
+
+def test_build_normalized_concat_cmd(monkeypatch):
+    """
+    補正しながら結合：映像はconcat demuxerでコピー、音声はクリップごとに補正してconcatフィルタでつなぐかテスト
+    """
+    import os
+    import pytest
+    from core.media_analysis import MediaAnalysisResult
+    def mock_get_video_format_info(file_path):
+        return {'codec_name': 'h264', 'width': 1920, 'height': 1080, 'r_frame_rate': '30/1', 'pix_fmt': 'yuv420p'}
+    monkeypatch.setattr(CommandBuilder, 'get_video_format_info', mock_get_video_format_info)
+    measured = {'input_i': '-24.0', 'input_tp': '-12.0', 'input_lra': '5.0', 'input_thresh': '-34.0'}
+    analyses = {
+        "a.mp4": MediaAnalysisResult(has_audio=True, max_volume=-10.0, loudness=measured),
+        "b.mp4": MediaAnalysisResult(has_audio=False),
+        "c.mp4": MediaAnalysisResult(has_audio=True, max_volume=-10.0, loudness=dict(measured, input_lra='9.0')),
+    }
+    files = ["a.mp4", "b.mp4", "c.mp4"]
+    cmd, concat_list, format_list, modes = CommandBuilder.build_normalized_concat_cmd(
+        files, Path("out.mp4"), analyses, durations=[10.0, 5.0, 7.5], measure_output=True
+    )
+    os.remove(concat_list)
+    assert modes == ['linear', 'silence', 'loudnorm']
+    # 入力0はconcat demuxer（映像）、音声のあるクリップだけが入力として続く
+    assert cmd[2:8] == ["-f", "concat", "-safe", "0", "-i", concat_list]
+    assert [cmd[i + 1] for i, a in enumerate(cmd) if a == "-i"][1:] == ["a.mp4", "c.mp4"]
+    graph = cmd[cmd.index("-filter_complex") + 1]
+    assert graph.startswith("[1:a:0]volume=10.00dB,")
+    assert "anullsrc=r=48000:cl=stereo,atrim=end=5.000000[a1]" in graph
+    assert "[2:a:0]loudnorm=I=-14" in graph and "apad,atrim=end=7.500000[a2]" in graph
+    assert "[a0][a1][a2]concat=n=3:v=0:a=1" in graph
+    assert cmd[cmd.index("-c:v") + 1] == "copy"
+    assert cmd[cmd.index("out.mp4") + 1:] == ['-map', '[mout]', '-f', 'null', '-']
+    # 映像の再エンコードが必要な場合は使えない（エンコーダの確認・プリセット測定・リストファイルの作成をせずに判定する）
+    from core.encoder_registry import EncoderRegistry
+    from core.preset_tuner import PresetTuner
+    def unexpected(*args, **kwargs):
+        raise AssertionError("コピーできるかの判定だけで呼ばれてはいけない")
+    monkeypatch.setattr(EncoderRegistry, 'best_h264', unexpected)
+    monkeypatch.setattr(PresetTuner, 'preset_args', unexpected)
+    monkeypatch.setattr(CommandBuilder, '_write_concat_list', unexpected)
+    monkeypatch.setattr(CommandBuilder, 'get_video_format_info', lambda f: dict(mock_get_video_format_info(f), width=len(f)))
+    with pytest.raises(ValueError):
+        CommandBuilder.build_normalized_concat_cmd(["a.mp4", "bb.mp4"], Path("out.mp4"), analyses, durations=[1.0, 1.0])
+
+def test_build_loudness_normalization_cmd_audio_only():
+    """
+    音声のみのファイル：映像の抽出・マージなしの1コマンドで、元の形式・サンプルレートを保つかテスト
+    """
+    measured = {'input_i': '-24.0', 'input_tp': '-12.0', 'input_lra': '5.0', 'input_thresh': '-34.0'}
+    for single_pass in (False, True):
+        cmds = CommandBuilder.build_loudness_normalization_cmd(
+            Path("talk.wav"), Path("talk_norm.wav"), use_dynaudnorm=False, measured_params=measured,
+            single_pass=single_pass, audio_codec="pcm_s24le", sample_rate=44100
+        )
+        assert len(cmds) == 1
+        cmd = cmds[0]
+        assert "-c:v" not in cmd and "-vn" not in cmd
+        assert cmd[cmd.index("-map") + 1] == "0:a:0"
+        assert cmd[cmd.index("-c:a") + 1] == "pcm_s24le"
+        assert cmd[cmd.index("-ar") + 1] == "44100"
+        assert cmd[-1] == "talk_norm.wav"
+    cmd = CommandBuilder.build_loudness_normalization_cmd(
+        Path("talk.mp3"), Path("talk_norm.mp3"), measured_params=measured, measure_output=True, sample_rate=44100
+    )[0]
+    assert "aresample=44100,asplit=2[aout][meter]" in cmd[cmd.index("-filter_complex") + 1]
+    assert cmd[cmd.index("talk_norm.mp3") + 1:] == ['-map', '[mout]', '-f', 'null', '-']
+
+def test_audio_output_args():
+    """
+    出力拡張子ごとのコーデックと、サンプルレート系列の維持をテスト
+    """
+    assert CommandBuilder.audio_output_args(Path("a.wav"), "pcm_u8", 22050) == ['-c:a', 'pcm_s16le', '-ar', '22050']
+    assert CommandBuilder.audio_output_args(Path("a.flac"), "flac", 96000) == ['-c:a', 'flac', '-ar', '96000']
+    assert CommandBuilder.audio_output_args(Path("a.mp3"), "mp3", 88200)[-2:] == ['-ar', '44100']
+    assert CommandBuilder.audio_output_args(Path("a.m4a"), "aac", 96000) == [
+        '-c:a', 'aac', '-b:a', '192k', '-ar', '48000', '-movflags', '+faststart'
+    ]
+    assert CommandBuilder.audio_output_args(Path("a.aac"))[-2:] == ['-ar', '48000']
+
+def test_build_loudness_normalization_cmd_threads():
+    """
+    threadsを渡すと各コマンドにffmpegのスレッド数が入り、出力ファイルの位置は変わらないかテスト
+    """
+    measured = {'input_i': '-24.0', 'input_tp': '-12.0', 'input_lra': '5.0', 'input_thresh': '-34.0'}
+    cmds = CommandBuilder.build_loudness_normalization_cmd(
+        Path("input.mp4"), Path("output.mp4"), measured_params=measured, threads=2
+    )
+    try:
+        for cmd in cmds:
+            assert cmd[1:5] == ["-filter_threads", "2", "-filter_complex_threads", "2"]
+            assert cmd[cmd.index("-i") - 2:cmd.index("-i")] == ["-threads", "2"]
+        assert cmds[-1][-1] == "output.mp4"
+        assert cmds[0][-1].endswith("video.mp4")
+    finally:
+        import shutil
+        shutil.rmtree(Path(cmds[0][-1]).parent, ignore_errors=True)
@@ -0,0 +1,100 @@
+"""
+cpu_budget.py テスト
+"""
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from core.async_executor import AsyncExecutor
+from core.cpu_budget import CpuBudget, apply_threads, pinning_supported
+from core.executor import Executor
+
+def test_apply_threads_inputs_and_first_output():
+    cmd = ["ffmpeg", "-y", "-f", "concat", "-i", "list.txt", "-i", "b.mp4", "-c:v", "copy", "out.mp4", "-f", "null", "-"]
+    assert apply_threads(cmd, 2) == [
+        "ffmpeg", "-filter_threads", "2", "-filter_complex_threads", "2",
+        "-y", "-f", "concat", "-threads", "2", "-i", "list.txt", "-threads", "2", "-i", "b.mp4",
+        "-threads", "2", "-c:v", "copy", "out.mp4", "-f", "null", "-"
+    ]
+    # 未指定・ffmpeg以外・指定済みはそのまま
+    assert apply_threads(cmd, None) == cmd
+    assert apply_threads(["ffprobe", "-i", "a.mp4"], 2) == ["ffprobe", "-i", "a.mp4"]
+    assert apply_threads(["ffmpeg", "-threads", "1", "-i", "a", "b"], 2) == ["ffmpeg", "-threads", "1", "-i", "a", "b"]
+
+def test_allocate_pins_least_loaded():
+    budget = CpuBudget(cores=[0, 1, 2, 3], pin=True)
+    first = budget.allocate(3)
+    assert first.threads == 3 and first.cores == (0, 1, 2)
+    second = budget.allocate(1)
+    assert second.threads == 1 and second.cores == (3,)
+    first.release()
+    with budget.allocate(2) as cpu:
+        assert cpu.threads == 2 and cpu.cores == (0, 1)
+    assert budget.free == 3
+    assert budget.share(3) == 1 and budget.share(0) == 4
+    # 既定は固定しない（サイドバーの設定で切り替える）
+    budget = CpuBudget(cores=[0, 1])
+    assert budget.allocate(1).cores is None
+    budget.set_pin(True)
+    assert budget.allocate(1).cores == ((0,) if pinning_supported() else None)
+
+def test_allocate_waits_instead_of_oversubscribing():
+    # 8コアを実行中の2ジョブで等分する（空きが足りない要求は返却まで待ち、最低1スレッドには絞らない）
+    running = [2]
+    budget = CpuBudget(cores=range(8), demand=lambda: running[0])
+    first = budget.allocate()
+    second = budget.allocate()
+    assert (first.threads, second.threads, budget.free) == (4, 4, 0)
+    granted = []
+    waiter = threading.Thread(target=lambda: granted.append(budget.allocate()))
+    waiter.start()
+    waiter.join(0.2)
+    assert waiter.is_alive() and not granted
+    # 2つ目が終わって実行中が1ジョブになれば、3つ目は返却された分だけでなく空いた全コアを受け取る
+    first.release()
+    second.release()
+    running[0] = 1
+    waiter.join(5)
+    assert granted[0].threads == 8
+    granted[0].release()
+    assert budget.free == 8
+
+def test_default_budget_shares_between_running_jobs(monkeypatch):
+    from core.job_scheduler import ENCODE, JobScheduler
+    scheduler = JobScheduler(slots={ENCODE: 2})
+    monkeypatch.setattr(JobScheduler, "_default", scheduler)
+    monkeypatch.setattr(CpuBudget, "_default", None)
+    budget = CpuBudget.default()
+    assert budget.fair_share() == budget.total
+    release = threading.Event()
+    jobs = [scheduler.submit(f"job{i}", lambda ctx: release.wait(5), resources={ENCODE: 1}) for i in range(2)]
+    deadline = time.monotonic() + 5
+    while scheduler.running_count(ENCODE) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert budget.fair_share() == budget.share(2)
+    release.set()
+    for job in jobs:
+        job.wait()
+
+@pytest.mark.skipif(not hasattr(os, "sched_setaffinity"), reason="sched_setaffinityが必要")
+def test_run_command_affinity():
+    core = min(os.sched_getaffinity(0))
+    log = []
+    cmd = [sys.executable, "-c", "import os; print(sorted(os.sched_getaffinity(0)))"]
+    assert Executor.run_command(cmd, log.append, affinity=[core]) == 0
+    assert log == [str([core])]
+    # asyncio版も起動後に固定する（preexec_fnは使わない）
+    result = AsyncExecutor().run_sync(cmd, affinity=[core])
+    assert result.ok and result.log == [str([core])]
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpegが必要")
+def test_ffmpeg_accepts_thread_options():
+    cmd = ["ffmpeg", "-hide_banner", "-f", "lavfi", "-i", "sine=d=1", "-filter_complex", "[0:a]volume=0.5[a]",
+           "-map", "[a]", "-c:a", "aac", "-f", "null", "-"]
+    proc = subprocess.run(apply_threads(cmd, 1), capture_output=True, text=True)
+    assert proc.returncode == 0, proc.stderr
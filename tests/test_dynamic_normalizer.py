@@ -0,0 +1,71 @@
+"""
+dynamic_normalizer.py テスト（ストリーミング処理・ffmpeg dynaudnormとの比較）
+"""
+import shutil
+import subprocess
+
+import numpy as np
+import pytest
+
+from core.command_builder import CommandBuilder
+from core.dynamic_normalizer import DynamicNormalizer, normalize_file
+from core.ebur128 import R128Meter
+from core.media_analysis import MediaAnalysis
+
+FS = 48000
+DYNAUDNORM = "dynaudnorm=f=250:g=15:p=0.95:m=5:r=0.0:n=1"
+
+def _run(frames, block):
+    normalizer = DynamicNormalizer(FS, frames.shape[1])
+    out = [normalizer.process(frames[i:i + block]) for i in range(0, len(frames), block)]
+    out.append(normalizer.flush())
+    return np.concatenate(out)
+
+def _speech_like(seconds, seed=0):
+    rng = np.random.default_rng(seed)
+    envelope = np.repeat(rng.uniform(0.002, 0.05, seconds * 4), FS // 4)
+    return (rng.standard_normal(FS * seconds) * envelope).astype(np.float32)[:, None] * [1.0, 0.7]
+
+def _lufs(frames):
+    meter = R128Meter(FS, frames.shape[1])
+    meter.add_frames(frames)
+    return meter.result()["input_i"]
+
+def test_block_size_does_not_change_output():
+    frames = _speech_like(20)
+    a = _run(frames, 4800)
+    b = _run(frames, 77777)
+    assert len(a) == len(frames) == len(b)
+    assert np.abs(a - b).max() < 1e-6
+
+def test_quiet_passages_are_raised_within_max_gain():
+    frames = _speech_like(30)
+    out = _run(frames, FS)
+    assert _lufs(out) > _lufs(frames) + 3.0
+    assert np.abs(out).max() <= 1.0
+    assert (np.abs(out) <= np.abs(frames) * 5.0 + 1e-6).all()
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpegが必要")
+def test_matches_ffmpeg_dynaudnorm(tmp_path):
+    frames = _speech_like(60, seed=3).astype("<f4")
+    raw = tmp_path / "in.f32"
+    raw.write_bytes(frames.tobytes())
+    proc = subprocess.run(["ffmpeg", "-v", "error", "-f", "f32le", "-ar", str(FS), "-ac", "2", "-i", str(raw),
+                           "-af", DYNAUDNORM, "-f", "f32le", "-"], capture_output=True, check=True)
+    expected = np.frombuffer(proc.stdout, dtype="<f4").reshape(-1, 2)
+    out = _run(frames, FS // 2)
+    # 許容誤差（モジュールdocstring）: 統合ラウドネス±0.1LU
+    assert abs(_lufs(out) - _lufs(expected)) < 0.1
+    assert np.abs(out[:-FS * 3] - expected[:len(out) - FS * 3]).max() < 1e-3
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpegが必要")
+def test_normalize_file_writes_output(tmp_path):
+    src = tmp_path / "in.wav"
+    subprocess.run(["ffmpeg", "-v", "error", "-y", "-f", "lavfi", "-i",
+                    "anoisesrc=c=pink:a=0.05:d=8:r=48000", str(src)], check=True)
+    out = tmp_path / "out.m4a"
+    af = CommandBuilder.build_loudness_filter(None, use_dynaudnorm=False)
+    ret, log = normalize_file(src, out, af, measure_output=True)
+    assert ret == 0
+    assert out.exists()
+    assert MediaAnalysis.parse_ebur128_summary(log) is not None
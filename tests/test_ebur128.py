@@ -0,0 +1,195 @@
+"""
+ebur128.py テスト（合成信号・ffmpeg ebur128との比較）
+"""
+import math
+import re
+import shutil
+import subprocess
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+import core.ebur128 as ebur128
+
+from core.ebur128 import (BlockIIR, LoudnessStats, R128Meter, TruePeakMeter, chunk_ranges, k_weighting_coefficients,
+                          estimate_file, measure_file, measure_file_chunked)
+
+FS = 48000
+
+def _sine(amplitude_db, seconds, freq=1000.0, fs=FS, channels=2):
+    t = np.arange(int(fs * seconds)) / fs
+    s = 10 ** (amplitude_db / 20) * np.sin(2 * np.pi * freq * t)
+    return np.stack([s] * channels, axis=1)
+
+def _measure(frames, fs=FS, chunk=12345):
+    meter = R128Meter(fs, frames.shape[1])
+    for i in range(0, len(frames), chunk):
+        meter.add_frames(frames[i:i + chunk])
+    return meter.result()
+
+def _direct_biquad(b, a, x):
+    y = np.zeros_like(x)
+    for n in range(len(x)):
+        acc = b[0] * x[n]
+        for k in range(1, 3):
+            if n - k >= 0:
+                acc += b[k] * x[n - k] - a[k] * y[n - k]
+        y[n] = acc
+    return y
+
+def test_block_iir_matches_direct_form():
+    x = np.random.default_rng(0).standard_normal((3000, 2))
+    for b, a in k_weighting_coefficients(FS):
+        expected = _direct_biquad(b, a, x)
+        f = BlockIIR(b, a, 2)
+        # 半端な長さで分割しても状態が正しく引き継がれること
+        out = np.concatenate([f.process(x[:1000]), f.process(x[1000:1001]), f.process(x[1001:])])
+        assert np.abs(out - expected).max() < 1e-9
+
+def test_sine_integrated_loudness():
+    # EBU Tech 3341: 1kHz ステレオ正弦波 -23dBFS / -33dBFS → -23 / -33 LUFS
+    for level in (-23.0, -33.0):
+        result = _measure(_sine(level, 20))
+        assert abs(result["input_i"] - level) < 0.1
+        assert abs(result["input_thresh"] - (level - 10)) < 0.1
+        assert abs(result["input_tp"] - level) < 0.1
+
+def test_loudness_range():
+    # EBU Tech 3342 ケース1: -20dBFS 20秒 → -30dBFS 20秒 で LRA=10±1
+    frames = np.concatenate([_sine(-20, 20), _sine(-30, 20)])
+    result = _measure(frames)
+    assert abs(result["input_lra"] - 10.0) < 1.0
+
+def test_true_peak_between_samples():
+    # fs/4の正弦波を45度ずらすとサンプルピークは真のピークより約3dB低い
+    n = np.arange(FS)
+    x = 0.5 * np.sin(2 * np.pi * n / 4 + np.pi / 4)
+    meter = TruePeakMeter(FS, 1)
+    meter.add(x[:, None])
+    assert abs(meter.true_peak_db() - 20 * math.log10(0.5)) < 0.2
+
+def test_silence():
+    result = _measure(np.zeros((FS * 2, 2)))
+    assert result["input_i"] == float("-inf")
+    assert result["input_lra"] == 0.0
+
+def _chunked_stats(frames, chunks, fs=FS):
+    # measure_chunkと同じ範囲を切り出して、オフセット付きメーターで測る
+    stats = LoudnessStats()
+    sub = fs // 10
+    for lo, hi in chunk_ranges(len(frames) / fs, chunks):
+        first = max(lo - 5, 0)
+        end = None if hi is None else (hi + 30) * sub
+        meter = R128Meter(fs, frames.shape[1], block_offset=first, count_range=(lo, hi))
+        meter.add_frames(frames[first * sub:end])
+        stats.merge(meter.stats())
+    return stats
+
+def test_chunked_histograms_match_single_pass():
+    rng = np.random.default_rng(1)
+    frames = rng.standard_normal((FS * 40, 2)) * np.repeat(rng.uniform(0.01, 0.5, 40), FS)[:, None]
+    single = R128Meter(FS, 2)
+    single.add_frames(frames)
+    merged = _chunked_stats(frames, 4)
+    # ブロック数は完全一致し、値もフィルタのプリロール誤差の範囲で一致する
+    assert merged.momentary.counts.sum() == single.momentary.counts.sum()
+    assert merged.short_term.counts.sum() == single.short_term.counts.sum()
+    expected = single.result()
+    result = merged.result()
+    assert abs(result["input_i"] - expected["input_i"]) < 0.01
+    assert abs(result["input_lra"] - expected["input_lra"]) < 0.05
+    assert result["input_tp"] == expected["input_tp"]
+
+def test_stats_roundtrip_and_concatenation():
+    a, b = _sine(-20, 10), _sine(-30, 10)
+    stats = []
+    for frames in (a, b):
+        meter = R128Meter(FS, 2)
+        meter.add_frames(frames)
+        stats.append(LoudnessStats.from_dict(meter.stats().to_dict()))
+    merged = stats[0].merge(stats[1])
+    joined = _measure(np.concatenate([a, b]))
+    # 継ぎ目をまたぐブロックを除いた分だけの差に収まる
+    assert abs(merged.result()["input_i"] - joined["input_i"]) < 0.1
+    assert merged.result()["input_tp"] == joined["input_tp"]
+
+def _fake_measure_chunk(frames, fs):
+    # ffmpegの代わりに合成信号からmeasure_chunkと同じ範囲を測る
+    sub = fs // 10
+    def measure_chunk(input_path, count_range, block_seconds=0.5):
+        lo, hi = count_range
+        first = max(lo - 5, 0)
+        end = None if hi is None else (hi + 30) * sub
+        meter = R128Meter(fs, frames.shape[1], block_offset=first, count_range=count_range)
+        meter.add_frames(frames[first * sub:end])
+        return meter.stats()
+    return measure_chunk
+
+def test_estimate_stops_early_with_interval(monkeypatch):
+    fs = 4800
+    rng = np.random.default_rng(2)
+    frames = rng.standard_normal((fs * 600, 1)) * np.repeat(rng.uniform(0.05, 0.1, 600), fs)[:, None]
+    monkeypatch.setattr(ebur128, "measure_chunk", _fake_measure_chunk(frames, fs))
+    full = _measure(frames, fs=fs, chunk=fs * 60)
+    result = estimate_file("dummy", 600.0, tolerance_lu=0.3, seed=0)
+    assert result["ci_high"] - result["input_i"] <= 0.3
+    assert result["decoded_fraction"] < 0.5
+    assert result["ci_low"] - 0.1 <= full["input_i"] <= result["ci_high"] + 0.1
+
+def test_estimate_zero_tolerance_measures_everything(monkeypatch):
+    fs = 4800
+    frames = np.concatenate([_sine(-20, 35, fs=fs), _sine(-35, 47, fs=fs)])
+    monkeypatch.setattr(ebur128, "measure_chunk", _fake_measure_chunk(frames, fs))
+    full = _measure(frames, fs=fs)
+    result = estimate_file("dummy", 82.0, tolerance_lu=0.0, seed=0)
+    assert result["windows"] == 8
+    assert result["ci_low"] == result["ci_high"]
+    assert abs(result["input_i"] - full["input_i"]) < 0.01
+
+def _ffmpeg_ebur128(path):
+    proc = subprocess.run(
+        ["ffmpeg", "-hide_banner", "-nostats", "-i", str(path), "-af", "ebur128=peak=true:framelog=quiet", "-f", "null", "-"],
+        capture_output=True, text=True
+    )
+    summary = proc.stderr.split("Summary:")[-1]
+    return {
+        "input_i": float(re.search(r"I:\s+([\-\d\.]+) LUFS", summary).group(1)),
+        "input_lra": float(re.search(r"LRA:\s+([\-\d\.]+) LU", summary).group(1)),
+        "input_tp": float(re.search(r"Peak:\s+([\-\d\.]+) dBFS", summary).group(1)),
+    }
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpegが必要")
+@pytest.mark.parametrize("source", [
+    "anoisesrc=c=pink:a=0.2:d=20:r=48000,pan=stereo|c0=c0|c1=c0",
+    "sine=f=997:r=44100:d=15,volume=-6dB",
+    "anoisesrc=c=pink:a=0.3:d=24:r=48000,volume='if(lt(t,12),1,0.1)':eval=frame,pan=stereo|c0=c0|c1=0.5*c0",
+])
+def test_matches_ffmpeg_ebur128(source):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir) / "synthetic.wav"
+        subprocess.run(["ffmpeg", "-hide_banner", "-loglevel", "error", "-y", "-f", "lavfi", "-i", source,
+                        "-c:a", "pcm_s16le", str(path)], check=True)
+        expected = _ffmpeg_ebur128(path)
+        result = measure_file(path)
+        assert abs(result["input_i"] - expected["input_i"]) < 0.2
+        assert abs(result["input_lra"] - expected["input_lra"]) < 0.5
+        assert abs(result["input_tp"] - expected["input_tp"]) < 0.3
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpegが必要")
+def test_chunked_file_matches_single_pass():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir) / "synthetic.wav"
+        source = "anoisesrc=c=pink:a=0.3:d=30:r=48000,volume='if(lt(t,15),1,0.2)':eval=frame"
+        subprocess.run(["ffmpeg", "-hide_banner", "-loglevel", "error", "-y", "-f", "lavfi", "-i", source,
+                        "-c:a", "pcm_s16le", str(path)], check=True)
+        expected = measure_file(path)
+        fractions = []
+        result = measure_file_chunked(path, 30.0, 3, progress_callback=fractions.append).result()
+        assert abs(result["input_i"] - expected["input_i"]) < 0.01
+        assert abs(result["input_lra"] - expected["input_lra"]) < 0.05
+        assert abs(result["input_tp"] - expected["input_tp"]) < 0.01
+        # 進捗は1%刻みで単調に増え、最後は全体に達する
+        assert fractions == sorted(fractions) and len(set(int(f * 100) for f in fractions)) == len(fractions)
+        assert fractions[-1] == pytest.approx(1.0, abs=0.01)
@@ -0,0 +1,42 @@
+"""
+encoder_registry.py テスト
+"""
+import json
+import shutil
+
+import pytest
+
+from core.encoder_registry import EncoderRegistry, parse_encoders
+
+ENCODERS_OUTPUT = """Encoders:
+ V..... = Video
+ A..... = Audio
+ ------
+ V....D libx264              libx264 H.264 / AVC / MPEG-4 AVC / MPEG-4 part 10 (codec h264)
+ V..... h264_nvenc           NVIDIA NVENC H.264 encoder (codec h264)
+ A....D aac                  AAC (Advanced Audio Coding)
+"""
+
+def test_parse_encoders():
+    assert parse_encoders(ENCODERS_OUTPUT) == {"libx264", "h264_nvenc", "aac"}
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpegが必要")
+def test_registry_tests_once_and_caches_on_disk(tmp_path, monkeypatch):
+    cache_path = tmp_path / "encoders.json"
+    registry = EncoderRegistry(cache_path=cache_path)
+    # 組み込まれていないエンコーダは試さずに除外、aacは映像を書き出せないため不可
+    assert registry.best(("no_such_encoder", "aac", "mpeg4")) == "mpeg4"
+    assert registry.best(("no_such_encoder",), fallback="libx264") == "libx264"
+    entry = json.loads(cache_path.read_text(encoding="utf-8"))[registry.binary_key()]
+    assert entry["tested"] == {"aac": False, "mpeg4": True}
+
+    # 別インスタンスでもディスクのキャッシュを使い、試し書き出しをしない
+    monkeypatch.setattr(EncoderRegistry, "_test_encode", lambda self, name: pytest.fail(name))
+    cached = EncoderRegistry(cache_path=cache_path)
+    assert cached.works("mpeg4") and not cached.works("aac")
+
+def test_registry_without_ffmpeg(tmp_path):
+    registry = EncoderRegistry(ffmpeg="ffmpeg-not-installed", cache_path=tmp_path / "encoders.json")
+    assert registry.encoders() == set()
+    assert registry.best_h264() == "libx264"
+    assert registry.best_hevc() is None
@@ -0,0 +1,56 @@
+"""
+executor.py テスト
+"""
+import shutil
+
+import pytest
+
+from core.executor import Executor, ProgressParser
+
+PROGRESS_BLOCK = """frame=120
+fps=59.94
+stream_0_0_q=-0.0
+bitrate=N/A
+total_size=1048576
+out_time_us=4000000
+out_time_ms=4000000
+out_time=00:00:04.000000
+dup_frames=0
+drop_frames=0
+speed=   2x
+progress=continue
+"""
+
+def test_progress_parser_block():
+    parser = ProgressParser(duration=10.0)
+    events = [parser.feed(line) for line in PROGRESS_BLOCK.splitlines()]
+    assert events[:-1] == [None] * (len(events) - 1)
+    event = events[-1]
+    assert event.out_time == 4.0
+    assert event.speed == 2.0 and event.fps == 59.94
+    assert event.total_size == 1048576 and event.frame == 120
+    assert event.percent == 40.0
+    assert event.eta == 3.0  # 残り6秒を2倍速
+    assert event.format() == "40% 2.0x 残り0:03"
+    end = [parser.feed(line) for line in "out_time_us=N/A\nspeed=N/A\nprogress=end\n".splitlines()][-1]
+    assert end.done and end.percent == 100.0 and end.speed is None
+    # 長さ不明なら経過時間のみ
+    parser = ProgressParser()
+    unknown = [parser.feed(line) for line in PROGRESS_BLOCK.splitlines()][-1]
+    assert unknown.percent is None and unknown.eta is None
+    assert unknown.format() == "0:04 2.0x"
+
+def test_with_progress_only_for_ffmpeg():
+    assert Executor.with_progress(["ffmpeg", "-i", "a.mp4"], 5) == ["ffmpeg", "-progress", "pipe:5", "-nostats", "-i", "a.mp4"]
+    assert Executor.with_progress(["ffprobe", "a.mp4"], 5) == ["ffprobe", "a.mp4"]
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpegが必要")
+def test_run_command_progress_events():
+    events, log = [], []
+    cmd = ["ffmpeg", "-hide_banner", "-f", "lavfi", "-i", "sine=d=20:r=8000", "-f", "null", "-"]
+    ret = Executor.run_command(cmd, log.append, progress_callback=events.append, duration=20.0, progress_interval=0.0)
+    assert ret == 0
+    assert events and events[-1].done and events[-1].percent == 100.0
+    assert all(0.0 <= e.percent <= 100.0 for e in events)
+    # -nostatsで途中の統計行はログに出ない（終了時の1行のみ）
+    assert sum(line.startswith("size=") for line in log) <= 1
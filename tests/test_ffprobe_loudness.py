@@ -0,0 +1,28 @@
+"""
+ffprobe_loudness.py テスト（全区間測定の共有）
+"""
+import shutil
+import subprocess
+
+import pytest
+
+from core.ffprobe_loudness import FFprobeLoudness
+from core.loudness_cache import LoudnessCache
+from core.media_probe import MediaProbe
+
+pytestmark = pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpegが必要")
+
+def _make(path, *args):
+    subprocess.run(["ffmpeg", "-hide_banner", "-loglevel", "error", "-y", *args, str(path)], check=True)
+    return path
+
+def test_r128_silence_is_not_shared_as_full(tmp_path, monkeypatch):
+    # 無音の-infはloudnormのmeasured_*に渡せないため、全区間の測定値として保存しない
+    cache = LoudnessCache(tmp_path / "loudness.sqlite3")
+    monkeypatch.setattr(LoudnessCache, "_default", cache)
+    monkeypatch.setattr(MediaProbe, "_default", MediaProbe(tmp_path / "probe.sqlite3"))
+    path = _make(tmp_path / "silent.m4a", "-f", "lavfi", "-i", "anullsrc=r=48000:cl=stereo", "-t", "2", "-c:a", "aac")
+    result, _ = FFprobeLoudness.measure_loudness_r128(path)
+    assert result["input_i"] == float("-inf")
+    assert cache.get(path, "r128-stats") is not None
+    assert cache.get(path, "full") is None
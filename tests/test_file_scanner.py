@@ -1,7 +1,7 @@
 """
 file_scanner.py テスト
 """
-from core.file_scanner import scan_video_files
+from core.file_scanner import is_audio_file, scan_media_files, scan_video_files
 from pathlib import Path
 import tempfile
 import shutil
@@ -17,3 +17,15 @@ def test_scan_video_files():
         assert any(f.name == "a.mp4" for f in files)
         assert any(f.name == "c.mkv" for f in files)
         assert not any(f.name == "b.txt" for f in files)
+
+def test_scan_media_files():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        d = Path(tmpdir)
+        (d/"a.mp4").write_text("")
+        (d/"b.txt").write_text("")
+        (d/"sub").mkdir()
+        (d/"sub"/"c.WAV").write_text("")
+        (d/"sub"/"d.mp3").write_text("")
+        files = scan_media_files(d)
+        assert [f.name for f in files] == ["a.mp4", "c.WAV", "d.mp3"]
+        assert is_audio_file(files[1]) and not is_audio_file(files[0])
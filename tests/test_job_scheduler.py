@@ -0,0 +1,93 @@
+"""
+job_scheduler.py テスト
+"""
+import threading
+
+from core.job_scheduler import ENCODE, JobScheduler, Priority
+
+def _blocker():
+    # releaseされるまで終わらないジョブ関数と、開始通知・解放用のEvent
+    started, release = threading.Event(), threading.Event()
+    def func(ctx):
+        started.set()
+        release.wait(5)
+    return func, started, release
+
+def test_priority_order_with_one_slot():
+    scheduler = JobScheduler(slots={ENCODE: 1}, ram_mb=1000)
+    order = []
+    func, started, release = _blocker()
+    first = scheduler.submit("first", func, resources={ENCODE: 1})
+    assert started.wait(5)
+    jobs = [
+        scheduler.submit("batch", lambda ctx: order.append("batch"), resources={ENCODE: 1}, priority=Priority.BATCH),
+        scheduler.submit("normal", lambda ctx: order.append("normal"), resources={ENCODE: 1}),
+        scheduler.submit("interactive", lambda ctx: order.append("interactive"), resources={ENCODE: 1},
+                         priority=Priority.INTERACTIVE),
+    ]
+    assert all(job.state == "queued" for job in jobs)
+    release.set()
+    for job in [first] + jobs:
+        assert job.wait(5)
+    assert order == ["interactive", "normal", "batch"]
+
+def test_group_dedupe_and_resource_clamp():
+    scheduler = JobScheduler(slots={ENCODE: 2}, ram_mb=1000)
+    func, started, release = _blocker()
+    # 枠数を超える要求は枠数に丸めて起動する
+    job = scheduler.submit("big", func, resources={ENCODE: 8}, group="concat")
+    assert job.resources == {ENCODE: 2}
+    assert started.wait(5)
+    assert scheduler.submit("again", lambda ctx: None, group="concat") is None
+    assert scheduler.busy("concat")
+    release.set()
+    assert job.wait(5)
+    assert scheduler.submit("again", lambda ctx: None, group="concat").wait(5)
+
+def test_ram_budget_waits_for_running_jobs():
+    scheduler = JobScheduler(slots={}, ram_mb=1000)
+    func, started, release = _blocker()
+    first = scheduler.submit("first", func, ram_mb=800)
+    assert started.wait(5)
+    second = scheduler.submit("second", lambda ctx: None, ram_mb=800)
+    small = scheduler.submit("small", lambda ctx: None, ram_mb=100)
+    assert small.wait(5)
+    assert second.state == "queued"
+    release.set()
+    assert second.wait(5) and second.state == "finished"
+    # 予算を超えるジョブも単独なら起動する
+    assert scheduler.submit("huge", lambda ctx: None, ram_mb=5000).wait(5)
+
+def test_cancel_queued_and_running():
+    scheduler = JobScheduler(slots={ENCODE: 1}, ram_mb=1000)
+    stopped = threading.Event()
+    started = threading.Event()
+    def func(ctx):
+        ctx.on_cancel(stopped.set)
+        started.set()
+        stopped.wait(5)
+        ctx.check_cancelled()
+    running = scheduler.submit("running", func, resources={ENCODE: 1}, group="g")
+    assert started.wait(5)
+    queued = scheduler.submit("queued", lambda ctx: None, resources={ENCODE: 1}, group="g/child")
+    scheduler.cancel(queued)
+    assert queued.done and queued.state == "cancelled"
+    scheduler.cancel_group("g")
+    assert running.wait(5) and running.state == "cancelled"
+
+def test_event_sequence():
+    scheduler = JobScheduler(slots={ENCODE: 1}, ram_mb=1000)
+    events = []
+    unsubscribe = scheduler.subscribe(lambda e: events.append((e.name, e.kind, e.data)))
+    def ok(ctx):
+        ctx.log("hello")
+        return 42
+    def ng(ctx):
+        raise ValueError("boom")
+    assert scheduler.submit("ok", ok, resources={ENCODE: 1}).wait(5)
+    failed = scheduler.submit("ng", ng, resources={ENCODE: 1})
+    assert failed.wait(5)
+    unsubscribe()
+    assert events[:4] == [("ok", "queued", None), ("ok", "started", None), ("ok", "log", "hello"), ("ok", "finished", 42)]
+    assert [(name, kind) for name, kind, _ in events[4:]] == [("ng", "queued"), ("ng", "started"), ("ng", "failed")]
+    assert isinstance(events[-1][2], ValueError) and failed.state == "failed"
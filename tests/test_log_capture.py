@@ -0,0 +1,69 @@
+"""
+log_capture.py テスト
+"""
+import gzip
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from core.log_capture import LogCapture, prune_spill_dir, spill_path
+
+def test_tail_is_bounded_and_keeps_errors():
+    capture = LogCapture(tail_bytes=1000)
+    capture.append("Input #0, wav")
+    capture.append("[aac @ 0x1] Error while decoding stream")
+    for i in range(100000):
+        capture.append(f"frame={i} fps=30 q=28.0 size=1024kB")
+    capture.append("[Parsed_ebur128_0 @ 0x2] Summary:")
+    lines = capture.lines()
+    assert capture.total_lines == 100003
+    # 末尾1000バイト分と、それ以前のエラー行だけが残る
+    assert sum(len(line) + 1 for line in lines if line.startswith("frame=")) <= 1000
+    assert lines[0] == "...（1行省略）..."
+    assert lines[1] == "[aac @ 0x1] Error while decoding stream"
+    assert lines[2].endswith("行省略）...")
+    assert lines[-1] == "[Parsed_ebur128_0 @ 0x2] Summary:"
+    assert len(lines) < 40
+
+def test_tail_lines_and_no_omission():
+    capture = LogCapture(tail_lines=3)
+    capture.extend(["a", "b"])
+    assert capture.lines() == ["a", "b"]
+    capture.extend(["c", "d", "e"])
+    assert capture.lines() == ["...（2行省略）...", "c", "d", "e"]
+
+def test_spill_writes_full_log():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir) / "job.log.gz"
+        with LogCapture(tail_lines=2, spill_path=path) as capture:
+            capture.extend(f"line {i}" for i in range(1000))
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            assert f.read().splitlines() == [f"line {i}" for i in range(1000)]
+        assert capture.lines()[-2:] == ["line 998", "line 999"]
+
+def test_spill_path_is_unique(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        monkeypatch.setenv("XDG_CACHE_HOME", tmpdir)
+        monkeypatch.setenv("LOCALAPPDATA", tmpdir)
+        monkeypatch.setenv("HOME", tmpdir)
+        first, second = spill_path("out.mp4"), spill_path("out.mp4")
+        assert first != second
+        assert first.parent == second.parent
+        assert first.name.startswith("out.mp4.") and first.name.endswith(".log.gz")
+
+def test_prune_spill_dir_removes_old_and_excess_logs():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir)
+        now = time.time()
+        for i in range(5):
+            log = path / f"job{i}.log.gz"
+            log.write_bytes(b"")
+            os.utime(log, (now - i * 60, now - i * 60))
+        old = path / "old.log.gz"
+        old.write_bytes(b"")
+        os.utime(old, (now - 3600, now - 3600))
+        other = path / "keep.txt"
+        other.write_bytes(b"")
+        prune_spill_dir(path, max_age_sec=1800, max_files=3)
+        assert sorted(p.name for p in path.iterdir()) == ["job0.log.gz", "job1.log.gz", "job2.log.gz", "keep.txt"]
@@ -0,0 +1,60 @@
+"""
+loudness_cache.py テスト
+"""
+from core.loudness_cache import LoudnessCache, file_fingerprint
+import os
+import tempfile
+from pathlib import Path
+
+def test_put_get_roundtrip():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        d = Path(tmpdir)
+        media = d / "a.mp4"
+        media.write_bytes(b"\x00" * 200000)
+        cache = LoudnessCache(d / "cache.sqlite3")
+        assert cache.get(media, "full") is None
+        result = {"input_i": "-20.5", "input_tp": "-3.1", "input_lra": "4.0", "input_thresh": "-30.6"}
+        cache.put(media, "full", "loudnorm=I=-18:TP=-1.5:LRA=11", result)
+        assert cache.get(media, "full") == result
+        assert cache.get(media, "full", "loudnorm=I=-18:TP=-1.5:LRA=11") == result
+        # パラメータ不一致・scope違いはヒットしない
+        assert cache.get(media, "full", "loudnorm=I=-23:TP=-1.5:LRA=7") is None
+        assert cache.get(media, "sampled") is None
+
+def test_invalidated_when_file_changes():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        d = Path(tmpdir)
+        media = d / "a.mp4"
+        media.write_bytes(b"\x00" * 200000)
+        cache = LoudnessCache(d / "cache.sqlite3")
+        cache.put(media, "full", "p", {"input_i": "-20.0"})
+        before = file_fingerprint(media)
+        # サイズ・mtimeを維持したまま中身だけ変えてもサンプリングハッシュで検知する
+        st = media.stat()
+        with open(media, "r+b") as f:
+            f.write(b"\x01" * 16)
+        os.utime(media, ns=(st.st_atime_ns, st.st_mtime_ns))
+        assert file_fingerprint(media) != before
+        assert cache.get(media, "full") is None
+
+def test_get_full_normalises_and_filters_by_params():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        d = Path(tmpdir)
+        media = d / "a.mp4"
+        media.write_bytes(b"\x00" * 200000)
+        cache = LoudnessCache(d / "cache.sqlite3")
+        cache.put(media, "full", "loudnorm=I=-18:TP=-1.5:LRA=11",
+                  {"input_i": "-20.5", "input_tp": "-3.1", "input_lra": "4.0", "input_thresh": "-30.6",
+                   "target_offset": "0.1"})
+        full = cache.get_full(media, "loudnorm=I=-18:TP=-1.5:LRA=11")
+        assert full == {"input_i": -20.5, "input_tp": -3.1, "input_lra": 4.0, "input_thresh": -30.6,
+                        "target_offset": "0.1"}
+        # 書き出し時のebur128の値はloudnormの測定値として使わない
+        cache.put(media, "full", "ebur128;render-tap", {"input_i": -18.0, "input_tp": -1.2, "input_lra": 3.0})
+        assert cache.get_full(media, "loudnorm=I=-18:TP=-1.5:LRA=11") is None
+        assert cache.get_full(media)["input_i"] == -18.0
+        # 無音（-inf）・数値でない値は測定値として返さない
+        cache.put(media, "full", "p", {"input_i": "-inf", "input_tp": "-inf"})
+        assert cache.get_full(media) is None
+        cache.put(media, "full", "p", {"input_i": "n/a", "input_tp": "-1.0"})
+        assert cache.get_full(media) is None
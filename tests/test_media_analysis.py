@@ -0,0 +1,148 @@
+"""
+media_analysis.py テスト
+"""
+import subprocess
+
+from core.media_analysis import MediaAnalysis, MediaAnalysisResult
+
+SAMPLE_LOG = """Input #0, mov,mp4,m4a,3gp,3g2,mj2, from 'in.mp4':
+  Duration: 00:01:02.50, start: 0.000000, bitrate: 461 kb/s
+  Stream #0:0[0x1](und): Video: h264 (High) (avc1 / 0x31637661), yuv420p, 320x240, 30 fps
+  Stream #0:1[0x2](und): Audio: aac (LC) (mp4a / 0x6134706D), 48000 Hz, stereo, fltp, 69 kb/s (default)
+[Parsed_volumedetect_0 @ 0x1] n_samples: 0
+Stream mapping:
+  Stream #0:1 -> #0:0 (aac (native) -> pcm_s16le (native))
+Output #0, null, to 'pipe:':
+  Stream #0:0(und): Audio: pcm_s16le, 192000 Hz, stereo, s16, 3072 kb/s (default)
+[Parsed_volumedetect_0 @ 0x2] mean_volume: -41.1 dB
+[Parsed_volumedetect_0 @ 0x2] max_volume: -37.6 dB
+[Parsed_loudnorm_2 @ 0x3] 
+{
+	"input_i" : "-41.81",
+	"input_tp" : "-37.62",
+	"input_lra" : "0.10",
+	"input_thresh" : "-51.81",
+	"target_offset" : "-0.01"
+}
+[Parsed_astats_1 @ 0x4] Overall
+[Parsed_astats_1 @ 0x4] Peak level dB: -37.619188
+[Parsed_astats_1 @ 0x4] RMS level dB: -41.093585
+[Parsed_astats_1 @ 0x4] Noise floor dB: -inf
+"""
+
+def test_parse_log():
+    result = MediaAnalysis.parse_log(SAMPLE_LOG)
+    assert result.has_audio is True
+    assert abs(result.duration - 62.5) < 1e-6
+    assert result.audio_codec == "aac"
+    assert result.sample_rate == 48000
+    assert result.channels == "stereo"
+    assert result.max_volume == -37.6
+    assert result.mean_volume == -41.1
+    assert result.peak_level == -37.619188
+    assert result.noise_floor == float("-inf")
+    assert result.loudness["input_i"] == "-41.81"
+    assert result.is_silent() is False
+
+def test_parse_log_without_audio():
+    log = SAMPLE_LOG.split("  Stream #0:1")[0] + "\nStream mapping:\n"
+    result = MediaAnalysis.parse_log(log)
+    assert result.has_audio is False
+    assert result.loudness is None
+    assert result.is_silent() is False
+
+BATCH_LOG = """[volumedetect@i0 @ 0x1] n_samples: 0
+[volumedetect@i1 @ 0x2] n_samples: 0
+Input #0, mov,mp4,m4a,3gp,3g2,mj2, from 'a.m4a':
+  Duration: 00:00:06.00, start: 0.000000, bitrate: 72 kb/s
+  Stream #0:0[0x1](und): Audio: aac (LC) (mp4a / 0x6134706D), 44100 Hz, mono, fltp, 69 kb/s (default)
+[aist#1:0/pcm_s16le @ 0x3] Guessed Channel Layout: mono
+Input #1, wav, from 'b.wav':
+  Duration: 00:00:05.00, bitrate: 768 kb/s
+  Stream #1:0: Audio: pcm_s16le ([1][0][0][0] / 0x0001), 48000 Hz, stereo, s16, 768 kb/s
+Stream mapping:
+  Stream #0:0 (aac) -> volumedetect:default
+  Stream #1:0 (pcm_s16le) -> volumedetect:default
+[loudnorm@i1 @ 0x4] 
+{
+	"input_i" : "-21.83",
+	"input_tp" : "-14.87",
+	"input_lra" : "0.00",
+	"input_thresh" : "-31.83"
+}
+[astats@i1 @ 0x5] Overall
+[astats@i1 @ 0x5] Peak level dB: -19.999205
+[volumedetect@i1 @ 0x6] mean_volume: -24.8 dB
+[volumedetect@i1 @ 0x6] max_volume: -20.0 dB
+[volumedetect@i0 @ 0x7] mean_volume: -21.1 dB
+[volumedetect@i0 @ 0x7] max_volume: -17.7 dB
+[loudnorm@i0 @ 0x8] 
+{
+	"input_i" : "-21.82",
+	"input_tp" : "-17.70",
+	"input_lra" : "0.10",
+	"input_thresh" : "-31.82"
+}
+[astats@i0 @ 0x9] Overall
+[astats@i0 @ 0x9] Peak level dB: -17.702211
+[out#0/null @ 0xa] video:0KiB audio:4130KiB subtitle:0KiB
+"""
+
+def test_build_batch_cmd_labels_each_input():
+    cmd = MediaAnalysis.build_batch_cmd(["a.m4a", "b.wav"])
+    graph = cmd[cmd.index("-filter_complex") + 1]
+    assert graph.startswith("[0:a:0]volumedetect@i0,astats@i0=")
+    assert "[1:a:0]volumedetect@i1" in graph and "loudnorm@i1=I=-18" in graph
+    assert cmd.count("-map") == 2
+
+def test_split_batch_log():
+    first, second = [MediaAnalysis.parse_log(log) for log in MediaAnalysis.split_batch_log(BATCH_LOG, 2)]
+    assert first.duration == 6.0 and first.audio_codec == "aac" and first.channels == "mono"
+    assert first.max_volume == -17.7
+    assert first.peak_level == -17.702211
+    assert first.loudness["input_i"] == "-21.82"
+    assert second.duration == 5.0 and second.sample_rate == 48000 and second.channels == "stereo"
+    assert second.max_volume == -20.0
+    assert second.loudness["input_i"] == "-21.83"
+
+def test_analyze_many_falls_back_to_single_runs(monkeypatch, tmp_path):
+    paths = []
+    for name in ("a.mp4", "b.mp4"):
+        path = tmp_path / name
+        path.write_bytes(b"0")
+        paths.append(path)
+
+    class Failed:
+        returncode = 1
+        stderr = ""
+    monkeypatch.setattr(subprocess, "run", lambda *a, **k: Failed())
+    analyzed = []
+    def fake_analyze(path, use_cache=True, timeout=None):
+        analyzed.append(path)
+        return MediaAnalysisResult(has_audio=False)
+    monkeypatch.setattr(MediaAnalysis, "analyze", staticmethod(fake_analyze))
+    results = MediaAnalysis.analyze_many(paths, use_cache=False)
+    assert analyzed == paths
+    assert set(results) == {str(p) for p in paths}
+
+EBUR128_LOG = """[Parsed_ebur128_3 @ 0x1] Summary:
+
+  Integrated loudness:
+    I:         -14.0 LUFS
+    Threshold: -24.0 LUFS
+
+  Loudness range:
+    LRA:         3.2 LU
+    Threshold: -34.0 LUFS
+    LRA low:   -15.0 LUFS
+    LRA high:  -11.8 LUFS
+
+  True peak:
+    Peak:       -1.6 dBFS
+[out#0/mp4 @ 0x2] video:285KiB audio:152KiB
+"""
+
+def test_parse_ebur128_summary():
+    result = MediaAnalysis.parse_ebur128_summary(EBUR128_LOG)
+    assert result == {"input_i": -14.0, "input_thresh": -24.0, "input_lra": 3.2, "input_tp": -1.6}
+    assert MediaAnalysis.parse_ebur128_summary("no summary") is None
@@ -0,0 +1,92 @@
+"""
+media_probe.py テスト
+"""
+import json
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+from core.media_probe import MediaInfo, MediaProbe
+
+FFPROBE_OUTPUT = {
+    "streams": [
+        {"index": 0, "codec_type": "video", "codec_name": "mjpeg", "width": 320, "height": 320,
+         "disposition": {"attached_pic": 1}},
+        {"index": 1, "codec_type": "video", "codec_name": "h264", "width": 1920, "height": 1080,
+         "r_frame_rate": "30000/1001", "pix_fmt": "yuv420p", "duration": "12.012000"},
+        {"index": 2, "codec_type": "audio", "codec_name": "aac", "sample_rate": "48000", "channels": 2},
+    ],
+    "format": {"format_name": "mov,mp4,m4a,3gp,3g2,mj2", "duration": "12.034000", "bit_rate": "8000000"},
+}
+
+@pytest.fixture
+def fake_ffprobe(tmp_path):
+    # 呼ばれた回数を記録して固定のJSONを返すffprobeの代わり
+    calls = tmp_path / "calls.txt"
+    script = tmp_path / "ffprobe"
+    script.write_text(
+        f"#!{sys.executable}\n"
+        "import sys\n"
+        f"open({str(calls)!r}, 'a').write(sys.argv[-1] + '\\n')\n"
+        f"print({json.dumps(json.dumps(FFPROBE_OUTPUT))})\n"
+    )
+    script.chmod(0o755)
+    return str(script), calls
+
+def _calls(calls):
+    return calls.read_text().splitlines() if calls.exists() else []
+
+def test_media_info_from_ffprobe():
+    info = MediaInfo.from_ffprobe("a.mp4", FFPROBE_OUTPUT)
+    assert info.duration == 12.034 and info.bit_rate == 8000000
+    # カバー画像は映像ストリームとして扱わない
+    assert info.video.index == 1 and info.video.width == 1920
+    assert info.audio.sample_rate == 48000 and info.has_audio
+    assert info.video_format() == {"codec_name": "h264", "width": 1920, "height": 1080,
+                                   "r_frame_rate": "30000/1001", "pix_fmt": "yuv420p"}
+    assert not MediaInfo.from_ffprobe("b.wav", {"streams": [], "format": {}}).has_audio
+
+@pytest.mark.skipif(os.name == "nt", reason="シェバンのスクリプトを使うため")
+def test_probe_uses_memory_and_disk_cache(tmp_path, fake_ffprobe):
+    ffprobe, calls = fake_ffprobe
+    media = tmp_path / "a.mp4"
+    media.write_bytes(b"\x00" * 1000)
+    db = tmp_path / "probe.sqlite3"
+    probe = MediaProbe(db, ffprobe=ffprobe)
+    assert probe.probe(media).duration == 12.034
+    assert probe.probe(media).video.codec_name == "h264"
+    assert len(_calls(calls)) == 1
+    # 別インスタンス（再起動後）でもディスクから読む
+    assert MediaProbe(db, ffprobe=ffprobe).probe(media).duration == 12.034
+    assert len(_calls(calls)) == 1
+    # 内容が変わったら取り直す
+    media.write_bytes(b"\x00" * 2000)
+    probe.probe(media)
+    assert len(_calls(calls)) == 2
+
+@pytest.mark.skipif(os.name == "nt", reason="シェバンのスクリプトを使うため")
+def test_probe_lru_evicts_and_errors_are_not_cached(tmp_path, fake_ffprobe):
+    ffprobe, calls = fake_ffprobe
+    probe = MediaProbe(tmp_path / "probe.sqlite3", lru_size=2, ffprobe=ffprobe)
+    files = []
+    for i in range(3):
+        files.append(tmp_path / f"{i}.mp4")
+        files[-1].write_bytes(bytes([i]) * 100)
+        probe.probe(files[-1])
+    assert len(probe._memory) == 2
+    missing = probe.probe(tmp_path / "missing.mp4")
+    assert missing.error and missing.duration is None and not missing.has_audio
+    failing = MediaProbe(tmp_path / "probe2.sqlite3", ffprobe=str(tmp_path / "no-such-ffprobe"))
+    assert failing.probe(files[0]).error
+    assert len(_calls(calls)) == 3
+
+@pytest.mark.skipif(shutil.which("ffprobe") is None or shutil.which("ffmpeg") is None, reason="ffprobe/ffmpegが必要")
+def test_probe_real_file(tmp_path):
+    media = tmp_path / "tone.m4a"
+    subprocess.run(["ffmpeg", "-v", "error", "-f", "lavfi", "-i", "sine=d=1", "-c:a", "aac", str(media)], check=True)
+    info = MediaProbe(tmp_path / "probe.sqlite3").probe(media)
+    assert info.error is None and info.has_audio and info.video is None
+    assert abs(info.duration - 1.0) < 0.1
@@ -0,0 +1,101 @@
+"""
+pipeline.py テスト（各段にはPythonインタプリタを使う）
+合成PCMの量は環境変数 PIPELINE_TEST_BYTES で変更できる（例: PIPELINE_TEST_BYTES=8000000000 で約8GB）
+"""
+import os
+import sys
+import zlib
+
+import pytest
+
+from core.pipeline import F_GETPIPE_SZ, PIPE_SIZE, Pipeline, fcntl
+
+TOTAL_BYTES = int(float(os.environ.get("PIPELINE_TEST_BYTES", 64 * 1024 * 1024)))
+BLOCK = bytes(range(256)) * 4096  # 1MiB
+
+GENERATE = f"""
+import os, sys
+block = {BLOCK[:256]!r} * 4096
+left = int(sys.argv[1])
+while left > 0:
+    n = os.write(1, block[:min(left, len(block))])
+    left -= n
+"""
+
+# 受け取ったデータをそのまま流しつつ、チャンクごとにstderrへ大量に書く（stderrを読まないと詰まる量）
+PASSTHROUGH = f"""
+import fcntl, os, sys
+try:
+    sys.stderr.write(f"pipe_size={{fcntl.fcntl(0, {F_GETPIPE_SZ})}}\\n")
+except OSError:
+    sys.stderr.write("pipe_size=0\\n")
+while True:
+    data = os.read(0, 1 << 16)
+    if not data:
+        break
+    view = memoryview(data)
+    while view:
+        view = view[os.write(1, view):]
+    sys.stderr.write("chunk " + "x" * 100 + "\\n")
+"""
+
+CONSUME = """
+import os, sys, zlib
+count, adler = 0, 1
+while True:
+    data = os.read(0, 1 << 20)
+    if not data:
+        break
+    count += len(data)
+    adler = zlib.adler32(data, adler)
+sys.stderr.write(f"{count} {adler}\\n")
+"""
+
+def _py(code, *args):
+    return [sys.executable, "-c", code, *map(str, args)]
+
+def _expected_adler(total):
+    adler, left = 1, total
+    while left > 0:
+        chunk = BLOCK[:min(left, len(BLOCK))]
+        adler = zlib.adler32(chunk, adler)
+        left -= len(chunk)
+    return adler
+
+def test_pipeline_moves_pcm_and_drains_stderr():
+    result = Pipeline([_py(GENERATE, TOTAL_BYTES), _py(PASSTHROUGH), _py(CONSUME)]).run(timeout=3600)
+    assert result.ok, result.error_message()
+    count, adler = map(int, result.stages[2].stderr[-1].split())
+    assert count == TOTAL_BYTES
+    assert adler == _expected_adler(TOTAL_BYTES)
+    # stderrは上限付きで末尾だけ残る（省略の目印＋末尾200行）
+    stderr = result.stages[1].stderr
+    assert len(stderr) <= 201
+    if TOTAL_BYTES > 200 * 65536:
+        assert stderr[0].endswith("行省略）...")
+
+@pytest.mark.skipif(fcntl is None or not sys.platform.startswith("linux"), reason="F_SETPIPE_SZはLinuxのみ")
+def test_pipe_is_enlarged():
+    result = Pipeline([_py(GENERATE, 1024), _py(PASSTHROUGH), _py(CONSUME)]).run(timeout=60)
+    assert result.ok
+    assert result.stages[1].stderr[0] == f"pipe_size={PIPE_SIZE}"
+
+def test_downstream_failure_stops_upstream():
+    # 無限に書き続ける上流でも、下流の失敗で止まる
+    fail = "import os, sys; os.read(0, 1000); sys.stderr.write('broken\\n'); sys.exit(3)"
+    result = Pipeline([_py(GENERATE, 1 << 62), _py(fail)]).run(timeout=60)
+    assert not result.ok and not result.timed_out
+    assert result.failed_stage == 1
+    assert result.stages[1].returncode == 3
+    assert "broken" in result.error_message()
+
+def test_upstream_failure_is_reported():
+    # 下流が正常終了しても、上流の失敗は結果に残る
+    fail = "import os, sys; os.write(1, b'x' * 1000); sys.exit(2)"
+    result = Pipeline([_py(fail), _py(CONSUME)]).run(timeout=60)
+    assert not result.ok
+    assert result.failed_stage == 0
+
+def test_timeout_kills_all_stages():
+    result = Pipeline([_py("import time; time.sleep(30)"), _py(CONSUME)]).run(timeout=0.5)
+    assert result.timed_out and not result.ok
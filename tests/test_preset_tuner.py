@@ -0,0 +1,81 @@
+"""
+preset_tuner.py テスト
+"""
+import shutil
+
+import pytest
+
+from core.preset_tuner import PresetTuner, X26X_PRESETS, frame_rate, resolution_class
+
+# 高速なプリセットほどfpsが高い架空のマシン（1スレッドでultrafast=45fps、1段遅くなるごとに5fps減）
+def fake_measure(self, encoder, preset, threads, width, height):
+    self.measured.append((preset, threads))
+    return (X26X_PRESETS.index(preset) + 1) * 5.0 * threads
+
+def make_tuner(tmp_path, monkeypatch, key="ffmpeg 7.0|abc"):
+    monkeypatch.setattr(PresetTuner, "_measure", fake_measure)
+    tuner = PresetTuner(cache_path=tmp_path / "presets.json")
+    tuner._binary_key = key
+    tuner.measured = []
+    return tuner
+
+def test_resolution_class_and_frame_rate():
+    assert resolution_class(1280, 720) == "720p"
+    assert resolution_class(1920, 1080) == "1080p"
+    assert resolution_class(2560, 1440) == "2160p"
+    assert resolution_class(7680, 4320) == "2160p"
+    assert resolution_class(None, None) == "1080p"
+    assert frame_rate("30000/1001") == pytest.approx(29.97, abs=0.01)
+    assert frame_rate("0/0") is None and frame_rate(None) is None
+
+def test_choose_highest_quality_meeting_target(tmp_path, monkeypatch):
+    tuner = make_tuner(tmp_path, monkeypatch)
+    profile = tuner.calibrate("libx264", "1080p", threads=[1, 2])
+    # 1スレッドは15fps(=0.5倍速)未満になったslowerで打ち切り、veryslowは測らない
+    assert list(profile["1"]) == list(reversed(X26X_PRESETS[1:]))
+    assert "veryslow" in profile["2"]
+    # 2倍速(60fps)を満たす最も高画質なプリセット
+    choice = tuner.choose("libx264", 1920, 1080, threads=2, target_speed=2.0)
+    assert (choice.preset, choice.threads) == ("faster", 2)
+    assert choice.speed >= 2.0 and choice.args() == ["-preset", "faster"]
+    # 割り当てが1スレッドなら1スレッドの測定値を使い、満たせなければ最速のプリセット
+    assert tuner.choose("libx264", 1920, 1080, threads=1, target_speed=2.0).preset == "ultrafast"
+    assert tuner.choose("libx264", 1920, 1080, threads=1, target_speed=1.0).preset == "faster"
+    # プリセットのないエンコーダは選ばない
+    assert tuner.choose("h264_videotoolbox", 1920, 1080) is None
+    assert tuner.preset_args("h264_videotoolbox") == []
+
+def test_profiles_persist_and_recalibrate_on_new_ffmpeg(tmp_path, monkeypatch):
+    tuner = make_tuner(tmp_path, monkeypatch)
+    tuner.set_target_speed(1.0)
+    tuner.choose("libx264", 1280, 720, threads=1)
+    assert tuner.measured
+
+    same = make_tuner(tmp_path, monkeypatch)
+    assert same.target_speed == 1.0
+    assert same.choose("libx264", 1280, 720, threads=1).preset == "faster"
+    assert same.measured == []
+
+    upgraded = make_tuner(tmp_path, monkeypatch, key="ffmpeg 7.1|def")
+    assert upgraded.profile("libx264", "720p") is None
+    upgraded.choose("libx264", 1280, 720, threads=1)
+    assert upgraded.measured
+    assert upgraded.target_speed == 1.0
+
+def test_calibration_progress_is_logged(tmp_path, monkeypatch):
+    tuner = make_tuner(tmp_path, monkeypatch)
+    lines = []
+    assert tuner.preset_args("libx264", 1280, 720, threads=1, log_func=lines.append) == ["-preset", "ultrafast"]
+    assert "測定します" in lines[0]
+    assert len(lines) == 1 + len(tuner.measured)
+    # 測定済みなら何も出さない
+    lines.clear()
+    tuner.preset_args("libx264", 1280, 720, threads=1, log_func=lines.append)
+    assert lines == []
+
+@pytest.mark.real_calibration
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpegが必要")
+def test_measure_with_ffmpeg(tmp_path):
+    tuner = PresetTuner(cache_path=tmp_path / "presets.json")
+    assert tuner._measure("libx264", "ultrafast", 1, 1280, 720) > 0
+    assert tuner._measure("no_such_encoder", "ultrafast", 1, 1280, 720) == 0.0
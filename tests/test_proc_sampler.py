@@ -0,0 +1,96 @@
+"""
+proc_sampler.py テスト
+"""
+import os
+import sys
+
+import pytest
+
+from core.async_executor import AsyncExecutor
+from core.executor import Executor
+from core.job_scheduler import ASR, JobScheduler
+from core.proc_sampler import JobLog, ProcSampler, ResourceSummary, parse_io, parse_stat, parse_status
+
+# 64MBを書き込んで確保し、約0.3秒CPUを使ってからサンプリング間隔より長く待って終了する子プロセス
+BUSY_CHILD = ("import time\nbuf = b'x' * (64 << 20)\nend = time.process_time() + 0.3\n"
+              "while time.process_time() < end: pass\ntime.sleep(0.7)\n")
+
+@pytest.fixture
+def job_log(tmp_path, monkeypatch):
+    log = JobLog(tmp_path / "jobs.jsonl")
+    monkeypatch.setattr(JobLog, "_default", log)
+    return log
+
+def test_parse_proc_files():
+    # コマンド名に空白・括弧を含む場合も最後の')'から数える
+    fields = ["S"] + ["0"] * 10 + ["250", "50"] + ["0"] * 26 + ["30"]
+    stat = f"1234 (ff (x) mpeg) {' '.join(fields)}"
+    tck = os.sysconf("SC_CLK_TCK")
+    assert parse_stat(stat) == {"user_time": 250 / tck, "sys_time": 50 / tck, "blkio_wait": 30 / tck}
+    status = "Name:\tffmpeg\nVmHWM:\t  2048 kB\nVmRSS:\t  1024 kB\n"
+    assert parse_status(status) == {"peak_rss": 2048 * 1024, "rss": 1024 * 1024}
+    io = "rchar: 10\nwchar: 20\nread_bytes: 4096\nwrite_bytes: 8192\ncancelled_write_bytes: 0\n"
+    assert parse_io(io) == {"read_bytes": 4096, "write_bytes": 8192}
+
+def test_summary_format():
+    summary = ResourceSummary(wall_time=2.0, cpu_time=3.0, peak_rss=512 << 20, read_bytes=3 << 29, write_bytes=100)
+    assert summary.cpu_utilization == 1.5
+    assert summary.format() == "実時間 2.0s / CPU 3.0s (150%) / ピークRSS 512MB / 読込 1.5GB / 書出 100B"
+    assert summary.to_dict()["cpu_utilization"] == 1.5
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/stat"), reason="/procが必要")
+def test_run_command_records_child_resources(job_log):
+    summaries = []
+    ret = Executor.run_command([sys.executable, "-c", BUSY_CHILD], resources_callback=summaries.append)
+    assert ret == 0
+    summary = summaries[0]
+    # 終了直前（ゾンビ）の値を読むため、短いプロセスでもCPU時間が取れる
+    assert summary.cpu_time >= 0.25
+    assert summary.peak_rss >= 64 << 20
+    assert summary.wall_time >= 1.0
+    records = job_log.read()
+    assert len(records) == 1
+    assert records[0]["kind"] == "ffmpeg" and records[0]["returncode"] == 0
+    assert records[0]["cpu_time"] == summary.cpu_time and records[0]["command"].startswith(sys.executable)
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/stat"), reason="/procが必要")
+def test_async_executor_reads_final_values_before_reaping(job_log):
+    # サンプリング間隔より短い子プロセスでも、回収前の最終値でCPU時間が取れる
+    code = "import time\nend = time.process_time() + 0.2\nwhile time.process_time() < end: pass\n"
+    result = AsyncExecutor().run_sync([sys.executable, "-c", code])
+    assert result.ok
+    assert result.resources.cpu_time >= 0.15
+    assert result.resources.samples >= 2
+    assert job_log.read()[0]["cpu_time"] == result.resources.cpu_time
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/stat"), reason="/procが必要")
+def test_own_process_sampling_uses_deltas():
+    with ProcSampler(interval=0.05) as sampler:
+        buf = bytearray(32 << 20)
+        for i in range(0, len(buf), 4096):
+            buf[i] = 1
+        end = os.times().user + 0.2
+        while os.times().user < end:
+            pass
+        summary = sampler.stop()
+    assert 0.15 <= summary.user_time < 5
+    assert summary.samples >= 2 and summary.peak_rss > 32 << 20
+
+def test_asr_jobs_are_logged(job_log):
+    scheduler = JobScheduler(slots={ASR: 1}, ram_mb=1000)
+    job = scheduler.submit("Whisper", lambda ctx: None, resources={ASR: 1})
+    assert job.wait(5)
+    assert job.usage is not None
+    assert [(r["kind"], r["name"], r["state"]) for r in job_log.read()] == [("asr", "Whisper", "finished")]
+    # asr枠を使わないジョブは記録しない
+    assert scheduler.submit("other", lambda ctx: None).wait(5)
+    assert len(job_log.read()) == 1
+
+def test_job_log_rotates(tmp_path):
+    log = JobLog(tmp_path / "jobs.jsonl", max_bytes=100)
+    for i in range(3):
+        log.append("ffmpeg", f"job{i}", ResourceSummary(wall_time=1.0))
+    assert (tmp_path / "jobs.jsonl.1").exists()
+    # 1件ごとに上限を超えるため、直前の1件だけが退避され最新の1件が残る
+    assert [r["name"] for r in log.read()] == ["job2"]
+    assert [r["name"] for r in JobLog(tmp_path / "jobs.jsonl.1").read()] == ["job1"]
@@ -1,15 +1,20 @@
 """
 AI自動セリフ抽出＆クロスフェード編集ページUI
 """
-from PySide6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QLineEdit, QFileDialog, QTextEdit, QCheckBox, QComboBox
+from PySide6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QLineEdit, QFileDialog, QTextEdit, QCheckBox, QComboBox, QProgressBar
 from PySide6.QtCore import Qt, Signal, QSettings
 from core.speech_segment_extractor import SpeechSegmentExtractor
 from core.executor import Executor
+from core.cpu_budget import CpuBudget
+from core.job_scheduler import ASR, DECODE, ENCODE, JobScheduler, Priority
+from ui_parts.job_events import JobEventBridge
+from ui_parts.log_console_widget import MAX_LOG_BLOCKS
 import os
-import threading
-import shlex
 import tempfile
 
+# ローカルWhisperモデルの使用メモリの目安（MB）。スケジューラのメモリ予算に使う
+WHISPER_RAM_MB = {"tiny": 1024, "base": 1024, "small": 2048, "medium": 5120, "large-v3": 10240}
+
 class AutoSpeechExtractPage(QWidget):
     update_status = Signal(int, str)
     update_log = Signal(int, str)
@@ -33,9 +38,16 @@ class AutoSpeechExtractPage(QWidget):
         # ログ表示エリア
         self.log_text = QTextEdit()
         self.log_text.setReadOnly(True)
+        self.log_text.document().setMaximumBlockCount(MAX_LOG_BLOCKS)
         self.log_text.setMinimumHeight(200)  # 最小高さを設定
         layout.addWidget(self.log_text, stretch=1)  # 伸縮可能に
 
+        # FFmpeg書き出しの進捗
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 100)
+        self.progress_bar.setValue(0)
+        layout.addWidget(self.progress_bar)
+
         # Whisperワードレベル解析ON/OFF
         self.chk_word_level = QCheckBox("ワードレベルで解析する（word_timestamps）")
         self.chk_word_level.setChecked(self.settings.value("word_level", False, type=bool))
@@ -154,6 +166,9 @@ class AutoSpeechExtractPage(QWidget):
         self.btn_run.clicked.connect(self.run_extract)
         layout.addWidget(self.btn_run, alignment=Qt.AlignBottom)  # 下部に配置
 
+        # 認識・書き出しジョブ（"jetcut/render"を含む）の通知はスケジューラのイベントチャネルからメインスレッドで受け取る
+        JobEventBridge.instance().connect_group("jetcut", self._on_job_event)
+
     def select_srt_file(self):
         file, _ = QFileDialog.getOpenFileName(self, "SRTファイル選択", "", "字幕ファイル (*.srt)")
         if file:
@@ -198,6 +213,11 @@ class AutoSpeechExtractPage(QWidget):
         if not self.file_path or not self.output_path:
             self.log_text.append("入力・出力ファイルを選択してください")
             return
+        # 認識・書き出しのどちらかが動いている間は受け付けない（セグメントを上書きしないように）
+        scheduler = JobScheduler.default()
+        if scheduler.busy("jetcut") or scheduler.busy("jetcut/render"):
+            self.log_text.append("[エラー] ジェットカットを実行中です")
+            return
             
         # セリフ間隔しきい値（秒）を取得
         try:
@@ -224,6 +244,7 @@ class AutoSpeechExtractPage(QWidget):
         # 言語設定を取得
         language = self.combo_language.currentData()
         self._language = language
+        self._language_label = self.combo_language.currentText()
         
         # word_timestampsオプション
         word_level = self.chk_word_level.isChecked()
@@ -257,27 +278,31 @@ class AutoSpeechExtractPage(QWidget):
             self.log_text.append("-" * 50)
             
             # SRTファイルから直接セグメントを抽出
-            threading.Thread(target=self._process_srt_file, daemon=True).start()
+            scheduler.submit("SRT解析", self._process_srt_file,
+                             resources={DECODE: 1}, priority=Priority.INTERACTIVE, group="jetcut")
         else:
             # 前回の結果をクリア
             self.srt_path = None
             self.segments = []
             self.log_text.append(f"=== 新しい音声認識を開始します ===")
-            self.log_text.append(f"モデル: {model}, 言語: {self.combo_language.currentText()}, ワードレベル: {'ON' if word_level else 'OFF'}")
+            self.log_text.append(f"モデル: {model}, 言語: {self._language_label}, ワードレベル: {'ON' if word_level else 'OFF'}")
             self.log_text.append(f"セリフ間隔しきい値: {merge_gap_sec}秒")
             self.log_text.append("-" * 50)
             
             # Whisperで音声認識を実行
             self.log_text.append(f"Whisperで音声認識を開始します...")
-            threading.Thread(target=self._run_extract_task, daemon=True).start()
+            # ローカルモデルはASR枠とモデルに応じたメモリを使う（APIの場合はメモリを見込まない）
+            ram_mb = 0 if api_key else WHISPER_RAM_MB.get(model, 2048)
+            scheduler.submit("Whisper音声認識", self._run_extract_task,
+                             resources={ASR: 1}, ram_mb=ram_mb, group="jetcut")
     
-    def _process_srt_file(self):
+    def _process_srt_file(self, ctx):
         """外部SRTファイルを処理する"""
         try:
             merge_gap_sec = getattr(self, '_merge_gap_sec', 0.0)
             
             # SRTファイルをパースしてセグメントを取得
-            self._append_log(f"SRTファイルを解析中: {self.srt_path}")
+            ctx.log(f"SRTファイルを解析中: {self.srt_path}")
             self.segments = self.extractor.parse_srt_segments(
                 self.srt_path, 
                 merge_gap_sec=merge_gap_sec, 
@@ -285,47 +310,44 @@ class AutoSpeechExtractPage(QWidget):
             )
             
             if not self.segments:
-                self._append_log("[エラー] 有効なセグメントが見つかりませんでした")
+                ctx.log("[エラー] 有効なセグメントが見つかりませんでした")
                 return
                 
             # セグメント情報をログに出力
-            self._log_segment_info()
+            self._log_segment_info(ctx)
             
             # FFmpegコマンドを実行（クロスフェード設定を渡す）
-            self._execute_ffmpeg_command(crossfade_duration=self._crossfade_duration)
+            self._submit_render()
             
         except Exception as e:
-            self._append_log(f"[エラー] SRTファイルの処理中にエラーが発生しました: {str(e)}")
+            ctx.log(f"[エラー] SRTファイルの処理中にエラーが発生しました: {str(e)}")
     
-    def _log_segment_info(self):
+    def _log_segment_info(self, ctx):
         """セグメント情報をログに出力する"""
         # セグメント情報をログに出力
-        self._append_log("\n[セリフ区間リスト]")
+        ctx.log("\n[セリフ区間リスト]")
         for i, (st, ed) in enumerate(self.segments, 1):
-            self._append_log(f"  {i:2d}. {st:7.2f}秒 ～ {ed:7.2f}秒  (長さ: {ed-st:6.2f}秒)")
+            ctx.log(f"  {i:2d}. {st:7.2f}秒 ～ {ed:7.2f}秒  (長さ: {ed-st:6.2f}秒)")
         
         # 元動画の長さを取得
         try:
-            import subprocess, re
-            cmd = ["ffprobe", "-v", "error", "-show_entries", "format=duration", 
-                  "-of", "default=noprint_wrappers=1:nokey=1", self.file_path]
-            out = subprocess.check_output(cmd, encoding="utf-8", errors="ignore").strip()
-            original_duration = float(re.findall(r"[\d.]+", out)[0])
+            from core.ffprobe_loudness import FFprobeLoudness
+            original_duration = FFprobeLoudness.get_duration(self.file_path)
             
             # トリム後の合計時間を計算
             total_trimmed = sum(ed - st for st, ed in self.segments)
             
             # トリム情報をログに出力
-            self._append_log("\n=== トリム情報 ===")
-            self._append_log(f"・元動画の長さ: {original_duration:.2f}秒")
-            self._append_log(f"・トリム後の長さ: {total_trimmed:.2f}秒")
-            self._append_log(f"・削除された合計時間: {original_duration - total_trimmed:.2f}秒")
+            ctx.log("\n=== トリム情報 ===")
+            ctx.log(f"・元動画の長さ: {original_duration:.2f}秒")
+            ctx.log(f"・トリム後の長さ: {total_trimmed:.2f}秒")
+            ctx.log(f"・削除された合計時間: {original_duration - total_trimmed:.2f}秒")
             
         except Exception as e:
-            self._append_log(f"[警告] 動画情報の取得中にエラーが発生しました: {e}")
+            ctx.log(f"[警告] 動画情報の取得中にエラーが発生しました: {e}")
 
 
-    def _run_extract_task(self):
+    def _run_extract_task(self, ctx):
         """Whisperを使用して音声認識を実行する"""
         try:
             language = getattr(self, '_language', 'ja')
@@ -336,7 +358,7 @@ class AutoSpeechExtractPage(QWidget):
             
             # 毎回新しいextractorインスタンスを作成してモデルを初期化
             self.extractor = SpeechSegmentExtractor(whisper_model=model)
-            self._append_log(f"[INFO] Whisperモデル '{model}' を初期化中...")
+            ctx.log(f"[INFO] Whisperモデル '{model}' を初期化中...")
 
             # 常に新しい一時ファイルを作成して使用（前回の結果を上書き）
             with tempfile.NamedTemporaryFile(suffix='.srt', delete=False) as temp_srt:
@@ -358,14 +380,14 @@ class AutoSpeechExtractPage(QWidget):
                     "エラー" in msg.lower() or
                     "warn" in msg.lower() or
                     "info" in msg.lower()):
-                    self._append_log(msg)
+                    ctx.log(msg)
                 # その他の詳細なログはデバッグ情報としてコンソールにのみ出力
                 else:
                     print(f"[Whisper] {msg}")
             
-            self._append_log(f"Whisperで音声認識を開始します...")
-            self._append_log(f"モデル: {model}, 言語: {self.combo_language.currentText()}, ワードレベル: {'ON' if word_level else 'OFF'}")
-            self._append_log(f"セリフ間隔しきい値: {merge_gap_sec}秒")
+            ctx.log(f"Whisperで音声認識を開始します...")
+            ctx.log(f"モデル: {model}, 言語: {self._language_label}, ワードレベル: {'ON' if word_level else 'OFF'}")
+            ctx.log(f"セリフ間隔しきい値: {merge_gap_sec}秒")
             
             try:
                 # Whisperで音声認識を実行
@@ -387,72 +409,71 @@ class AutoSpeechExtractPage(QWidget):
                 )
                 
                 if not self.segments:
-                    self._append_log("[エラー] 有効なセグメントが見つかりませんでした")
+                    ctx.log("[エラー] 有効なセグメントが見つかりませんでした")
                     return
                 
                 # セグメント情報をログに出力
-                self._log_segment_info()
+                self._log_segment_info(ctx)
                 
-                # FFmpegコマンドを実行
-                self._execute_ffmpeg_command(crossfade_duration=self._crossfade_duration)
+                # FFmpegコマンドを実行（ASR枠を空けるため別ジョブで）
+                self._submit_render()
                 
             except Exception as e:
-                self._append_log(f"[エラー] 音声認識中にエラーが発生しました: {str(e)}")
+                ctx.log(f"[エラー] 音声認識中にエラーが発生しました: {str(e)}")
                 raise
                 
         except Exception as e:
-            self._append_log(f"[エラー] {str(e)}")
+            ctx.log(f"[エラー] {str(e)}")
     
-    def _execute_ffmpeg_command(self, crossfade_duration=0.0):
+    def _submit_render(self):
+        """書き出しをencode枠のジョブとして投入する"""
+        JobScheduler.default().submit(
+            "ジェットカット書き出し",
+            lambda ctx: self._execute_ffmpeg_command(ctx, crossfade_duration=self._crossfade_duration),
+            resources={ENCODE: 1}, group="jetcut/render"
+        )
+
+    def _execute_ffmpeg_command(self, ctx, crossfade_duration=0.0):
         """FFmpegコマンドを実行する"""
         try:
-            self._append_log(f"\nセグメント抽出完了: {len(self.segments)}区間\nFFmpegコマンド生成中...")
+            ctx.log(f"\nセグメント抽出完了: {len(self.segments)}区間\nFFmpegコマンド生成中...")
             
-            # FFmpegコマンドを構築（クロスフェード設定を渡す）
-            commands = self.extractor.build_ffmpeg_commands(
-                self.file_path, 
-                self.segments, 
-                self.output_path, 
-                merge_gap_sec=self._merge_gap_sec,
-                crossfade_duration=crossfade_duration,
-                log_func=self._append_log
-            )
+            # 書き出し中は割り当てたコア数だけffmpegに使わせる（Whisperの割り当ては解析後に返却済み）
+            with CpuBudget.default().allocate() as cpu:
+                # FFmpegコマンドを構築（クロスフェード設定を渡す）
+                commands = self.extractor.build_ffmpeg_commands(
+                    self.file_path, 
+                    self.segments, 
+                    self.output_path, 
+                    merge_gap_sec=self._merge_gap_sec,
+                    crossfade_duration=crossfade_duration,
+                    log_func=ctx.log,
+                    threads=cpu.threads
+                )
             
-            # build_ffmpeg_commandsが複数コマンドリストを返す場合に対応
-            cmds = commands
-            if isinstance(cmds, (list, tuple)) and len(cmds) > 0 and isinstance(cmds[0], list):
-                # コマンドリストのリスト（複数候補）
-                success = False
-                for idx, cmd in enumerate(cmds):
-                    self._append_log(f"コマンド候補{idx+1}: {' '.join(cmd)}")
-                    self._append_log("FFmpeg実行中...")
-                    ret = Executor.run_command(cmd, self._append_log)
-                    if ret == 0:
-                        self._append_log("\n[完了] 編集済み動画の出力が完了しました。")
-                        success = True
-                        break
-                    else:
-                        self._append_log(f"\n[エラー] FFmpeg実行に失敗しました (return code={ret})")
-                if not success:
-                    self._append_log("[エラー] すべてのエンコーダでFFmpeg実行に失敗しました")
+                # 書き出し後の長さ（抽出区間の合計）を進捗の基準にする
+                output_duration = sum(ed - st for st, ed in self.segments) or None
+
+                ctx.log(f"コマンド生成完了\n{' '.join(commands)}")
+                ctx.log("FFmpeg実行中...")
+                def on_progress(event):
+                    ctx.emit("progress", (int(event.percent or 0), event.format()))
+                ret = Executor.run_command(commands, ctx.log, progress_callback=on_progress,
+                                           duration=output_duration, affinity=cpu.cores)
+            if ret == 0:
+                ctx.log("\n[完了] 編集済み動画の出力が完了しました。")
             else:
-                # 1コマンドのみ（従来通り）
-                if isinstance(cmds, list):
-                    self._append_log(f"コマンド生成完了\n{' '.join(cmds)}")
-                    cmd_list = cmds
-                else:
-                    self._append_log(f"コマンド生成完了\n{cmds}")
-                    cmd_list = shlex.split(cmds)
-                self._append_log("FFmpeg実行中...")
-                ret = Executor.run_command(cmd_list, self._append_log)
-                if ret == 0:
-                    self._append_log("\n[完了] 編集済み動画の出力が完了しました。")
-                else:
-                    self._append_log(f"\n[エラー] FFmpeg実行に失敗しました (return code={ret})")
+                ctx.log(f"\n[エラー] FFmpeg実行に失敗しました (return code={ret})")
         except Exception as e:
-            self._append_log(f"[エラー] FFmpegコマンドの実行中にエラーが発生しました: {str(e)}")
+            ctx.log(f"[エラー] FFmpegコマンドの実行中にエラーが発生しました: {str(e)}")
 
-    def _append_log(self, text):
-        # メインスレッドでappend
-        from PySide6.QtCore import QMetaObject, Qt, Q_ARG
-        QMetaObject.invokeMethod(self.log_text, "append", Qt.QueuedConnection, Q_ARG(str, text))
+    def _on_job_event(self, event):
+        # ジョブからの通知（メインスレッドで呼ばれる）
+        if event.kind == "log":
+            self.log_text.append(event.data)
+        elif event.kind == "progress":
+            percent, text = event.data
+            self.progress_bar.setValue(percent)
+            self.progress_bar.setFormat(text)
+        elif event.kind == "failed":
+            self.log_text.append(f"[エラー] {event.name}に失敗しました: {event.data}")
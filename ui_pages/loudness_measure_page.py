@@ -1,11 +1,12 @@
 """
 Loudness Measureページ（ffprobe/ffmpegによるラウドネス測定）
 """
-from PySide6.QtWidgets import QWidget, QVBoxLayout, QPushButton, QLabel, QFileDialog, QTableWidget, QTableWidgetItem, QAbstractItemView, QHeaderView
+from PySide6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QFileDialog, QTableWidget, QTableWidgetItem, QAbstractItemView, QHeaderView, QComboBox, QDoubleSpinBox, QProgressBar
 from PySide6.QtCore import Qt, QEvent
 from pathlib import Path
 from core.ffprobe_loudness import FFprobeLoudness
-import threading
+from core.job_scheduler import DECODE, JobScheduler
+from ui_parts.job_events import JobEventBridge
 from ui_parts.file_select_widget import FileSelectWidget
 from ui_parts.log_console_widget import LogConsoleWidget
 from ui_parts.external_storage_file_adder import ExternalStorageFileAdder
@@ -14,12 +15,15 @@ from PySide6.QtCore import Signal
 
 class LoudnessMeasurePage(QWidget):
     add_files_signal = Signal(object)  # 型をobjectにしてPySide6の型不一致を回避
+    add_result_signal = Signal(str, object)  # 補正ページが書き出し時に測定した結果（パス, 測定値dict）
     def __init__(self):
         super().__init__()
         print(f"[DEBUG][stdout] LoudnessMeasurePage __init__ id={id(self)}")
         if hasattr(self, 'log_console'):
             self.log_console.append(f"[DEBUG] LoudnessMeasurePage __init__ id={id(self)}")
         self.add_files_signal.connect(self.add_files)
+        self.add_result_signal.connect(self.add_result)
+        self.results = {}  # パス → 測定値dict（ファイルリスト更新時もテーブルに残す）
         layout = QVBoxLayout(self)
         # ファイル選択ウィジェット（共通化）
         self.file_select = FileSelectWidget()
@@ -44,15 +48,42 @@ class LoudnessMeasurePage(QWidget):
         header.setSectionResizeMode(4, QHeaderView.ResizeToContents)
         self.table.verticalHeader().setDefaultSectionSize(26)
         layout.addWidget(self.table)
+        # 測定方式
+        mode_layout = QHBoxLayout()
+        mode_layout.addWidget(QLabel("測定方式:"))
+        self.combo_mode = QComboBox()
+        self.combo_mode.addItem("サンプリング（前半・中盤・後半の60秒, loudnorm）", "sampled")
+        self.combo_mode.addItem("全区間（NumPy R128エンジン・チャンク並列）", "r128")
+        self.combo_mode.addItem("推定（層化ランダム窓・信頼区間で打ち切り）", "estimate")
+        mode_layout.addWidget(self.combo_mode)
+        mode_layout.addWidget(QLabel("推定の許容誤差(±LU):"))
+        self.spin_tolerance = QDoubleSpinBox()
+        self.spin_tolerance.setRange(0.05, 3.0)
+        self.spin_tolerance.setSingleStep(0.05)
+        self.spin_tolerance.setValue(0.3)
+        mode_layout.addWidget(self.spin_tolerance)
+        mode_layout.addStretch()
+        layout.addLayout(mode_layout)
         # 実行ボタン
         btn_run = QPushButton("ラウドネス測定を実行")
         btn_run.clicked.connect(self.run_measure)
         layout.addWidget(btn_run)
+        # 連結ラウドネス（R128統計の結合。測定済みファイルは再デコードしない）
+        btn_concat = QPushButton("全ファイルを連結した場合のラウドネスを計算")
+        btn_concat.clicked.connect(self.run_concat_measure)
+        layout.addWidget(btn_concat)
+        # 進捗バー（全区間測定・連結測定のデコード）
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 100)
+        self.progress_bar.setValue(0)
+        layout.addWidget(self.progress_bar)
         # ログ表示欄（共通ウィジェット化）
         self.log_console = LogConsoleWidget()
         layout.addWidget(self.log_console)
         # ファイルリスト管理はfile_selectに一元化
         self.status_map = {}
+        # 測定ジョブ（連結測定の"measure/concat"を含む）の通知を受け取る
+        JobEventBridge.instance().connect_group("measure", self._on_job_event)
         # ドラッグ&ドロップ有効化
         # self.setAcceptDrops(True)
 
@@ -81,11 +112,31 @@ class LoudnessMeasurePage(QWidget):
         self.table.setRowCount(len(self.file_paths))
         for i, f in enumerate(self.file_paths):
             self.table.setItem(i, 0, QTableWidgetItem(Path(f).name))
+            if f in self.results:
+                self._set_result(i, *self.results[f])
+                continue
             self.table.setItem(i, 1, QTableWidgetItem("-"))
             self.table.setItem(i, 2, QTableWidgetItem("-"))
             self.table.setItem(i, 3, QTableWidgetItem("-"))
             self.table.setItem(i, 4, QTableWidgetItem("未処理"))
 
+    def _set_result(self, row, result, status):
+        integrated = str(result.get("input_i", "-"))
+        if "ci_low" in result:
+            integrated += f" ({result['ci_low']}〜{result['ci_high']})"
+        self.table.setItem(row, 1, QTableWidgetItem(integrated))
+        self.table.setItem(row, 2, QTableWidgetItem(str(result.get("input_tp", "-"))))
+        self.table.setItem(row, 3, QTableWidgetItem(str(result.get("input_lra", "-"))))
+        self.table.setItem(row, 4, QTableWidgetItem(status))
+
+    def add_result(self, file_path, result):
+        """
+        補正ページが書き出し時に測定した出力ラウドネスをテーブルに反映（再デコードしない）
+        """
+        self.results[file_path] = (result, "成功（書き出し時に測定）")
+        if file_path in self.status_map:
+            self._set_result(self.status_map[file_path], *self.results[file_path])
+
     def select_files(self):
         self.file_select.select_files()
 
@@ -99,22 +150,95 @@ class LoudnessMeasurePage(QWidget):
             self.table.setRowCount(0)
         self.file_paths = []
         self.status_map = {}
+        self.results = {}
 
     def run_measure(self):
-        def task():
-            for file_path in self.file_paths:
-                row = self.status_map[file_path]
-                self.table.setItem(row, 4, QTableWidgetItem("実行中"))
-                self.log_console.append(f"[実行開始] {file_path}")
-                result, log = FFprobeLoudness.measure_loudness(Path(file_path))
+        mode = self.combo_mode.currentData()
+        tolerance = self.spin_tolerance.value()
+        self.progress_bar.setValue(0)
+        # 測定中にファイルリストがリセット・変更されても影響しないよう、投入時点の状態を写し取る
+        file_paths = list(self.file_paths)
+        rows = dict(self.status_map)
+        measured = set(self.results)
+        def task(ctx):
+            batched = {}
+            if mode == "sampled":
+                # 短いクリップは3点サンプリングより全区間の一括測定の方が速いため、まとめて先に測る
+                from core.media_analysis import BATCH_MAX_FILE_BYTES
+                # 書き出し時に測定済みのファイルはキャッシュから読むため除外
+                short = [Path(f) for f in file_paths if f not in measured
+                         and Path(f).is_file() and Path(f).stat().st_size <= BATCH_MAX_FILE_BYTES]
+                if len(short) > 1:
+                    ctx.log(f"[一括測定] 短いクリップ{len(short)}件をまとめて測定中...")
+                    batched = FFprobeLoudness.measure_many(short)
+            for index, file_path in enumerate(file_paths):
+                ctx.check_cancelled()
+                row = rows[file_path]
+                ctx.emit("status", (row, "実行中"))
+                ctx.emit("progress", (index * 100 // len(file_paths), f"{index}/{len(file_paths)}"))
+                def on_progress(fraction, row=row, index=index, file_path=file_path):
+                    # 長いファイルの全区間デコードは行の状態と全体の進捗バーに反映
+                    ctx.emit("status", (row, f"実行中 {fraction * 100:.0f}%"))
+                    ctx.emit("progress", (int((index + fraction) * 100 / len(file_paths)),
+                                          f"{index}/{len(file_paths)} {Path(file_path).name} {fraction * 100:.0f}%"))
+                ctx.log(f"[実行開始] {file_path}")
+                if batched.get(str(Path(file_path)), (None, ""))[0]:
+                    result, log = batched[str(Path(file_path))]
+                elif mode == "r128":
+                    result, log = FFprobeLoudness.measure_loudness_r128(Path(file_path), progress_callback=on_progress)
+                elif mode == "estimate":
+                    result, log = FFprobeLoudness.estimate_loudness(Path(file_path), tolerance_lu=tolerance)
+                else:
+                    result, log = FFprobeLoudness.measure_loudness(Path(file_path))
                 if result:
-                    # ラウドネス測定値をテーブルに反映
-                    self.table.setItem(row, 1, QTableWidgetItem(str(result.get("input_i", "-"))))
-                    self.table.setItem(row, 2, QTableWidgetItem(str(result.get("input_tp", "-"))))
-                    self.table.setItem(row, 3, QTableWidgetItem(str(result.get("input_lra", "-"))))
-                    self.table.setItem(row, 4, QTableWidgetItem("成功"))
-                    self.log_console.append(f"[成功] {file_path}")
+                    # ラウドネス測定値をテーブルに反映（メインスレッドで）
+                    ctx.emit("result", (file_path, result, "成功"))
+                    ctx.log(f"[成功] {file_path}")
+                    if log.startswith(("[キャッシュ]", "[R128", "[一括]")):
+                        ctx.log(log)
                 else:
-                    self.table.setItem(row, 4, QTableWidgetItem("失敗"))
-                    self.log_console.append(f"[失敗] {file_path}\n{log}")
-        threading.Thread(target=task, daemon=True).start()
+                    ctx.emit("status", (row, "失敗"))
+                    ctx.log(f"[失敗] {file_path}\n{log}")
+            ctx.emit("progress", (100, f"{len(file_paths)}/{len(file_paths)}"))
+        if JobScheduler.default().submit("ラウドネス測定", task, resources={DECODE: 1}, group="measure") is None:
+            self.log_console.append("[エラー] 測定中です")
+
+    def _on_job_event(self, event):
+        # ジョブからの通知（メインスレッドで呼ばれる）
+        if event.kind == "log":
+            self.log_console.append(event.data)
+        elif event.kind == "status":
+            row, status = event.data
+            self.table.setItem(row, 4, QTableWidgetItem(status))
+        elif event.kind == "progress":
+            percent, text = event.data
+            self.progress_bar.setValue(percent)
+            self.progress_bar.setFormat(text)
+        elif event.kind == "result":
+            file_path, result, status = event.data
+            self.results[file_path] = (result, status)
+            if file_path in self.status_map:
+                self._set_result(self.status_map[file_path], result, status)
+        elif event.kind == "failed":
+            self.log_console.append(f"[エラー] {event.name}に失敗しました: {event.data}")
+
+    def run_concat_measure(self):
+        file_paths = list(getattr(self, 'file_paths', []))
+        if not file_paths:
+            return
+        self.progress_bar.setValue(0)
+        def task(ctx):
+            ctx.log(f"[連結測定開始] {len(file_paths)}ファイル")
+            def on_progress(fraction):
+                ctx.emit("progress", (int(fraction * 100), f"連結測定 {fraction * 100:.0f}%"))
+            result, log = FFprobeLoudness.loudness_of_concatenation([Path(f) for f in file_paths],
+                                                                    progress_callback=on_progress)
+            if result:
+                ctx.log(log)
+                ctx.log(
+                    f"[連結測定結果] Integrated: {result['input_i']} LUFS / True Peak: {result['input_tp']} dB / LRA: {result['input_lra']}"
+                )
+            else:
+                ctx.log(f"[連結測定失敗]\n{log}")
+        if JobScheduler.default().submit("連結測定", task, resources={DECODE: 1}, group="measure/concat") is None:
+            self.log_console.append("[エラー] 連結測定中です")
@@ -2,25 +2,27 @@
 ラウドネス補正ページUI
 """
 from PySide6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QFileDialog, QTableWidget, QTableWidgetItem, QAbstractItemView, QHeaderView, QCheckBox, QLineEdit, QInputDialog
-from PySide6.QtCore import Qt, QEvent, Signal, QObject
+from PySide6.QtCore import Qt, QEvent
 from PySide6.QtGui import QColor
 from pathlib import Path
-from core.file_scanner import scan_video_files
-from core.command_builder import CommandBuilder
+from core.file_scanner import is_audio_file, scan_video_files
+from core.command_builder import CommandBuilder, OUTPUT_METER_PARAMS
 from core.executor import Executor
-import threading
+from core.loudness_cache import LoudnessCache
+from core.log_capture import LogCapture, spill_path
+from core.cpu_budget import CpuBudget
+from core.job_scheduler import DECODE, ENCODE, JobScheduler, Priority
 from ui_parts.file_select_widget import FileSelectWidget
+from ui_parts.job_events import JobEventBridge
 from ui_parts.log_console_widget import LogConsoleWidget
 from ui_parts.external_storage_file_adder import ExternalStorageFileAdder
 import os
 import re
 
-class LoudnessPage(QWidget):
-    # Signal定義
-    update_status = Signal(int, str)
-    update_log = Signal(int, str)
-    append_logbox = Signal(str)
+# 音声のみのファイルを同時に補正する数（loudnormは1スレッドで動くためCPUコア数まで。スケジューラのdecode枠で制限される）
+AUDIO_WORKERS = os.cpu_count() or 1
 
+class LoudnessPage(QWidget):
     def __init__(self, concat_page=None, measure_page=None):
         super().__init__()
         self.concat_page = concat_page
@@ -37,14 +39,15 @@ class LoudnessPage(QWidget):
         self.ext_storage_adder.files_found.connect(self.file_select.add_files)
         layout.addWidget(self.ext_storage_adder)
         # ファイルリスト
-        self.table = QTableWidget(0, 3)
-        self.table.setHorizontalHeaderLabels(["ファイル名", "状態", "ログ"])
+        self.table = QTableWidget(0, 4)
+        self.table.setHorizontalHeaderLabels(["ファイル名", "状態", "進捗", "ログ"])
         self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
         self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
         header = self.table.horizontalHeader()
         header.setSectionResizeMode(0, QHeaderView.Stretch)  # ファイル名列は伸縮
         header.setSectionResizeMode(1, QHeaderView.ResizeToContents)  # 状態
-        header.setSectionResizeMode(2, QHeaderView.ResizeToContents)  # ログ
+        header.setSectionResizeMode(2, QHeaderView.ResizeToContents)  # 進捗
+        header.setSectionResizeMode(3, QHeaderView.ResizeToContents)  # ログ
         self.table.verticalHeader().setDefaultSectionSize(26)  # 行高さ詰める
         self.table.setStyleSheet("""
             QTableWidget { padding: 0; margin: 0; gridline-color: #44475a; }
@@ -56,11 +59,21 @@ class LoudnessPage(QWidget):
         self.chk_dynaudnorm = QCheckBox("dynaudnorm（自動音量均一化）を有効にする")
         self.chk_dynaudnorm.setChecked(False)
         layout.addWidget(self.chk_dynaudnorm)
+        # dynaudnormをNumPyエンジンで処理するチェックボックス
+        self.chk_numpy_dynaudnorm = QCheckBox("dynaudnormをNumPyエンジンで処理する（高速）")
+        self.chk_numpy_dynaudnorm.setToolTip("音量均一化をプロセス内のNumPyエンジンで行い、ffmpegはデコードとloudnorm・エンコードのみ行います。出力はdynaudnormと±0.1LU以内で一致します。")
+        self.chk_numpy_dynaudnorm.setChecked(False)
+        layout.addWidget(self.chk_numpy_dynaudnorm)
         # 素材用最適化チェックボックス
         self.chk_material = QCheckBox("素材用に最適化（-18LUFS/音質優先/均一化）")
         self.chk_material.setToolTip("編集素材用途向け。音質を最大限維持しつつ全クリップの音量を均一化します。ラウドネス-18LUFS/ピーク-1dBTPで揃えます。")
         self.chk_material.setChecked(False)
         layout.addWidget(self.chk_material)
+        # 1パス書き出しモードチェックボックス
+        self.chk_single_pass = QCheckBox("1パスで書き出す（一時ファイルを作らず映像コピー＋補正音声を直接mux）")
+        self.chk_single_pass.setToolTip("解析後、映像をストリームコピーしつつ補正済み音声を1回のffmpegで最終ファイルへ書き出します。ディスクI/Oが約半分になります。")
+        self.chk_single_pass.setChecked(True)
+        layout.addWidget(self.chk_single_pass)
         # 書き出しフォルダ選択UI
         folder_layout = QHBoxLayout()
         self.edit_outdir = QLineEdit()
@@ -94,15 +107,27 @@ class LoudnessPage(QWidget):
         self.log_console = LogConsoleWidget()
         layout.addWidget(self.log_console)
         # ファイルリスト管理はfile_selectに一元化
-        # Signal接続
-        self.update_status.connect(self._update_status)
-        self.update_log.connect(self._update_log)
-        self.append_logbox.connect(self.log_console.append)
+        # 補正ジョブ（ファイルごとの子ジョブを含む）の通知はスケジューラのイベントチャネルからメインスレッドで受け取る
+        JobEventBridge.instance().connect_group("loudness", self._on_job_event)
 
-    def _update_status(self, row: int, status: str):
-        self.table.setItem(row, 1, QTableWidgetItem(status))
-    def _update_log(self, row: int, log: str):
-        self.table.setItem(row, 2, QTableWidgetItem(log[-80:]))
+    def _on_job_event(self, event):
+        # ジョブからの通知（メインスレッドで呼ばれる）
+        if event.kind == "log":
+            self.log_console.append(event.data)
+        elif event.kind == "status":
+            row, status, color = event.data
+            item = QTableWidgetItem(status)
+            if color:
+                item.setForeground(QColor(color))
+            self.table.setItem(row, 1, item)
+        elif event.kind == "progress":
+            row, text = event.data
+            self.table.setItem(row, 2, QTableWidgetItem(text))
+        elif event.kind == "row_log":
+            row, line = event.data
+            self.table.setItem(row, 3, QTableWidgetItem(line[-80:]))
+        elif event.kind == "failed":
+            self.log_console.append(f"[エラー] {event.name}に失敗しました: {event.data}")
 
     def on_files_changed(self, files):
         self.file_paths = files
@@ -141,6 +166,8 @@ class LoudnessPage(QWidget):
     def run_loudness(self):
         use_dynaudnorm = self.chk_dynaudnorm.isChecked() and not self.chk_material.isChecked()
         material_mode = self.chk_material.isChecked()
+        single_pass = self.chk_single_pass.isChecked()
+        numpy_dynaudnorm = use_dynaudnorm and self.chk_numpy_dynaudnorm.isChecked()
         def parse_loudnorm_summary(log_lines):
             summary = {}
             def safe_float(val):
@@ -163,106 +190,159 @@ class LoudnessPage(QWidget):
                 elif 'WARNING' in line.upper() or 'clipping' in line.lower():
                     summary['warning'] = line.strip()
             return summary
-        def task():
-            from core.ffprobe_loudness import FFprobeLoudness
-            for idx, file_path in enumerate(self.file_paths):
-                row = self.status_map[file_path]
-                self.update_status.emit(row, "実行中")
+        # 補正中にファイルリストや出力先が変更されても影響しないよう、投入時点の状態を写し取る
+        file_paths = list(self.file_paths)
+        rows = dict(getattr(self, 'status_map', {}))
+        output_dir = self.output_dir
+        def task(ctx):
+            from core.media_analysis import MediaAnalysis
+            # 全ファイルを先にまとめて解析（短いクリップは複数入力を1回のffmpeg実行で処理）
+            ctx.log(f"[解析] {len(file_paths)}件の音声を解析中...")
+            analyses = MediaAnalysis.analyze_many([Path(f) for f in file_paths])
+            def process_file(file_path, cpu):
+                row = rows[file_path]
+                ctx.emit("status", (row, "実行中", None))
                 input_path = Path(file_path)
-                out_dir = Path(self.output_dir) if self.output_dir else input_path.parent
+                out_dir = Path(output_dir) if output_dir else input_path.parent
                 out_name = input_path.stem + ("_mat-18LUFS" if material_mode else "_norm-14LUFS") + input_path.suffix
                 output_path = out_dir / out_name
+                # 音声のみのファイルは映像の抽出・マージを行わず1プロセスで書き出す
+                audio_only = is_audio_file(input_path)
+                def on_progress(event, step=""):
+                    ctx.emit("progress", (row, f"{step}{event.format()}"))
 
-                # まず音声ストリーム有無を判定
-                if not FFprobeLoudness.has_audio_stream(input_path):
+                # 音声ストリーム有無・無音判定・loudnorm測定値（解析済み）
+                analysis = analyses[str(input_path)]
+                if analysis.error:
+                    ctx.log(f"[警告] {input_path.name}: 解析に失敗しました ({analysis.error})")
+                silent_reason = None
+                if not analysis.has_audio:
+                    silent_reason = "音声ストリームが無いため"
+                elif analysis.is_silent():
+                    # 音声ストリームがあり、かつ完全無音の場合もコピー
+                    silent_reason = "音声ストリームが無音のため"
+                if silent_reason:
                     # 無音ファイルはffmpegでそのままコピー
-                    self.append_logbox.emit(f"[コピー] {input_path.name} は音声ストリームが無いため無加工コピー")
-                    cmd = [
-                        "ffmpeg", "-y", "-i", str(input_path), "-c", "copy", str(output_path)
-                    ]
-                    ret = Executor.run_command(cmd)
-                    if ret == 0:
-                        status_item = QTableWidgetItem("無音: コピー")
-                        status_item.setForeground(QColor("blue"))
-                        self.table.setItem(row, 1, status_item)
-                        if self.concat_page is not None:
-                            self.concat_page.add_files_signal.emit([str(output_path)])
-                    else:
-                        fail_item = QTableWidgetItem("コピー失敗")
-                        fail_item.setForeground(QColor("red"))
-                        self.table.setItem(row, 1, fail_item)
-                        self.append_logbox.emit(f"[エラー] {input_path.name}: コピー失敗")
-                    continue
-
-                # 音声ストリームがあり、かつ完全無音の場合もコピー
-                if FFprobeLoudness.is_silent(input_path):
-                    self.append_logbox.emit(f"[コピー] {input_path.name} は音声ストリームが無音のため無加工コピー")
+                    ctx.log(f"[コピー] {input_path.name} は{silent_reason}無加工コピー")
                     cmd = [
                         "ffmpeg", "-y", "-i", str(input_path), "-c", "copy", str(output_path)
                     ]
-                    ret = Executor.run_command(cmd)
+                    ret = Executor.run_command(cmd, progress_callback=on_progress, duration=analysis.duration, affinity=cpu.cores)
                     if ret == 0:
-                        status_item = QTableWidgetItem("無音: コピー")
-                        status_item.setForeground(QColor("blue"))
-                        self.table.setItem(row, 1, status_item)
+                        ctx.emit("status", (row, "無音: コピー", "blue"))
                         if self.concat_page is not None:
                             self.concat_page.add_files_signal.emit([str(output_path)])
                     else:
-                        fail_item = QTableWidgetItem("コピー失敗")
-                        fail_item.setForeground(QColor("red"))
-                        self.table.setItem(row, 1, fail_item)
-                        self.append_logbox.emit(f"[エラー] {input_path.name}: コピー失敗")
-                    continue
+                        ctx.emit("status", (row, "コピー失敗", "red"))
+                        ctx.log(f"[エラー] {input_path.name}: コピー失敗")
+                    return
 
                 # 映像と音声を分離して処理する新しいフロー
                 tp_limit = -1.5
-                self.append_logbox.emit(f"[処理] {input_path.name} を処理中...")
+                ctx.log(f"[処理] {input_path.name} を処理中...")
                 
+                cmds = []
+                # 書き出しログは末尾と重要行だけをメモリに残し、全文は圧縮して書き出す（失敗時のみ残す）
+                render_log = LogCapture(spill_path=spill_path(output_path.name))
                 try:
-                    # コマンドを生成（複数のコマンドが返される）
-                    cmds = CommandBuilder.build_loudness_normalization_cmd(
-                        input_path, output_path,
-                        use_dynaudnorm=use_dynaudnorm,
-                        material_mode=material_mode,
-                        measured_params=None,
-                        true_peak_limit=tp_limit,
-                        add_limiter=True
-                    )
-                    
-                    # 1. 映像を抽出（再エンコードなし）
-                    self.append_logbox.emit(f"[1/3] 映像を抽出中...")
-                    ret = Executor.run_command(cmds[0])
-                    if ret != 0:
-                        raise Exception("映像の抽出に失敗しました")
-                    
-                    # 2. 音声を抽出して補正
-                    self.append_logbox.emit(f"[2/3] 音声を補正中...")
-                    
-                    # 音声抽出とフィルタリングをパイプで接続
-                    import subprocess
-                    extract_proc = subprocess.Popen(cmds[1], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                    filter_proc = subprocess.Popen(
-                        cmds[2], 
-                        stdin=extract_proc.stdout,
-                        stdout=subprocess.PIPE,
-                        stderr=subprocess.PIPE
-                    )
-                    
-                    # プロセスの終了を待機
-                    _, stderr = filter_proc.communicate()
-                    if filter_proc.returncode != 0:
-                        raise Exception(f"音声の補正に失敗しました: {stderr.decode('utf-8', errors='ignore')}")
-                    
-                    # 3. 映像と補正済み音声をマージ
-                    self.append_logbox.emit(f"[3/3] 映像と音声をマージ中...")
-                    ret = Executor.run_command(cmds[3])
-                    if ret != 0:
-                        raise Exception("映像と音声のマージに失敗しました")
+                    if numpy_dynaudnorm:
+                        # 均一化はNumPyエンジン、後段のloudnorm（均一化後の信号を測っていないため1パス動作）とエンコードはffmpeg
+                        from core.dynamic_normalizer import normalize_file
+                        ctx.log(f"[1/1] NumPyエンジンで音量均一化しながら書き出し中...")
+                        post_af = CommandBuilder.build_loudness_filter(
+                            None, use_dynaudnorm=False, true_peak_limit=tp_limit, add_limiter=True
+                        )
+                        ret, log_text = normalize_file(
+                            input_path, output_path, post_af, measure_output=True,
+                            log_callback=lambda line: ctx.emit("row_log", (row, line)),
+                            audio_codec=analysis.audio_codec,
+                            progress_callback=on_progress, duration=analysis.duration
+                        )
+                        render_log.extend(log_text.splitlines())
+                        if ret != 0:
+                            raise Exception("補正済みファイルの書き出しに失敗しました")
+                    else:
+                        # 補正方式（一定ゲインで足りるか）をログに出す
+                        _, filter_mode = CommandBuilder.plan_loudness_filter(
+                            analysis.loudness,
+                            use_dynaudnorm=use_dynaudnorm,
+                            material_mode=material_mode,
+                            true_peak_limit=tp_limit,
+                            add_limiter=True
+                        )
+                        if filter_mode == 'linear':
+                            ctx.log(f"[方式] {input_path.name}: 一定ゲイン(volume)で補正します（loudnorm・リミッタ省略）")
+                        else:
+                            ctx.log(f"[方式] {input_path.name}: loudnormで補正します")
+                        # コマンドを生成（複数のコマンドが返される）
+                        cmds = CommandBuilder.build_loudness_normalization_cmd(
+                            input_path, output_path,
+                            use_dynaudnorm=use_dynaudnorm,
+                            material_mode=material_mode,
+                            measured_params=analysis.loudness,
+                            true_peak_limit=tp_limit,
+                            add_limiter=True,
+                            single_pass=single_pass,
+                            measure_output=True,
+                            audio_codec=analysis.audio_codec,
+                            sample_rate=analysis.sample_rate,
+                            threads=cpu.threads
+                        )
+
+                        if single_pass or audio_only:
+                            # 映像コピー＋補正音声（音声のみのファイルは補正音声だけ）を1プロセスで書き出し
+                            label = "音声補正" if audio_only else "映像コピー＋音声補正"
+                            ctx.log(f"[1/1] {input_path.name}: {label}を書き出し中...")
+                            def on_line(line):
+                                render_log.append(line)
+                                ctx.emit("row_log", (row, line))
+                            ret = Executor.run_command(cmds[0], on_line, progress_callback=on_progress,
+                                                       duration=analysis.duration, affinity=cpu.cores)
+                            if ret != 0:
+                                raise Exception("補正済みファイルの書き出しに失敗しました")
+                        else:
+                            # 1. 映像を抽出（再エンコードなし）
+                            ctx.log(f"[1/3] 映像を抽出中...")
+                            ret = Executor.run_command(cmds[0], progress_callback=lambda e: on_progress(e, "1/3 "),
+                                                       duration=analysis.duration, affinity=cpu.cores)
+                            if ret != 0:
+                                raise Exception("映像の抽出に失敗しました")
+                        
+                            # 2. 音声を抽出して補正
+                            ctx.log(f"[2/3] 音声を補正中...")
+                        
+                            # 音声抽出とフィルタリングをパイプで接続（両段のstderrを読み続け、どちらの失敗も検出）
+                            from core.pipeline import Pipeline
+                            def on_stage_line(stage, line):
+                                if stage == 1:
+                                    render_log.append(line)
+                                    ctx.emit("row_log", (row, line))
+                            result = Pipeline([cmds[1], cmds[2]], log_callback=on_stage_line).run()
+                            if not result.ok:
+                                raise Exception(f"音声の補正に失敗しました: {result.error_message()}")
+                        
+                            # 3. 映像と補正済み音声をマージ
+                            ctx.log(f"[3/3] 映像と音声をマージ中...")
+                            ret = Executor.run_command(cmds[3], progress_callback=lambda e: on_progress(e, "3/3 "),
+                                                       duration=analysis.duration, affinity=cpu.cores)
+                            if ret != 0:
+                                raise Exception("映像と音声のマージに失敗しました")
+                        
+                            # 一時ファイルのクリーンアップ
+                            import shutil
+                            shutil.rmtree(os.path.dirname(cmds[0][-1]), ignore_errors=True)
                     
                     # 成功時の処理
-                    status_item = QTableWidgetItem("完了")
-                    status_item.setForeground(QColor("green"))
-                    self.table.setItem(row, 1, status_item)
+                    ctx.emit("status", (row, "完了", "green"))
+
+                    # 書き出し時にebur128で測定した出力ラウドネス（再測定不要）
+                    output_loudness = MediaAnalysis.parse_ebur128_summary(render_log.text())
+                    if output_loudness:
+                        ctx.log(
+                            f"[出力測定] {output_path.name}: I={output_loudness['input_i']} LUFS / "
+                            f"TP={output_loudness['input_tp']} dBTP / LRA={output_loudness['input_lra']} LU"
+                        )
+                        LoudnessCache.default().put(output_path, "full", OUTPUT_METER_PARAMS, output_loudness)
                     
                     # 結合ページのリストに追加
                     if self.concat_page is not None:
@@ -270,20 +350,55 @@ class LoudnessPage(QWidget):
                     # ラウドネス測定ページのファイルリストにも追加
                     if hasattr(self, 'measure_page') and self.measure_page is not None:
                         self.measure_page.add_files_signal.emit([str(output_path)])
+                        if output_loudness:
+                            self.measure_page.add_result_signal.emit(str(output_path), output_loudness)
                         
                 except Exception as e:
                     # エラー処理
                     error_msg = str(e)
-                    self.append_logbox.emit(f"[エラー] {input_path.name}: {error_msg}")
-                    fail_item = QTableWidgetItem("失敗")
-                    fail_item.setForeground(QColor("red"))
-                    self.table.setItem(row, 1, fail_item)
+                    ctx.log(f"[エラー] {input_path.name}: {error_msg}")
+                    if render_log.total_lines:
+                        ctx.log(f"[ログ] 全ログ: {render_log.spill_path}")
+                    ctx.emit("status", (row, "失敗", "red"))
                     
-                    # 一時ファイルのクリーンアップ
+                    # 一時ファイルのクリーンアップ（1パスモードでは一時ファイルなし）
                     import shutil
-                    temp_dir = os.path.dirname(cmds[0][-1]) if cmds and len(cmds) > 0 and len(cmds[0]) > 0 else None
+                    temp_dir = os.path.dirname(cmds[0][-1]) if not (single_pass or audio_only) and cmds and len(cmds) > 0 and len(cmds[0]) > 0 else None
                     if temp_dir and os.path.exists(temp_dir):
                         shutil.rmtree(temp_dir, ignore_errors=True)
-                
+                    render_log.close()
+                    return
+                render_log.close()
+                render_log.spill_path.unlink(missing_ok=True)
+
+            # ファイルごとに子ジョブを投入する。音声のみのファイルはffmpeg 1プロセスで完結するためdecode枠で並列に、
+            # 動画はencode枠で処理する（同時に動く数はスケジューラが他ページのジョブと合わせて決める）
+            audio_files = [f for f in file_paths if is_audio_file(f)]
+            video_files = [f for f in file_paths if not is_audio_file(f)]
+            budget = CpuBudget.default()
+            scheduler = JobScheduler.default()
+            def file_job(file_path, threads=None):
+                def run(child_ctx):
+                    ctx.check_cancelled()
+                    # ジョブごとにコアを割り当て、ffmpegの-threads・コアの固定に反映する
+                    with budget.allocate(threads) as cpu:
+                        process_file(file_path, cpu)
+                return run
+            # 並列の音声ジョブはコアを等分し、動画は実行中のencode枠・asr枠のジョブで等分した数を使う（空くまで待つ）
+            audio_threads = budget.share(min(AUDIO_WORKERS, len(audio_files)) + (1 if video_files else 0))
+            children = []
+            for file_path in audio_files:
+                children.append(scheduler.submit(f"ラウドネス補正: {Path(file_path).name}", file_job(file_path, audio_threads),
+                                                 resources={DECODE: 1}, priority=Priority.BATCH))
+            for file_path in video_files:
+                children.append(scheduler.submit(f"ラウドネス補正: {Path(file_path).name}", file_job(file_path),
+                                                 resources={ENCODE: 1}, priority=Priority.BATCH))
+            ctx.on_cancel(lambda: [scheduler.cancel(child) for child in children])
+            for child in children:
+                child.wait()
+                if child.error is not None:
+                    ctx.log(f"[エラー] {child.name}: {child.error}")
 
-        threading.Thread(target=task, daemon=True).start()
+        # 全体の管理ジョブ（リソースは子ジョブ側で確保する）
+        if JobScheduler.default().submit("ラウドネス補正", task, priority=Priority.BATCH, group="loudness") is None:
+            self.log_console.append("[エラー] ラウドネス補正を実行中です")
@@ -1,11 +1,12 @@
 """
 オープニング生成ページUI
 """
-from PySide6.QtWidgets import QWidget, QVBoxLayout, QLabel, QPushButton, QLineEdit, QFileDialog
+from PySide6.QtWidgets import QWidget, QVBoxLayout, QLabel, QPushButton, QLineEdit, QFileDialog, QProgressBar
 from PySide6.QtCore import Qt
 from core.opening_generator import OpeningGenerator
 import os
-import threading
+from core.job_scheduler import ENCODE, JobScheduler, Priority
+from ui_parts.job_events import JobEventBridge
 
 class OpeningGeneratorPage(QWidget):
     def __init__(self, parent=None):
@@ -41,11 +42,18 @@ class OpeningGeneratorPage(QWidget):
         self.btn_generate = QPushButton("オープニング生成")
         self.btn_generate.clicked.connect(self.run_generate)
         layout.addWidget(self.btn_generate)
+        # 進捗バー
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 100)
+        self.progress_bar.setValue(0)
+        layout.addWidget(self.progress_bar)
         # ログ表示
         self.log_label = QLabel()
         self.log_label.setWordWrap(True)
         layout.addWidget(self.log_label)
         self.setLayout(layout)
+        # ジョブの通知はスケジューラのイベントチャネルからメインスレッドで受け取る
+        JobEventBridge.instance().connect_group("opening", self._on_job_event)
 
     def select_output(self):
         file, _ = QFileDialog.getSaveFileName(self, "出力ファイル選択", "", "動画ファイル (*.mp4 *.mov)")
@@ -62,16 +70,29 @@ class OpeningGeneratorPage(QWidget):
             self.log_label.setText("[エラー] 出力ファイルを指定してください")
             return
         self.btn_generate.setEnabled(False)
+        self.progress_bar.setValue(0)
+        self.progress_bar.setFormat("%p%")
         self.log_label.setText("生成中...")
-        def task():
-            try:
-                result = OpeningGenerator.generate_opening(text, output, self.log_label.setText)
-                if result:
-                    self.log_label.setText(f"[完了] {output}")
-                else:
-                    self.log_label.setText("[エラー] 生成に失敗しました")
-            except Exception as e:
-                self.log_label.setText(f"[エラー] {e}")
-            finally:
-                self.btn_generate.setEnabled(True)
-        threading.Thread(target=task, daemon=True).start()
+        def task(ctx):
+            def on_progress(event):
+                ctx.emit("progress", (int(event.percent or 0), event.format()))
+            return output if OpeningGenerator.generate_opening(text, output, ctx.log, on_progress) else None
+        # 短い書き出しなので対話的な優先度で投入（結果はイベントでメインスレッドに届く）
+        job = JobScheduler.default().submit("オープニング生成", task, resources={ENCODE: 1},
+                                            priority=Priority.INTERACTIVE, group="opening")
+        if job is None:
+            self.log_label.setText("[エラー] 生成中です")
+
+    def _on_job_event(self, event):
+        if event.kind == "log":
+            self.log_label.setText(event.data)
+        elif event.kind == "progress":
+            percent, text = event.data
+            self.progress_bar.setValue(percent)
+            self.progress_bar.setFormat(text)
+        elif event.kind == "finished":
+            self.log_label.setText(f"[完了] {event.data}" if event.data else "[エラー] 生成に失敗しました")
+        elif event.kind == "failed":
+            self.log_label.setText(f"[エラー] {event.data}")
+        if event.kind in ("finished", "failed", "cancelled"):
+            self.btn_generate.setEnabled(True)
@@ -1,13 +1,17 @@
-from PySide6.QtWidgets import QWidget, QVBoxLayout, QLabel, QPushButton, QMessageBox, QListWidget, QComboBox, QCheckBox, QLineEdit
+from PySide6.QtWidgets import QWidget, QVBoxLayout, QLabel, QPushButton, QMessageBox, QListWidget, QComboBox, QCheckBox, QLineEdit, QProgressBar
 from PySide6.QtGui import QPixmap
 from PySide6.QtCore import Qt
 from ui_parts.file_select_widget import FileSelectWidget
 from ui_parts.log_console_widget import LogConsoleWidget
 from core.slideshow_builder import SlideshowBuilder
-import threading
+from core.job_scheduler import ENCODE, JobScheduler
+from ui_parts.job_events import JobEventBridge
 from pathlib import Path
 import os
 
+# 4K画像の変換・エンコード中に使う見込みのメモリ(MB)
+SLIDESHOW_RAM_MB = 1024
+
 class SlideshowPage(QWidget):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -50,10 +54,17 @@ class SlideshowPage(QWidget):
         self.btn_generate = QPushButton("スライドショー生成")
         self.btn_generate.clicked.connect(self.on_generate_slideshow)
         layout.addWidget(self.btn_generate)
+        # 進捗バー（動画生成のエンコード）
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 100)
+        self.progress_bar.setValue(0)
+        layout.addWidget(self.progress_bar)
         # ffmpegログ表示
         self.log_console = LogConsoleWidget()
         layout.addWidget(self.log_console)
         self.setLayout(layout)
+        # ジョブの通知はスケジューラのイベントチャネルからメインスレッドで受け取る
+        JobEventBridge.instance().connect_group("slideshow", self._on_job_event)
 
     def _get_se_files(self):
         se_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "assets", "se")
@@ -94,17 +105,38 @@ class SlideshowPage(QWidget):
         exif_enable = self.exif_checkbox.isChecked()
         outdir = str(Path(file_list[0]).parent)
         self.btn_generate.setEnabled(False)
+        self.progress_bar.setValue(0)
+        self.progress_bar.setFormat("%p%")
         self.log_console.append("[INFO] スライドショー生成を開始します...")
         # Exif情報がない場合のテキストを取得
         exif_missing_text = self.exif_missing_text_input.text().strip()
-        def task():
-            output = SlideshowBuilder.run_slideshow(
-                file_list, outdir, log_func=self.log_console.append, duration_per_image=5, se_path=se_path, exif_enable=exif_enable, exif_missing_text=exif_missing_text)
-            if output:
-                self.log_console.append(f"[完了] 動画ファイル: {output}")
+        def task(ctx):
+            def on_progress(event):
+                ctx.emit("progress", (int(event.percent or 0), event.format()))
+            return SlideshowBuilder.run_slideshow(
+                file_list, outdir, log_func=ctx.log, duration_per_image=5, se_path=se_path, exif_enable=exif_enable, exif_missing_text=exif_missing_text,
+                progress_callback=on_progress)
+        # 4K画像の変換とエンコードを行うため、エンコード枠とメモリ予算を使うジョブとして投入
+        job = JobScheduler.default().submit("スライドショー生成", task, resources={ENCODE: 1},
+                                            ram_mb=SLIDESHOW_RAM_MB, group="slideshow")
+        if job is None:
+            self.log_console.append("[エラー] スライドショー生成中です")
+
+    def _on_job_event(self, event):
+        if event.kind == "log":
+            self.log_console.append(event.data)
+        elif event.kind == "progress":
+            percent, text = event.data
+            self.progress_bar.setValue(percent)
+            self.progress_bar.setFormat(text)
+        elif event.kind == "finished":
+            if event.data:
+                self.log_console.append(f"[完了] 動画ファイル: {event.data}")
             else:
                 self.log_console.append("[エラー] スライドショー生成に失敗しました")
+        elif event.kind == "failed":
+            self.log_console.append(f"[エラー] スライドショー生成に失敗しました: {event.data}")
+        if event.kind in ("finished", "failed", "cancelled"):
             self.btn_generate.setEnabled(True)
-        threading.Thread(target=task, daemon=True).start()
 
 # TODO: コア処理との連携・進捗表示・エラーハンドリング等を追加予定
@@ -1,10 +1,14 @@
 """
 動画結合ページUI
 """
-from PySide6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QLineEdit, QFileDialog, QListWidget
+from PySide6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QLineEdit, QFileDialog, QListWidget, QCheckBox, QProgressBar
 from ui_parts.file_select_widget import FileSelectWidget
 from ui_parts.external_storage_file_adder import ExternalStorageFileAdder
 from ui_parts.log_console_widget import LogConsoleWidget
+from ui_parts.job_runner import JobRunner
+from core.cpu_budget import CpuBudget
+from core.job_scheduler import DECODE, ENCODE, JobScheduler
+from ui_parts.job_events import JobEventBridge
 from PySide6.QtCore import Qt, Signal
 from pathlib import Path
 
@@ -36,14 +40,82 @@ class VideoConcatPage(QWidget):
         self.outdir = None
         btn_outdir.clicked.connect(self.select_outdir)
         layout.addLayout(out_layout)
-        # 実行ボタン
+        # ラウドネス補正しながら結合
+        self.chk_normalize = QCheckBox("ラウドネス補正しながら結合（-14LUFS・クリップごとの中間ファイルなし）")
+        self.chk_normalize.setToolTip("各クリップを測定し、映像はコピーのまま音声だけクリップごとに補正して1回のffmpegで結合します。映像フォーマットがそろっている場合のみ使えます。")
+        self.chk_normalize.setChecked(False)
+        layout.addWidget(self.chk_normalize)
+        # 実行・キャンセルボタン
+        run_layout = QHBoxLayout()
         self.btn_run = QPushButton("結合実行")
-        layout.addWidget(self.btn_run)
+        run_layout.addWidget(self.btn_run)
+        self.btn_cancel = QPushButton("キャンセル")
+        self.btn_cancel.setEnabled(False)
+        run_layout.addWidget(self.btn_cancel)
+        layout.addLayout(run_layout)
+        # 進捗
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 100)
+        self.progress_bar.setValue(0)
+        layout.addWidget(self.progress_bar)
         # ログ
         self.log_console = LogConsoleWidget()
         layout.addWidget(self.log_console)
         self.btn_run.clicked.connect(self.run_concat)
         self.add_files_signal.connect(self.add_files)
+        # ffmpegはAsyncExecutor経由で実行（キャンセル時はプロセスグループごと終了）
+        self.job_runner = JobRunner(parent=self)
+        self.btn_cancel.clicked.connect(self.cancel_jobs)
+        # 結合ジョブの通知はスケジューラのイベントチャネルからメインスレッドで受け取る
+        JobEventBridge.instance().connect_group("concat", self._on_job_event)
+    def _on_job_event(self, event):
+        # ジョブからの通知（メインスレッドで呼ばれる）
+        if event.kind == "log":
+            self.log_console.append(event.data)
+        elif event.kind == "progress":
+            percent, text = event.data
+            self.progress_bar.setValue(percent)
+            self.progress_bar.setFormat(text)
+        elif event.kind == "complete":
+            self.concatenation_complete.emit(event.data)
+        elif event.kind == "started":
+            self._set_running(True)
+        elif event.kind == "failed":
+            self.log_console.append(f"[エラー] {event.name}に失敗しました: {event.data}")
+        if event.kind in ("finished", "failed", "cancelled"):
+            self._set_running(False)
+    def cancel_jobs(self):
+        # 待機中の結合ジョブを取り除き、実行中のffmpegを停止する
+        JobScheduler.default().cancel_group("concat")
+        self.job_runner.cancel()
+    def _set_running(self, running: bool):
+        self.btn_run.setEnabled(not running)
+        self.btn_cancel.setEnabled(running)
+    def _run_job(self, ctx, cmd, duration, affinity=None):
+        """
+        ジョブのスレッドからffmpegを実行し、ログ・進捗をジョブのイベントとして流してJobResultを返す
+        """
+        def on_progress(event):
+            ctx.emit("progress", (int(event.percent or 0), event.format()))
+        result = self.job_runner.run(cmd, duration=duration, affinity=affinity,
+                                     log_callback=ctx.log, progress_callback=on_progress)
+        if result.resources is not None:
+            ctx.log(f"[リソース] {result.resources.format()}")
+        if result.cancelled:
+            ctx.log("[中止] 結合をキャンセルしました")
+        elif result.stalled:
+            ctx.log("[エラー] ffmpegの進捗が止まったため中止しました")
+        return result
+    @staticmethod
+    def _total_duration(files):
+        """
+        結合後の長さ（各ファイルの長さの合計。取得できなければNone）
+        """
+        from core.ffprobe_loudness import FFprobeLoudness
+        try:
+            return sum(FFprobeLoudness.get_duration(Path(f)) for f in files)
+        except Exception:
+            return None
     def select_outdir(self):
         dir_path = QFileDialog.getExistingDirectory(self, "保存先フォルダを選択")
         if dir_path:
@@ -56,32 +128,96 @@ class VideoConcatPage(QWidget):
         outdir = Path(self.outdir) if self.outdir else Path(files[0]).parent
         outfile = outdir / self.edit_outfile.text()
         from core.command_builder import CommandBuilder
-        cmd, concat_list_path, need_reencode, format_list, force_reason = CommandBuilder.build_video_concat_cmd(files, outfile)
-        import threading, os
-        def task():
-            # フォーマット判定ログ
-            if force_reason:
-                self.log_console.append(f"[INFO] {force_reason}")
-            elif need_reencode:
-                self.log_console.append("[INFO] 異なるフォーマットの動画が混在していて再エンコードして結合します（HWエンコード:h264_videotoolbox）")
-            else:
-                self.log_console.append("[INFO] 全て同一フォーマットのため再エンコードなしで結合します (-c copy)")
-            self.log_console.append(f"結合コマンド実行: {' '.join(cmd)}")
-            # 詳細フォーマット情報も表示
-            for i, fmt in enumerate(format_list):
-                self.log_console.append(f"[{i+1}] {files[i]} → {fmt}")
-            from core.executor import Executor
-            ret = Executor.run_command(cmd, self.log_console.append)
-            if ret == 0:
-                self.log_console.append(f"結合完了: {outfile}")
-                # Emit signal with the output file path
-                self.concatenation_complete.emit(str(outfile))
-            else:
-                self.log_console.append("[エラー] 結合に失敗しました")
-            # 一時リストファイル削除
-            if concat_list_path and os.path.exists(concat_list_path):
-                os.remove(concat_list_path)
-        threading.Thread(target=task, daemon=True).start()
+        if self.chk_normalize.isChecked():
+            self.run_normalized_concat(files, outfile)
+            return
+        import os
+        def task(ctx):
+            # ジョブ終了まで割り当てたコア数だけffmpegに使わせる（コマンド生成もジョブ内で行い、待機中はコアを確保しない）
+            with CpuBudget.default().allocate() as cpu:
+                try:
+                    cmd, concat_list_path, need_reencode, format_list, force_reason = CommandBuilder.build_video_concat_cmd(
+                        files, outfile, threads=cpu.threads, log_func=ctx.log)
+                except Exception as e:
+                    ctx.log(f"[エラー] 結合コマンドを作成できませんでした: {e}")
+                    return
+                # フォーマット判定ログ
+                if force_reason:
+                    ctx.log(f"[INFO] {force_reason}")
+                elif need_reencode:
+                    ctx.log(f"[INFO] 異なるフォーマットの動画が混在していて再エンコードして結合します（エンコーダ: {cmd[cmd.index('-c:v') + 1]}）")
+                else:
+                    ctx.log("[INFO] 全て同一フォーマットのため再エンコードなしで結合します (-c copy)")
+                ctx.log(f"結合コマンド実行: {' '.join(cmd)}")
+                # 詳細フォーマット情報も表示（取得時間つき。再エンコード確定後に取得を省略したファイルはその旨）
+                for i, fmt in enumerate(format_list):
+                    if fmt.get('skipped'):
+                        ctx.log(f"[{i+1}] {files[i]} → 取得省略")
+                        continue
+                    info = {k: v for k, v in fmt.items() if k != 'probe_sec'}
+                    ctx.log(f"[{i+1}] {files[i]} → {info} ({fmt['probe_sec']:.2f}秒)")
+                duration = self._total_duration(files)
+                ctx.check_cancelled()
+                result = self._run_job(ctx, cmd, duration, cpu.cores)
+                if result.ok:
+                    ctx.log(f"結合完了: {outfile}")
+                    # 結合後のファイルはAIジェットカットページへ渡す（メインスレッドでconcatenation_completeを通知）
+                    ctx.emit("complete", str(outfile))
+                else:
+                    ctx.log("[エラー] 結合に失敗しました")
+                # 一時リストファイル削除
+                if concat_list_path and os.path.exists(concat_list_path):
+                    os.remove(concat_list_path)
+        if JobScheduler.default().submit("動画結合", task, resources={ENCODE: 1}, group="concat") is None:
+            self.log_console.append("[エラー] 結合を実行中です")
+    def run_normalized_concat(self, files, outfile):
+        """
+        全クリップを一括測定してから、補正と結合を1回のffmpeg実行で行う
+        """
+        import os
+        def task(ctx):
+            from core.command_builder import CommandBuilder
+            from core.media_analysis import MediaAnalysis
+            ctx.log(f"[測定] {len(files)}件のクリップを測定中...")
+            analyses = MediaAnalysis.analyze_many([Path(f) for f in files])
+            ctx.check_cancelled()
+            analyses = {f: analyses[str(Path(f))] for f in files}
+            failed = [f for f in files if analyses[f].error]
+            if failed:
+                ctx.log(f"[エラー] 測定に失敗しました: {', '.join(failed)}")
+                return
+            with CpuBudget.default().allocate() as cpu:
+                try:
+                    cmd, concat_list_path, format_list, modes = CommandBuilder.build_normalized_concat_cmd(
+                        files, outfile, analyses, measure_output=True, threads=cpu.threads,
+                        log_func=ctx.log
+                    )
+                except ValueError as e:
+                    ctx.log(f"[エラー] {e}")
+                    return
+                for i, (fmt, mode) in enumerate(zip(format_list, modes)):
+                    ctx.log(f"[{i+1}] {files[i]} → {fmt} / 補正: {mode}")
+                ctx.log(f"結合コマンド実行: {' '.join(cmd)}")
+                result = self._run_job(ctx, cmd, sum(analyses[f].duration or 0 for f in files) or None, cpu.cores)
+                if result.ok:
+                    output_loudness = MediaAnalysis.parse_ebur128_summary("\n".join(result.log))
+                    if output_loudness:
+                        ctx.log(
+                            f"[出力測定] {outfile.name}: I={output_loudness['input_i']} LUFS / "
+                            f"TP={output_loudness['input_tp']} dBTP / LRA={output_loudness['input_lra']} LU"
+                        )
+                        from core.command_builder import OUTPUT_METER_PARAMS
+                        from core.loudness_cache import LoudnessCache
+                        LoudnessCache.default().put(outfile, "full", OUTPUT_METER_PARAMS, output_loudness)
+                    ctx.log(f"結合完了: {outfile}")
+                    ctx.emit("complete", str(outfile))
+                else:
+                    ctx.log("[エラー] 結合に失敗しました")
+                if concat_list_path and os.path.exists(concat_list_path):
+                    os.remove(concat_list_path)
+        # 測定（デコード）と結合（音声の再エンコード）を1つのジョブで行う
+        if JobScheduler.default().submit("補正しながら結合", task, resources={DECODE: 1, ENCODE: 1}, group="concat") is None:
+            self.log_console.append("[エラー] 結合を実行中です")
     def update_file_list(self, files):
         self.list_files.clear()
         for f in files:
@@ -4,12 +4,12 @@
 from PySide6.QtWidgets import QWidget, QVBoxLayout, QPushButton, QFileDialog, QAbstractItemView
 from PySide6.QtCore import Qt, QEvent, Signal
 from pathlib import Path
-from core.file_scanner import scan_video_files
+from core.file_scanner import scan_media_files
 
 class FileSelectWidget(QWidget):
     files_changed = Signal(list)  # ファイルリストが変わったとき通知
 
-    def __init__(self, file_types=("*.mp4", "*.mov", "*.mkv", "*.wav", "*.aac", "*.mp3")):
+    def __init__(self, file_types=("*.mp4", "*.mov", "*.mkv", "*.wav", "*.aac", "*.mp3", "*.m4a", "*.flac")):
         super().__init__()
         self.file_types = file_types
         self.file_paths = []
@@ -63,7 +63,8 @@ class FileSelectWidget(QWidget):
             path = url.toLocalFile()
             p = Path(path)
             if p.is_dir():
-                files.extend(scan_video_files(p))
+                # フォルダ内の動画・音声のうち受け付ける種類のみ
+                files.extend(f for f in scan_media_files(p) if self._is_valid_file(f))
             elif self._is_valid_file(path):
                 files.append(Path(path))
         if files:
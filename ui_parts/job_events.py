@@ -0,0 +1,31 @@
+"""
+JobSchedulerのイベントチャネルをQtのSignalに変換する橋渡し
+ジョブのスレッドから届いたイベントを、Signal経由でメインスレッドのスロットに渡す
+"""
+from PySide6.QtCore import QObject, Signal
+from core.job_scheduler import JobScheduler
+
+class JobEventBridge(QObject):
+    event = Signal(object)  # JobEvent
+
+    _instance = None
+
+    def __init__(self, scheduler: JobScheduler = None, parent=None):
+        super().__init__(parent)
+        self.scheduler = scheduler or JobScheduler.default()
+        self._unsubscribe = self.scheduler.subscribe(self.event.emit)
+
+    @classmethod
+    def instance(cls) -> "JobEventBridge":
+        """
+        アプリ全体で共有するインスタンス（メインスレッドで作成されるよう、ページの__init__から呼ぶ）
+        """
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def connect_group(self, group: str, slot) -> None:
+        """
+        指定groupのイベントだけをslotに渡す（group名の前方一致。"loudness"なら"loudness/…"の子ジョブも含む）
+        """
+        self.event.connect(lambda e: slot(e) if e.group and (e.group == group or e.group.startswith(group + "/")) else None)
@@ -0,0 +1,50 @@
+"""
+AsyncExecutorをQtのページから使うための橋渡し
+ログ・進捗・完了をSignalで通知するため、ワーカースレッドから実行してもUIの更新はメインスレッドで行われる
+"""
+from PySide6.QtCore import QObject, Signal
+from core.async_executor import AsyncExecutor
+
+class JobRunner(QObject):
+    log_line = Signal(str)
+    progress = Signal(object)  # ProgressEvent
+    finished = Signal(object)  # JobResult
+
+    def __init__(self, executor: AsyncExecutor = None, parent=None):
+        super().__init__(parent)
+        self.executor = executor or AsyncExecutor.default()
+        self._handles = []
+
+    def start(self, cmd, duration=None, timeout=None, stall_timeout=None, affinity=None,
+              log_callback=None, progress_callback=None):
+        """
+        ジョブを投入してJobHandleを返す（終了時にfinishedを通知）
+        log_callback / progress_callback: 指定した場合はlog_line / progressの代わりに呼ぶ
+        （スケジューラのジョブから使う場合はJobContext.log / emitを渡し、ページのイベントチャネルで受け取る）
+        """
+        handle = self.executor.submit(
+            cmd, log_callback=log_callback or self.log_line.emit, progress_callback=progress_callback or self.progress.emit,
+            duration=duration, timeout=timeout, stall_timeout=stall_timeout, affinity=affinity
+        )
+        self._handles.append(handle)
+
+        def done(future):
+            self._handles.remove(handle)
+            if future.exception() is None:
+                self.finished.emit(future.result())
+        handle.future.add_done_callback(done)
+        return handle
+
+    def run(self, cmd, duration=None, timeout=None, stall_timeout=None, affinity=None,
+            log_callback=None, progress_callback=None):
+        """
+        ジョブを実行して終了まで待つ（ページのワーカースレッドから呼ぶ。戻り値はJobResult）
+        """
+        return self.start(cmd, duration, timeout, stall_timeout, affinity, log_callback, progress_callback).result()
+
+    def cancel(self):
+        """
+        実行中・待機中のジョブをすべてキャンセルする
+        """
+        for handle in list(self._handles):
+            handle.cancel()
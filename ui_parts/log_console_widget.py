@@ -4,6 +4,9 @@
 from PySide6.QtWidgets import QWidget, QVBoxLayout, QPushButton, QHBoxLayout, QTextEdit
 from PySide6.QtCore import Signal, Qt, QThread
 
+# ログコンソールに残す最大行数（古い行から捨てて長時間のバッチでもメモリを一定に保つ）
+MAX_LOG_BLOCKS = 5000
+
 class LogConsoleWidget(QWidget):
     append_log = Signal(str)
     clear_log = Signal()
@@ -14,6 +17,7 @@ class LogConsoleWidget(QWidget):
         layout = QVBoxLayout(self)
         self.log_box = QTextEdit()
         self.log_box.setReadOnly(True)
+        self.log_box.document().setMaximumBlockCount(MAX_LOG_BLOCKS)
         layout.addWidget(self.log_box)
         btn_layout = QHBoxLayout()
         btn_layout.addStretch()